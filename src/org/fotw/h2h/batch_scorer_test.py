@@ -0,0 +1,83 @@
+import datetime
+import random
+import unittest
+
+from src.org.fotw.h2h import batch_scorer
+from src.org.fotw.h2h import delta_scorer
+from src.org.fotw.h2h import fixtures
+from src.org.fotw.h2h import match_generator
+from src.org.fotw.h2h.h2h_pb2 import Match, MatchSet
+
+
+@unittest.skipUnless(batch_scorer.is_available(), 'requires numpy')
+class TestBatchScorer(unittest.TestCase):
+
+  def _assert_scores_identical(self, p_info, h, match_date, match_configs):
+    scores = batch_scorer.BatchScorer(p_info, h, match_date).score_batch(
+        match_configs)
+    scorer = delta_scorer.DeltaScorer(p_info, h, match_date)
+    self.assertEqual(
+        [scorer.score(match_config) for match_config in match_configs],
+        scores)
+    self.assertEqual(
+        [fixtures.full_rescan_score(p_info, h, match_config, match_date)
+         for match_config in match_configs],
+        scores)
+
+  def test_scores_identical(self):
+    rng = random.Random(1)
+    p_info = fixtures.make_p_info(6, 8)
+    h = fixtures.make_historian(p_info, rng)
+    match_date = datetime.datetime(2020, 2, 1)
+    match_configs = [
+        match_generator.gen_sprinkler_match_config(match_date, p_info, rng)[0]
+        for _ in range(100)
+    ]
+    self._assert_scores_identical(p_info, h, match_date, match_configs)
+
+  def test_scores_identical_when_date_already_in_history(self):
+    rng = random.Random(2)
+    p_info = fixtures.make_p_info(6, 8)
+    h = fixtures.make_historian(p_info, rng)
+    match_date = datetime.datetime(2020, 1, 5)
+    match_configs = [
+        match_generator.gen_sprinkler_match_config(match_date, p_info, rng)[0]
+        for _ in range(100)
+    ]
+    self._assert_scores_identical(p_info, h, match_date, match_configs)
+
+  def test_score_compact_batch(self):
+    rng = random.Random(4)
+    p_info = fixtures.make_p_info(6, 8)
+    h = fixtures.make_historian(p_info, rng)
+    roster = match_generator.compile_roster(p_info)
+    for match_date in [datetime.datetime(2020, 2, 1), datetime.datetime(2020, 1, 5)]:
+      compact_configs = [
+          match_generator.gen_compiled_sprinkler_match_config(roster, rng)
+          for _ in range(100)
+      ]
+      scorer = batch_scorer.BatchScorer(p_info, h, match_date)
+      self.assertEqual(
+          [fixtures.full_rescan_score(
+              p_info, h,
+              match_generator.to_match_set(compact_config, roster, match_date),
+              match_date)
+           for compact_config in compact_configs],
+          scorer.score_compact_batch(compact_configs))
+
+  def test_scores_unknown_names(self):
+    rng = random.Random(3)
+    p_info = fixtures.make_p_info(6, 8)
+    h = fixtures.make_historian(p_info, rng)
+    match_date = datetime.datetime(2020, 2, 1)
+    match_configs = [
+        MatchSet(
+            date_yyyymmdd='20200201',
+            match=[Match(host='family0', member=['family0', 'stranger'])]),
+        match_generator.gen_sprinkler_match_config(match_date, p_info, rng)[0],
+    ]
+    self._assert_scores_identical(p_info, h, match_date, match_configs)
+
+
+if __name__ == '__main__':
+  unittest.main()
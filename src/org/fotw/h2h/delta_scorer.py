@@ -0,0 +1,278 @@
+"""Scores candidate match configs incrementally against a fixed history.
+
+h2h.get_match_config_score rescans every participant pair and every host's
+full guest history. A candidate match config only changes the pairs and hosts
+in its own matches, so DeltaScorer computes the score of the current history
+once and derives each candidate's score from the pairs and hosts it touches.
+"""
+
+import datetime
+import math
+
+from src.org.fotw.h2h import historian
+
+
+def _pair_key(a, b):
+  return (a, b) if a < b else (b, a)
+
+
+def get_new_pair_checks(h, match_date):
+  """Returns (is_new_meetup, is_new_host_guest) functions for match_date.
+
+  is_new_meetup(a, b) is whether a & b haven't met on match_date yet, i.e.
+  whether match_date isn't in h.get_meetup_dates(a, b), &
+  is_new_host_guest(host, guest) the same for h.get_host_dates(host, guest).
+  Both are O(1): the last meet & host ordinals rule out most pairs, and the
+  events of match_date settle the rest.
+  """
+  match_ordinal = match_date.toordinal()
+  meet_pairs, host_pairs = historian.get_event_pairs(h.get_events(match_date))
+
+  def is_new_meetup(a, b):
+    return (h.get_last_meet_ordinal(a, b) < match_ordinal or
+            _pair_key(a, b) not in meet_pairs)
+
+  def is_new_host_guest(host, guest):
+    return (h.get_last_host_ordinal(host, guest) < match_ordinal or
+            (host, guest) not in host_pairs)
+
+  return is_new_meetup, is_new_host_guest
+
+
+def get_host_aggregate(a, h):
+  """Returns (total hosted count, most recent hosting date) for host a.
+
+  The most recent hosting date is datetime.datetime.min if a never hosted.
+  """
+  last_host_date = h.get_last_host_date(a)
+  if last_host_date is None:
+    last_host_date = datetime.datetime.min
+  return h.get_total_host_count(a), last_host_date
+
+
+class DeltaScorer():
+  """Scores match configs for match_date without mutating the historian.
+
+  score(match_config) returns exactly what h2h.get_match_config_score would
+  return after pushing match_config into host_historian. score_compact does
+  the same for compact match configs whose ids index p_info's names (as with
+  match_generator.compile_roster(p_info)). The historian must not change
+  while the scorer is in use.
+  """
+
+  def __init__(self, p_info, host_historian, match_date):
+    self._p_info = p_info
+    self._host_historian = host_historian
+    self._match_date = match_date
+    self._is_new_meetup, self._is_new_host_date = get_new_pair_checks(
+        host_historian, match_date)
+
+    name_list = [name for name in p_info]
+    self._names = name_list
+    # Memos for score_compact, keyed by a * len(name_list) + b for ids a & b:
+    # the rel dev increase if a & b meet on match_date (for a < b), and
+    # whether a hosting b on match_date adds a hosting date.
+    self._meetup_gains = {}
+    self._is_new_host_guest = {}
+    # The last config passed to get_compact_terms & its terms, since several
+    # scorers may ask for the terms of the same candidate in a row.
+    self._last_compact_config = None
+    self._last_compact_terms = None
+    self._rel_dev_baseline = 0
+    i = 0
+    while i < len(name_list):
+      j = i+1
+      while j < len(name_list):
+        meet_count = host_historian.get_meet_count(name_list[i], name_list[j])
+        self._rel_dev_baseline += meet_count ** 2
+        j += 1
+      i += 1
+
+    # self._host_aggregates[a] is (total hosted count, most recent hosting date)
+    # for every participant a that can host.
+    self._host_aggregates = {}
+    self._host_service_baseline = 0
+    for name in name_list:
+      if not p_info[name].can_host:
+        continue
+      aggregate = get_host_aggregate(name, host_historian)
+      self._host_aggregates[name] = aggregate
+      self._host_service_baseline += self._get_host_service_score(*aggregate)
+
+  def _get_host_service_score(self, total_count, most_recent_time):
+    freq_badness = (self._match_date - most_recent_time).days
+    effort_badness = total_count
+    return 0 - freq_badness - effort_badness
+
+  def score(self, match_config):
+    """Returns the score of host_historian with match_config pushed."""
+    # Pairs that gain a meetup date, and per host the guests that gain a
+    # hosting date. Sets mirror the de-duplication done by the historian.
+    new_meetup_pairs = set()
+    new_host_guests = {}
+    for match in match_config.match:
+      if match.host:
+        host = match.host
+        for member in match.member:
+          if member == host:
+            continue
+          pair = _pair_key(host, member)
+          if pair not in new_meetup_pairs and self._is_new_meetup(host, member):
+            new_meetup_pairs.add(pair)
+          if self._is_new_host_date(host, member):
+            new_host_guests.setdefault(host, set()).add(member)
+      else:
+        for a in match.member:
+          for b in match.member:
+            if a >= b:
+              continue
+            if (a, b) not in new_meetup_pairs and self._is_new_meetup(a, b):
+              new_meetup_pairs.add((a, b))
+
+    rel_dev_badness = self._rel_dev_baseline
+    for (a, b) in new_meetup_pairs:
+      if a not in self._p_info or b not in self._p_info:
+        continue
+      meet_count = self._host_historian.get_meet_count(a, b)
+      rel_dev_badness += 2 * meet_count + 1  # (c + 1) ** 2 - c ** 2
+    rel_dev_badness = math.sqrt(rel_dev_badness)
+
+    host_service_score = self._host_service_baseline
+    for host, guests in new_host_guests.items():
+      if host not in self._host_aggregates:
+        continue
+      total_count, most_recent_time = self._host_aggregates[host]
+      host_service_score -= self._get_host_service_score(total_count, most_recent_time)
+      host_service_score += self._get_host_service_score(
+          total_count + len(guests), max(most_recent_time, self._match_date))
+
+    return (
+        (1e6 * host_service_score) -
+        min(rel_dev_badness, 1e6)
+    )
+
+  def _get_meetup_gain(self, key):
+    n = len(self._names)
+    a = self._names[key // n]
+    b = self._names[key % n]
+    gain = 0
+    if self._is_new_meetup(a, b):
+      gain = 2 * self._host_historian.get_meet_count(a, b) + 1
+    self._meetup_gains[key] = gain
+    return gain
+
+  def _get_is_new_host_guest(self, key):
+    n = len(self._names)
+    host = self._names[key // n]
+    guest = self._names[key % n]
+    is_new = (
+        host in self._host_aggregates and
+        self._is_new_host_date(host, guest))
+    self._is_new_host_guest[key] = is_new
+    return is_new
+
+  # The score of a compact config is
+  #   1e6 * (host service baseline + sum of host service gains)
+  #   - min(sqrt(rel dev baseline + sum of meetup gains), 1e6)
+  # where each match adds the meetup gains of its new pairs & the host
+  # service gain of its host. Matches are disjoint, so these add up per
+  # match; exact_search bounds scores with them.
+
+  def get_baseline_terms(self):
+    """Returns (host service score, sum of squared meet counts) of the history."""
+    return self._host_service_baseline, self._rel_dev_baseline
+
+  def get_meetup_gain(self, a_id, b_id):
+    """Returns how much ids a & b meeting on match_date adds to the rel dev sum."""
+    n = len(self._names)
+    key = a_id * n + b_id if a_id < b_id else b_id * n + a_id
+    gain = self._meetup_gains.get(key)
+    if gain is None:
+      gain = self._get_meetup_gain(key)
+    return gain
+
+  def is_new_host_guest(self, host_id, guest_id):
+    """Returns whether host_id hosting guest_id on match_date adds a hosting date."""
+    key = host_id * len(self._names) + guest_id
+    is_new = self._is_new_host_guest.get(key)
+    if is_new is None:
+      is_new = self._get_is_new_host_guest(key)
+    return is_new
+
+  def get_host_service_gain(self, host_id, new_guest_count):
+    """Returns how much host_id hosting new_guest_count new guests adds."""
+    if not new_guest_count:
+      return 0
+    total_count, most_recent_time = self._host_aggregates[self._names[host_id]]
+    return (
+        self._get_host_service_score(
+            total_count + new_guest_count,
+            max(most_recent_time, self._match_date)) -
+        self._get_host_service_score(total_count, most_recent_time))
+
+  def score_compact(self, compact_config):
+    """Returns the score of host_historian with compact_config pushed.
+
+    Same as score, but per-pair history lookups are memoized by id since the
+    same pairs come up again & again across candidates.
+    """
+    host_service_score, rel_dev_badness = self.get_compact_terms(compact_config)
+    return (
+        (1e6 * host_service_score) -
+        min(rel_dev_badness, 1e6)
+    )
+
+  def get_compact_terms(self, compact_config):
+    """Returns (host service score, rel dev badness) with compact_config pushed.
+
+    These are the two terms that h2h.get_match_config_score combines. The
+    terms of the last config are cached, so don't mutate a config in between
+    calls.
+    """
+    if compact_config is self._last_compact_config:
+      return self._last_compact_terms
+    n = len(self._names)
+    new_meetup_keys = set()
+    new_host_guest_keys = set()
+    for host_id, member_ids in compact_config:
+      if host_id is not None:
+        for member_id in member_ids:
+          if member_id == host_id:
+            continue
+          if host_id < member_id:
+            new_meetup_keys.add(host_id * n + member_id)
+          else:
+            new_meetup_keys.add(member_id * n + host_id)
+          key = host_id * n + member_id
+          is_new = self._is_new_host_guest.get(key)
+          if is_new is None:
+            is_new = self._get_is_new_host_guest(key)
+          if is_new:
+            new_host_guest_keys.add(key)
+      else:
+        for a in member_ids:
+          for b in member_ids:
+            if a < b:
+              new_meetup_keys.add(a * n + b)
+
+    rel_dev_badness = self._rel_dev_baseline
+    for key in new_meetup_keys:
+      gain = self._meetup_gains.get(key)
+      if gain is None:
+        gain = self._get_meetup_gain(key)
+      rel_dev_badness += gain
+    rel_dev_badness = math.sqrt(rel_dev_badness)
+
+    new_host_guest_counts = {}
+    for key in new_host_guest_keys:
+      host_id = key // n
+      new_host_guest_counts[host_id] = new_host_guest_counts.get(host_id, 0) + 1
+    host_service_score = self._host_service_baseline
+    for host_id, guest_count in new_host_guest_counts.items():
+      total_count, most_recent_time = self._host_aggregates[self._names[host_id]]
+      host_service_score -= self._get_host_service_score(total_count, most_recent_time)
+      host_service_score += self._get_host_service_score(
+          total_count + guest_count, max(most_recent_time, self._match_date))
+    self._last_compact_config = compact_config
+    self._last_compact_terms = (host_service_score, rel_dev_badness)
+    return self._last_compact_terms
@@ -0,0 +1,69 @@
+import datetime
+import random
+import unittest
+
+from src.org.fotw.h2h import delta_scorer
+from src.org.fotw.h2h import fixtures
+from src.org.fotw.h2h import match_generator
+from src.org.fotw.h2h.h2h_pb2 import Match, MatchSet
+
+
+class TestDeltaScorer(unittest.TestCase):
+
+  def test_matches_full_rescan(self):
+    p_info = fixtures.make_p_info(6, 8)
+    h = fixtures.make_historian(p_info, random.Random(1))
+    match_date = datetime.datetime(2020, 2, 1)
+    scorer = delta_scorer.DeltaScorer(p_info, h, match_date)
+    for _ in range(50):
+      match_config, _ = match_generator.gen_sprinkler_match_config(match_date, p_info)
+      self.assertEqual(
+          fixtures.full_rescan_score(p_info, h, match_config, match_date),
+          scorer.score(match_config))
+
+  def test_matches_full_rescan_when_date_already_in_history(self):
+    p_info = fixtures.make_p_info(6, 8)
+    h = fixtures.make_historian(p_info, random.Random(2))
+    # Re-scoring a date that already has matches must not double count.
+    match_date = datetime.datetime(2020, 1, 5)
+    scorer = delta_scorer.DeltaScorer(p_info, h, match_date)
+    for _ in range(50):
+      match_config, _ = match_generator.gen_sprinkler_match_config(match_date, p_info)
+      self.assertEqual(
+          fixtures.full_rescan_score(p_info, h, match_config, match_date),
+          scorer.score(match_config))
+
+  def test_score_compact_matches_full_rescan(self):
+    p_info = fixtures.make_p_info(6, 8)
+    h = fixtures.make_historian(p_info, random.Random(4))
+    roster = match_generator.compile_roster(p_info)
+    rng = random.Random(4)
+    for match_date in [datetime.datetime(2020, 2, 1), datetime.datetime(2020, 1, 5)]:
+      scorer = delta_scorer.DeltaScorer(p_info, h, match_date)
+      for _ in range(50):
+        compact_config = match_generator.gen_compiled_sprinkler_match_config(
+            roster, rng)
+        match_config = match_generator.to_match_set(
+            compact_config, roster, match_date)
+        self.assertEqual(
+            fixtures.full_rescan_score(p_info, h, match_config, match_date),
+            scorer.score_compact(compact_config))
+
+  def test_ignores_unknown_names(self):
+    p_info = fixtures.make_p_info(6, 8)
+    h = fixtures.make_historian(p_info, random.Random(3))
+    match_date = datetime.datetime(2020, 2, 1)
+    match_config = MatchSet(
+        date_yyyymmdd='20200201',
+        match=[
+            Match(host='family0', member=['family0', 'stranger']),
+            Match(member=['single0', 'single2', 'stranger2']),
+        ])
+    scorer = delta_scorer.DeltaScorer(p_info, h, match_date)
+    self.assertEqual(
+        fixtures.full_rescan_score(p_info, h, match_config, match_date),
+        scorer.score(match_config))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,438 @@
+"""Exact branch & bound search for the best match config of a small roster.
+
+Random sampling never knows whether it found the best config. This search
+enumerates the configs that match_generator.gen_compiled_sprinkler_match_config
+can generate, in the generator's order:
+
+ 1. with an odd number of hosts, the host that takes a sprinkler (or, with
+    no sprinklers, the host that's left out),
+ 2. the hostless singles groups,
+ 3. the pairs of host families & who hosts each pair,
+ 4. which hosted match each remaining sprinkler joins, in the round-robin
+    sizes the generator deals them out in.
+
+Interchangeable matches are only enumerated once: each pairing branches on
+one fixed unpaired host, & hostless groups of the same gender & size are
+built in order of their smallest member.
+
+Subtrees are pruned with an upper bound on the default score (see
+DeltaScorer.get_baseline_terms), which grows with the host service gains &
+shrinks with the meetup gains of the matches. When match_date is a new
+date, hosting g guests gains a host D - g, where D is the host's days since
+last hosting, so the bound adds the best D of the hosts still to be paired
+& subtracts the fewest guests the remaining sprinklers can make. Each
+participant still to be placed adds at least their smallest meetup gain
+with anyone they can still be matched with.
+"""
+
+import collections
+import itertools
+import math
+import time
+
+
+# The best config found (a compact match config), its score & an upper bound
+# on the score of every config. proven_optimal is whether the search finished,
+# in which case upper_bound is score. nodes counts the partial configs
+# visited & leaves the complete configs scored.
+ExactResult = collections.namedtuple(
+    'ExactResult',
+    ['match_config', 'score', 'upper_bound', 'proven_optimal', 'nodes',
+     'leaves'])
+
+# Hostless group sizes, as in match_generator.
+_MIN_GROUP_SIZE = 3
+_MAX_GROUP_SIZE = 4
+
+# How many nodes to visit between deadline checks.
+_DEADLINE_CHECK_NODES = 1024
+
+
+class _Search():
+  """The state of one branch & bound search.
+
+  Each phase builds a list of child nodes as (bound, apply, undo), where
+  apply & undo change the state to & from the child's, & explores them.
+  """
+
+  def __init__(self, roster, scorer, deadline, on_improvement):
+    self._scorer = scorer
+    self._deadline = deadline
+    self._on_improvement = on_improvement
+    self._host_service_baseline, self._rel_dev_baseline = (
+        scorer.get_baseline_terms())
+    self.best_score = -math.inf
+    self.best_config = None
+    # Bounds the subtrees left unexplored after the deadline.
+    self.open_bound = -math.inf
+    self.stopped = False
+    self.nodes = 0
+    self.leaves = 0
+
+    hosts = roster.host_ids
+    sprinklers = (
+        roster.other_sprinkler_ids + roster.m_single_ids + roster.f_single_ids)
+    # self._gains[a][b] is the meetup gain of ids a & b. Rosters are small, so
+    # it's a full matrix.
+    self._gains = [[0] * len(roster.names) for _ in roster.names]
+    for a, b in itertools.combinations(hosts + sprinklers, 2):
+      self._gains[a][b] = self._gains[b][a] = scorer.get_meetup_gain(a, b)
+    # Whether every host-guest pair would add a hosting date, so hosting g
+    # guests gains exactly D - g.
+    self._is_new_date = all(
+        scorer.is_new_host_guest(h, p)
+        for h in hosts for p in itertools.chain(hosts, sprinklers) if p != h)
+    # An upper bound on what hosting gains each host. If _is_new_date, it's
+    # D & the guests are subtracted separately.
+    self._max_host_gain = {}
+    for h in hosts:
+      days_gain = scorer.get_host_service_gain(h, 1) + 1
+      self._max_host_gain[h] = (
+          days_gain if self._is_new_date else max(days_gain - 1, 0))
+    self._guest_cost = 1 if self._is_new_date else 0
+    # Smallest meetup gains of each sprinkler with any host, & of each single
+    # with the singles of the same gender.
+    self._min_host_gain = {
+        s: min((self._gain(h, s) for h in hosts), default=0)
+        for s in sprinklers}
+    self._min_single_gain = {}
+    for singles in (roster.m_single_ids, roster.f_single_ids):
+      for s in singles:
+        self._min_single_gain[s] = min(
+            (self._gain(s, p) for p in singles if p != s), default=0)
+
+    # Hosts by decreasing gain, so pairs branch on the best unpaired host.
+    self._unpaired = sorted(hosts, key=lambda h: (-self._max_host_gain[h], h))
+    self._others = list(roster.other_sprinkler_ids)
+    self._m_singles = list(roster.m_single_ids)
+    self._f_singles = list(roster.f_single_ids)
+    # [host, members] of the hosted matches so far, the odd host's first.
+    self._hosted = []
+    self._hostless = []
+    # The odd host's first sprinkler, if there's an odd host match, & the pool
+    # each sprinkler came from.
+    self._odd_sprinkler = None
+    self._pools = {}
+    for pool, ids in enumerate((
+        roster.other_sprinkler_ids, roster.m_single_ids, roster.f_single_ids)):
+      for s in ids:
+        self._pools[s] = pool
+    self._groups_done = False
+    # The smallest member of the last hostless group of each (gender, size).
+    self._last_group_min = {}
+    # Memo of _get_min_hosted_sprinklers.
+    self._min_hosted_sprinklers = {}
+    # Sums over the matches so far.
+    self._host_gain = 0
+    self._meetup_gain = 0
+
+  def _gain(self, a, b):
+    return self._gains[a][b]
+
+  def _score(self, host_gain, meetup_gain):
+    return (
+        1e6 * (self._host_service_baseline + host_gain) -
+        min(math.sqrt(self._rel_dev_baseline + meetup_gain), 1e6))
+
+  def _get_sprinkler_count(self):
+    return len(self._others) + len(self._m_singles) + len(self._f_singles)
+
+  def _get_bound(self):
+    """Returns an upper bound on the score of every config below this node."""
+    unpaired = self._unpaired
+    host_gain = self._host_gain + sum(
+        self._max_host_gain[h] for h in unpaired[:len(unpaired) // 2])
+    has_hosted_matches = bool(self._hosted or unpaired)
+    sprinklers = self._get_sprinkler_count()
+    if has_hosted_matches:
+      hosted_sprinklers = sprinklers
+      if not self._groups_done:
+        hosted_sprinklers = self._get_min_hosted_sprinklers(
+            len(self._m_singles), len(self._f_singles))
+      # The guests still to come: a family per unpaired pair & the sprinklers.
+      host_gain -= self._guest_cost * (len(unpaired) // 2 + hosted_sprinklers)
+
+    meetup_gain = self._meetup_gain
+    if len(unpaired) > 1:
+      # Each unpaired host meets at least their cheapest other unpaired host.
+      pair_gains = 0
+      for a in unpaired:
+        gains = self._gains[a]
+        pair_gains += min(gains[b] for b in unpaired if b != a)
+      meetup_gain += (pair_gains + 1) // 2
+    if has_hosted_matches:
+      meetup_gain += sum(self._min_host_gain[s] for s in self._others)
+      for singles in (self._m_singles, self._f_singles):
+        for s in singles:
+          if self._groups_done:
+            meetup_gain += self._min_host_gain[s]
+          else:
+            meetup_gain += min(self._min_host_gain[s], self._min_single_gain[s])
+    return self._score(host_gain, meetup_gain)
+
+  def _get_min_hosted_sprinklers(self, m_singles, f_singles):
+    """Returns the fewest sprinklers the hostless groups can leave.
+
+    Takes the counts of the singles left before the groups are done.
+    """
+    key = (m_singles, f_singles, len(self._others), len(self._unpaired))
+    count = self._min_hosted_sprinklers.get(key)
+    if count is None:
+      count = len(self._others) + m_singles + f_singles
+      source = m_singles if m_singles > f_singles else f_singles
+      if count > len(self._unpaired) and source >= _MIN_GROUP_SIZE:
+        count = min(
+            self._get_min_hosted_sprinklers(
+                m_singles - size if m_singles > f_singles else m_singles,
+                f_singles if m_singles > f_singles else f_singles - size)
+            for size in range(
+                _MIN_GROUP_SIZE, min(source, _MAX_GROUP_SIZE) + 1))
+      self._min_hosted_sprinklers[key] = count
+    return count
+
+  def _tick(self):
+    """Counts a node & returns whether the search should stop."""
+    self.nodes += 1
+    if (self._deadline is not None and
+        self.nodes % _DEADLINE_CHECK_NODES == 0 and
+        time.time() >= self._deadline):
+      self.stopped = True
+    return self.stopped
+
+  def _explore(self, children, search_child):
+    """Runs search_child in each child node, best bound first."""
+    children.sort(key=lambda child: -child[0])
+    for bound, apply, undo in children:
+      if bound <= self.best_score:
+        return
+      if self._tick():
+        # The children left are bounded by this one's bound.
+        self.open_bound = max(self.open_bound, bound)
+        return
+      apply()
+      search_child()
+      undo()
+
+  def _get_child(self, apply, undo):
+    apply()
+    bound = self._get_bound()
+    undo()
+    return bound, apply, undo
+
+  def search(self):
+    # Phase 1: the odd host.
+    if len(self._unpaired) % 2 == 0:
+      self._search_groups()
+      return
+    children = []
+    for h in list(self._unpaired):
+      if not self._get_sprinkler_count():
+        children.append(self._get_child(*self._leave_out(h)))
+      for pool in (self._others, self._m_singles, self._f_singles):
+        for s in list(pool):
+          children.append(self._get_child(*self._add_odd_host_match(h, pool, s)))
+    self._explore(children, self._search_groups)
+
+  def _leave_out(self, h):
+    i = self._unpaired.index(h)
+
+    def apply():
+      del self._unpaired[i]
+
+    def undo():
+      self._unpaired.insert(i, h)
+    return apply, undo
+
+  def _add_odd_host_match(self, h, pool, s):
+    i = self._unpaired.index(h)
+    j = pool.index(s)
+    host_gain = self._max_host_gain[h] - self._guest_cost
+    gain = self._gain(h, s)
+
+    def apply():
+      del self._unpaired[i]
+      del pool[j]
+      self._hosted.append([h, [h, s]])
+      self._odd_sprinkler = s
+      self._host_gain += host_gain
+      self._meetup_gain += gain
+
+    def undo():
+      self._unpaired.insert(i, h)
+      pool.insert(j, s)
+      self._hosted.pop()
+      self._odd_sprinkler = None
+      self._host_gain -= host_gain
+      self._meetup_gain -= gain
+    return apply, undo
+
+  def _search_groups(self):
+    # Phase 2: while there are more sprinklers than hosts, the generator takes
+    # a group from the larger single gender, if it's big enough.
+    source = (
+        self._m_singles if len(self._m_singles) > len(self._f_singles)
+        else self._f_singles)
+    if (self._get_sprinkler_count() <= len(self._unpaired) or
+        len(source) < _MIN_GROUP_SIZE):
+      self._groups_done = True
+      self._search_pairs()
+      self._groups_done = False
+      return
+    children = []
+    for size in range(min(len(source), _MAX_GROUP_SIZE), _MIN_GROUP_SIZE - 1, -1):
+      last_min = self._last_group_min.get((source is self._m_singles, size), -1)
+      for group in itertools.combinations(source, size):
+        if group[0] > last_min:
+          children.append(self._get_child(*self._add_group(source, group)))
+    self._explore(children, self._search_groups)
+
+  def _add_group(self, source, group):
+    key = (source is self._m_singles, len(group))
+    gain = sum(self._gain(a, b) for a, b in itertools.combinations(group, 2))
+    old_source = list(source)
+    old_last_min = self._last_group_min.get(key)
+
+    def apply():
+      source[:] = [s for s in old_source if s not in group]
+      self._hostless.append(group)
+      self._last_group_min[key] = group[0]
+      self._meetup_gain += gain
+
+    def undo():
+      source[:] = old_source
+      self._hostless.pop()
+      if old_last_min is None:
+        del self._last_group_min[key]
+      else:
+        self._last_group_min[key] = old_last_min
+      self._meetup_gain -= gain
+    return apply, undo
+
+  def _search_pairs(self):
+    # Phase 3: pair up the hosts, branching on the best unpaired host.
+    if not self._unpaired:
+      self._search_deals()
+      return
+    a = self._unpaired[0]
+    children = []
+    for b in self._unpaired[1:]:
+      for host, guest in ((a, b), (b, a)):
+        children.append(self._get_child(*self._add_pair(host, guest)))
+    self._explore(children, self._search_pairs)
+
+  def _add_pair(self, host, guest):
+    old_unpaired = list(self._unpaired)
+    host_gain = self._max_host_gain[host] - self._guest_cost
+    gain = self._gain(host, guest)
+
+    def apply():
+      self._unpaired[:] = [h for h in old_unpaired if h != host and h != guest]
+      self._hosted.append([host, [host, guest]])
+      self._host_gain += host_gain
+      self._meetup_gain += gain
+
+    def undo():
+      self._unpaired[:] = old_unpaired
+      self._hosted.pop()
+      self._host_gain -= host_gain
+      self._meetup_gain -= gain
+    return apply, undo
+
+  def _search_deals(self):
+    # Phase 4: the generator deals the remaining sprinklers out round-robin,
+    # so `extras` of the hosted matches (the odd host's first) get one more
+    # than the others. Which of the pairs those are is random.
+    sprinklers = self._others + self._m_singles + self._f_singles
+    if not self._hosted or not sprinklers:
+      # With nobody to host them, sprinklers are left out.
+      self._add_leaf()
+      return
+    base, extras = divmod(len(sprinklers), len(self._hosted))
+    self._deal_caps = [base] * len(self._hosted)
+    if self._odd_sprinkler is not None and extras:
+      self._deal_caps[0] += 1
+      extras -= 1
+    self._deal_extras = extras
+    # The sprinklers whose cheapest host costs the most go first. Hosts are
+    # all chosen now, so only the meetup gains of the deal are left to bound.
+    self._dealt = sorted(sprinklers, key=lambda s: -self._min_host_gain[s])
+    hosts = [host for host, _ in self._hosted]
+    self._deal_min_gains = [0] * (len(self._dealt) + 1)
+    for i in range(len(self._dealt) - 1, -1, -1):
+      self._deal_min_gains[i] = self._deal_min_gains[i + 1] + min(
+          self._gain(h, self._dealt[i]) for h in hosts)
+    self._deal_host_gain = self._host_gain - self._guest_cost * len(sprinklers)
+    self._deal(0)
+
+  def _deal(self, i):
+    if i == len(self._dealt):
+      self._add_leaf()
+      return
+    s = self._dealt[i]
+    children = []
+    # The odd host's first sprinkler is interchangeable with the others from
+    # its pool that it's dealt, so those must come after it.
+    odd_sprinkler = self._odd_sprinkler
+    skip_odd_host = odd_sprinkler is not None and (
+        self._pools[s] == self._pools[odd_sprinkler] and s < odd_sprinkler)
+    for j, (host, members) in enumerate(self._hosted):
+      if j == 0 and skip_odd_host:
+        continue
+      guests = len(members) - 2
+      if guests < self._deal_caps[j] or (
+          guests == self._deal_caps[j] and self._deal_extras and
+          not (j == 0 and odd_sprinkler is not None)):
+        gain = self._gain(host, s)
+        bound = self._score(
+            self._deal_host_gain,
+            self._meetup_gain + gain + self._deal_min_gains[i + 1])
+        children.append((bound,) + self._add_sprinkler(j, s, gain))
+    self._explore(children, lambda: self._deal(i + 1))
+
+  def _add_sprinkler(self, j, s, gain):
+    members = self._hosted[j][1]
+    uses_extra = len(members) - 2 == self._deal_caps[j]
+
+    def apply():
+      members.append(s)
+      if uses_extra:
+        self._deal_extras -= 1
+      self._meetup_gain += gain
+
+    def undo():
+      members.pop()
+      if uses_extra:
+        self._deal_extras += 1
+      self._meetup_gain -= gain
+    return apply, undo
+
+  def _add_leaf(self):
+    self.leaves += 1
+    config = tuple(
+        (host, tuple(sorted(members))) for host, members in self._hosted) + (
+            tuple((None, group) for group in self._hostless))
+    score = self._scorer.score_compact(config)
+    if score > self.best_score:
+      self.best_score = score
+      self.best_config = config
+      if self._on_improvement is not None:
+        self._on_improvement(self.leaves, score, config)
+
+
+def solve(roster, scorer, deadline=None, on_improvement=None):
+  """Returns the ExactResult of the best config for the default score.
+
+  roster is a match_generator.CompiledRoster & scorer the
+  delta_scorer.DeltaScorer of its p_info, history & match date. Past the
+  deadline (a time.time()), returns the best config found so far & an upper
+  bound. on_improvement(leaves, score, match_config) is called for every new
+  best config.
+  """
+  search = _Search(roster, scorer, deadline, on_improvement)
+  search.search()
+  upper_bound = search.best_score
+  if search.stopped:
+    upper_bound = max(upper_bound, search.open_bound)
+  return ExactResult(
+      search.best_config, search.best_score, upper_bound, not search.stopped,
+      search.nodes, search.leaves)
@@ -0,0 +1,94 @@
+import datetime
+import random
+import time
+import unittest
+
+from src.org.fotw.h2h import delta_scorer
+from src.org.fotw.h2h import exact_search
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import match_generator
+from src.org.fotw.h2h import synthetic_workload
+
+
+def _make_inputs(roster_size, seed, n_dates=10):
+  rng = random.Random(seed)
+  p_info = synthetic_workload.gen_p_info(roster_size, rng)
+  h = synthetic_workload.gen_historian(p_info, n_dates, rng)
+  return p_info, h, synthetic_workload.get_next_date(n_dates)
+
+
+def _make_families(count, host_count):
+  p_info = {}
+  for i in range(count):
+    p = h2h.Participant(
+        name='family%d' % i, is_family=True, participating=True,
+        can_host=(i < host_count), child_count=0, gender_if_single='')
+    p_info[p.name] = p
+  return p_info
+
+
+class TestExactSearch(unittest.TestCase):
+
+  def _solve(self, p_info, h, match_date, deadline=None):
+    roster = match_generator.compile_roster(p_info)
+    scorer = delta_scorer.DeltaScorer(p_info, h, match_date)
+    return roster, scorer, exact_search.solve(roster, scorer, deadline)
+
+  def test_matches_or_beats_sampling(self):
+    for seed in range(8):
+      p_info, h, match_date = _make_inputs(6 + seed % 5, seed)
+      roster, scorer, result = self._solve(p_info, h, match_date)
+      self.assertTrue(result.proven_optimal)
+      self.assertEqual(result.score, result.upper_bound)
+      self.assertEqual(result.score, scorer.score_compact(result.match_config))
+
+      rng = random.Random(seed)
+      sampled_forms = set()
+      for _ in range(3000):
+        match_config = match_generator.gen_compiled_sprinkler_match_config(
+            roster, rng)
+        sampled_forms.add(match_generator.get_canonical_form(match_config))
+        self.assertLessEqual(scorer.score_compact(match_config), result.score)
+      # The search only returns configs the generator could have made.
+      self.assertIn(
+          match_generator.get_canonical_form(result.match_config),
+          sampled_forms)
+
+  def test_deadline_returns_best_found_and_bound(self):
+    p_info, h, match_date = _make_inputs(40, 0, n_dates=30)
+    roster, scorer, result = self._solve(
+        p_info, h, match_date, deadline=time.time() - 1)
+    self.assertFalse(result.proven_optimal)
+    self.assertGreaterEqual(result.upper_bound, result.score)
+    self.assertEqual(result.score, scorer.score_compact(result.match_config))
+    member_ids = sorted(
+        m for _, member_ids in result.match_config for m in member_ids)
+    self.assertEqual(
+        sorted(roster.host_ids + roster.other_sprinkler_ids +
+               roster.m_single_ids + roster.f_single_ids),
+        member_ids)
+
+  def test_odd_host_without_sprinklers_is_left_out(self):
+    p_info = _make_families(3, 3)
+    h = historian.Historian()
+    h.push_host_date(
+        'family0', ['family0', 'family1'], datetime.datetime(2018, 10, 2))
+    h.push_host_date(
+        'family0', ['family0', 'family2'], datetime.datetime(2018, 10, 9))
+    _, _, result = self._solve(p_info, h, datetime.datetime(2018, 10, 30))
+    self.assertTrue(result.proven_optimal)
+    # family0 hosted most recently & already met the others, so it's the one
+    # left out.
+    self.assertEqual(1, len(result.match_config))
+    self.assertEqual((1, 2), result.match_config[0][1])
+
+  def test_no_participants(self):
+    _, _, result = self._solve(
+        {}, historian.Historian(), datetime.datetime(2018, 10, 30))
+    self.assertTrue(result.proven_optimal)
+    self.assertEqual((), result.match_config)
+
+
+if __name__ == '__main__':
+  unittest.main()
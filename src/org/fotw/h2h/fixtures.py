@@ -0,0 +1,45 @@
+"""Shared rosters & histories for the scorer & search tests."""
+
+import copy
+import datetime
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import synthetic_workload
+
+
+FIRST_DATE = datetime.datetime(2020, 1, 1)
+
+
+def make_p_info(n_families, n_singles, can_host=None):
+  """Returns a fixed participant dictionary.
+
+  Family i has i children & can host if can_host(i), which defaults to every
+  family but the last. Singles alternate between M & F.
+  """
+  if can_host is None:
+    can_host = lambda i: i != n_families - 1
+  p_info = {}
+  for i in range(n_families):
+    p = h2h.Participant(
+        name='family%d' % i, is_family=True, participating=True,
+        can_host=can_host(i), child_count=i, gender_if_single='')
+    p_info[p.name] = p
+  for i in range(n_singles):
+    p = h2h.Participant(
+        name='single%d' % i, is_family=False, participating=True,
+        can_host=False, child_count=0, gender_if_single='MF'[i % 2])
+    p_info[p.name] = p
+  return p_info
+
+
+def make_historian(p_info, rng, n_dates=5):
+  """Returns a Historian with a generated match config on each of n_dates days."""
+  return synthetic_workload.gen_historian(
+      p_info, n_dates, rng, first_date=FIRST_DATE, cadence_days=1)
+
+
+def full_rescan_score(p_info, h, match_config, match_date):
+  """Scores match_config with h2h.get_match_config_score, leaving h unchanged."""
+  h = copy.deepcopy(h)
+  h2h.push_match_config(h, match_config, match_date)
+  return h2h.get_match_config_score(p_info, h, match_date)
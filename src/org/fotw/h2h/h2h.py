@@ -6,13 +6,10 @@ At the end, show the best match config.
 
 TODOs:
  - Copy-paste-able match output.
- - Ability to run multiple scoring algos & record best match + scoring for each
- - Better hosting load-balancing:
-  -- extra_effort = (num_guests / normal_people_host_cooks_for)
-  -- long-term measure: SUM(extra_effort) / (time since joined h2h)
-  -- short-term measure: total extra_effort in past 2 months / MIN(2 months, time since joined h2h)
+ - Better hosting load-balancing: try out the extra_effort scorer (see
+   scorers.py, e.g. --scorers default,extra_effort) & make it the default if
+   it balances hosting better.
  - More debuggable output:
-  -- score + score breakdown by metric (rel dev, hosting fairness)
   -- view rel dev, hosting fairness fairness max & min values.
 
 Inputs:
@@ -28,18 +25,32 @@ Scoring: Load-balanced hosting, then relationship development.
 
 import argparse
 import collections
+import concurrent.futures
 import csv
 import datetime
+import itertools
+import json
 import math
+import os
 import random
 import sys
+import time
 
-from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import batch_scorer
+from src.org.fotw.h2h import delta_scorer
+from src.org.fotw.h2h import exact_search
+from src.org.fotw.h2h import history_cache
+from src.org.fotw.h2h import history_store
 from src.org.fotw.h2h import history_warnings
+from src.org.fotw.h2h import history_writer
+from src.org.fotw.h2h import local_search
 from src.org.fotw.h2h import match_generator
-from src.org.fotw.h2h.h2h_pb2 import MatchingHistory
-
-from com_google_protobuf_python_srcs.python.google.protobuf import text_format
+from src.org.fotw.h2h import ranked_output
+from src.org.fotw.h2h import run_metrics
+from src.org.fotw.h2h import score_memo
+from src.org.fotw.h2h import scorers
+from src.org.fotw.h2h import textproto_reader
+from src.org.fotw.h2h import top_k
 
 Participant = collections.namedtuple(
     'Participant',
@@ -68,19 +79,67 @@ def parse_participant_csv(p_csv_file):
   return p_config
 
 
-def validate_inputs(p_info, host_historian):
-  """Raises an error if inputs are malformed in any way."""
+def validate_inputs(p_info, host_historian, shared_history=False):
+  """Raises an error if inputs are malformed in any way.
+
+  With shared_history, the history may also hold other chapters (e.g. a
+  history store), so it may name people that aren't in p_info.
+  """
   p_name_set = set([name for name in p_info])
   for name in p_info:
     p = p_info[name]
     if not p.is_family and p.gender_if_single not in ['M','F']:
       raise ValueError('no gender for single participant: ' + name)    
 
+  if shared_history:
+    return
   for a in host_historian.get_all_names():
     if a not in p_name_set:
       raise Exception('unknown host name from textproto: ' + a)
 
 
+def validate_match_config(p_info, match_config):
+  """Raises an error if match_config names anyone not in p_info."""
+  for match in match_config.match:
+    for name in itertools.chain([match.host] if match.host else [], match.member):
+      if name not in p_info:
+        raise ValueError('unknown name in match config: ' + name)
+
+
+def load_inputs(
+    participants_csv_path, host_textproto_path, history_snapshot=False,
+    history_store_path=None):
+  """Returns (p_info, host_historian) read from the input files.
+
+  With history_snapshot, the history is loaded through history_cache. With
+  history_store_path, host_textproto_path isn't read & host_historian is
+  the read-only history_store.HistoryStore of that file (see
+  get_writable_historian).
+  """
+  with open(participants_csv_path, 'r') as p_csv_file:
+    p_info = parse_participant_csv(p_csv_file)
+  if history_store_path is not None:
+    host_historian = history_store.HistoryStore(history_store_path)
+  elif history_snapshot:
+    host_historian = history_cache.load_historian(host_textproto_path)
+  else:
+    host_historian = textproto_reader.load_historian(host_textproto_path)
+  return p_info, host_historian
+
+
+def get_writable_historian(p_info, host_historian):
+  """Returns a history that match configs can be pushed to.
+
+  That's host_historian itself, except for a read-only
+  history_store.HistoryStore, for which it's a Historian of the events of
+  p_info's participants. Searching the store directly lets worker processes
+  share its pages.
+  """
+  if isinstance(host_historian, history_store.HistoryStore):
+    return host_historian.to_historian(p_info)
+  return host_historian
+
+
 def push_match_config(host_historian, match_config, match_date):
   """Updates the host info dictionaries given a match config."""
   for match in match_config.match:
@@ -99,7 +158,7 @@ def pop_match_config(host_historian, match_config, match_date):
 
 
 def get_rel_dev_score(a, b, host_historian):
-    meet_count_i_j = len(host_historian.get_meetup_dates(a, b))
+    meet_count_i_j = host_historian.get_meet_count(a, b)
     return meet_count_i_j ** 2
 
 
@@ -110,18 +169,9 @@ def get_host_service_score(host, p_info, host_historian, match_date):
 
 
 def get_info_score(a, h, match_date):
-  most_recent_time = datetime.datetime.min
-  total_count = 0
-
-  for b in h.get_past_guests(a):
-    event_dates = h.get_host_dates(a, b)
-    if not event_dates:
-      continue
-    last_time = event_dates[len(event_dates) - 1]
-    count = len(event_dates)
-    total_count += count
-    if last_time > most_recent_time:
-      most_recent_time = last_time
+  # O(1): the historian keeps each host's total hosted count & last hosting
+  # date up to date on push/pop.
+  total_count, most_recent_time = delta_scorer.get_host_aggregate(a, h)
   freq_badness = (match_date - most_recent_time).days
   effort_badness = total_count
   return 0 - freq_badness - effort_badness
@@ -152,28 +202,755 @@ def get_match_config_score(p_info, host_historian, match_date):
   )
 
 
+# Samples are split into fixed-size shards, each with its own RNG stream
+# derived from the seed. Shard boundaries only depend on N (not on the worker
+# count), so a given seed & N always produce the same result.
+_SHARD_SIZE = 1000
+
+# How many shards to keep queued per worker process.
+_SHARDS_IN_FLIGHT_PER_WORKER = 2
+
+# Bounds the memory of each searcher's score memo, in the estimated bytes of
+# score_memo.get_entry_bytes.
+_SCORE_MEMO_MAX_BYTES = 16 << 20
+
+# Random samples of rosters of up to this many participants are often
+# duplicates, so their searchers always memoize scores. Larger rosters only
+# memoize once a search looks for duplicates (duplicate_limit or
+# count_unique), since their samples are almost never repeated.
+_SCORE_MEMO_MAX_PARTICIPANTS = 20
+
+# The 'exact' optimizer falls back to 'random' for rosters with more
+# participants than this. Synthetic rosters of up to 24 participants were all
+# proven optimal in under a second; past that some weren't within 20s.
+_EXACT_MAX_PARTICIPANTS = 24
+
+# The local search optimizers & 'exact', see get_best_match_config.
+OPTIMIZERS = local_search.OPTIMIZERS + ['exact']
+
+# A point on the convergence trace of get_best_match_config: after
+# elapsed_s seconds & `samples` samples (with failed_match_generations failed
+# generations) the best score found was best_score.
+ConvergencePoint = collections.namedtuple(
+    'ConvergencePoint',
+    ['elapsed_s', 'samples', 'failed_match_generations', 'best_score'])
+
+# improvements lists (sample_index, score, time.time(), failed generations so
+# far, compact match config) for every sample that beat the shard's previous
+# best.
+# generated counts the valid configs the match generator produced & scored the
+# ones that weren't already in the score memo. For random samples searched
+# with with_hashes, config_hashes lists the hash of each sample's canonical
+# form, in order; otherwise it's empty.
+# scorer_improvements has a list of (sample_index, score, match_config)
+# improvements like `improvements` for each scorer after the first.
+# top_k_entries lists (sample_index, score, canonical form, compact match
+# config) for every sample that made it into the shard's top k, in order.
+# Those include the top k of every prefix of the shard, so the reducer can
+# stop at any sample & still get the exact top k.
+_ShardResult = collections.namedtuple(
+    '_ShardResult',
+    ['samples', 'failed_match_generations', 'improvements', 'generated',
+     'scored', 'config_hashes', 'scorer_improvements', 'top_k_entries'])
+
+
+def _get_shard_rng(seed, shard_index):
+  # String seeds are hashed with SHA-512, so streams are stable across
+  # processes and Python runs.
+  return random.Random('%d:%d' % (seed, shard_index))
+
+
+class _ShardSearcher():
+  """Generates & scores the samples of one shard at a time.
+
+  Every sample is scored by each of scorer_names; the first one drives the
+  search.
+  """
+
+  def __init__(self, p_info, host_historian, match_date, optimizer, scorer_names):
+    self._p_info = p_info
+    self._match_date = match_date
+    self._optimizer = optimizer
+    self._roster = match_generator.compile_roster(p_info)
+    # Equivalent to push_match_config + get_match_config_score +
+    # pop_match_config, but only rescores the pairs & hosts each candidate
+    # touches. With NumPy, random samples are scored one shard at a time.
+    self._scorers = scorers.make_scorers(
+        scorer_names, p_info, host_historian, match_date)
+    self._batch_scorer = None
+    if (optimizer == 'random' and scorer_names[0] == 'default' and
+        batch_scorer.is_available()):
+      self._batch_scorer = batch_scorer.BatchScorer(
+          p_info, host_historian, match_date)
+    self._score_memo = None
+    if (optimizer == 'random' and
+        len(self._roster.participants) <= _SCORE_MEMO_MAX_PARTICIPANTS):
+      self._score_memo = score_memo.ScoreMemo(max_bytes=_SCORE_MEMO_MAX_BYTES)
+
+  def _score_all(self, match_configs, canonical_forms):
+    """Returns (scores, number of configs actually scored).
+
+    Each score is a tuple with the score of every scorer. Configs that are
+    in the score memo (if any), or that duplicate an earlier config of the
+    batch, aren't rescored.
+    """
+    scores = [None] * len(match_configs)
+    # Canonical form => indices of the configs that have it.
+    unscored = {}
+    for k, canonical_form in enumerate(canonical_forms):
+      score = None
+      if self._score_memo is not None:
+        score = self._score_memo.get(canonical_form)
+      if score is None:
+        unscored.setdefault(canonical_form, []).append(k)
+      else:
+        scores[k] = score
+    to_score = [match_configs[indices[0]] for indices in unscored.values()]
+    if self._batch_scorer is not None:
+      first_scores = self._batch_scorer.score_compact_batch(to_score)
+      new_scores = [
+          (first_score,) + tuple(
+              scorer.score_compact(match_config) for scorer in self._scorers[1:])
+          for first_score, match_config in zip(first_scores, to_score)]
+    else:
+      new_scores = [
+          tuple(scorer.score_compact(match_config) for scorer in self._scorers)
+          for match_config in to_score]
+    for (canonical_form, indices), score in zip(unscored.items(), new_scores):
+      if self._score_memo is not None:
+        self._score_memo.put(canonical_form, score)
+      for k in indices:
+        scores[k] = score
+    return scores, len(to_score)
+
+  def _gen_match_config(self, rng):
+    """Returns (compact match_config, failed_match_generations).
+
+    The compiled generator builds valid configs by construction, so there
+    are never failed generations to retry. Candidates stay compact; only the
+    winner is turned into a MatchSet by get_best_match_config.
+    """
+    return match_generator.gen_compiled_sprinkler_match_config(
+        self._roster, rng), 0
+
+  def search(self, seed, shard_index, shard_n, deadline, k=None,
+             with_hashes=False):
+    """Returns a _ShardResult for up to shard_n samples (fewer past deadline).
+
+    If k is set, also keeps the k best distinct random samples. If
+    with_hashes is set, also returns the hash of every random sample.
+    """
+    rng = _get_shard_rng(seed, shard_index)
+    improvements = []
+    if self._optimizer != 'random':
+      # Each shard is one local search run from a random starting config.
+      match_config, failed_match_generations = self._gen_match_config(rng)
+
+      def on_improvement(step, score, match_config):
+        improvements.append(
+            (step, score, time.time(), failed_match_generations, match_config))
+      _, _, samples = local_search.optimize(
+          match_config, self._roster.participants,
+          self._scorers[0].score_compact, shard_n, rng, self._optimizer,
+          deadline=deadline, on_improvement=on_improvement)
+      return _ShardResult(
+          samples, failed_match_generations, improvements, 1, samples, [], [],
+          [])
+
+    if with_hashes and self._score_memo is None:
+      self._score_memo = score_memo.ScoreMemo(max_bytes=_SCORE_MEMO_MAX_BYTES)
+    match_configs = []
+    generated_at = []
+    failed_match_generations = 0
+    failed_so_far = []
+    for _ in range(shard_n):
+      # The first shard scores at least one sample, so even a search that
+      # starts past its deadline returns a config.
+      if (deadline is not None and (match_configs or shard_index) and
+          time.time() >= deadline):
+        break
+      match_config, failed = self._gen_match_config(rng)
+      match_configs.append(match_config)
+      generated_at.append(time.time())
+      failed_match_generations += failed
+      failed_so_far.append(failed_match_generations)
+
+    canonical_forms = [
+        match_generator.get_canonical_form(match_config)
+        for match_config in match_configs]
+    scores, scored = self._score_all(match_configs, canonical_forms)
+    max_score = None
+    for i, match_config_scores in enumerate(scores):
+      match_config_score = match_config_scores[0]
+      if max_score is None or match_config_score > max_score:
+        max_score = match_config_score
+        improvements.append((
+            i, match_config_score, generated_at[i], failed_so_far[i],
+            match_configs[i]))
+    scorer_improvements = []
+    for j in range(1, len(self._scorers)):
+      scorer_improvements.append([])
+      max_score = None
+      for i, match_config_scores in enumerate(scores):
+        if max_score is None or match_config_scores[j] > max_score:
+          max_score = match_config_scores[j]
+          scorer_improvements[-1].append((i, max_score, match_configs[i]))
+    top_k_entries = []
+    if k is not None:
+      best_k = top_k.TopK(k)
+      for i, match_config_scores in enumerate(scores):
+        if best_k.push(
+            match_config_scores[0], i, canonical_forms[i], match_configs[i]):
+          top_k_entries.append((
+              i, match_config_scores[0], canonical_forms[i], match_configs[i]))
+    config_hashes = []
+    if with_hashes:
+      config_hashes = [
+          hash(canonical_form) for canonical_form in canonical_forms]
+    return _ShardResult(
+        len(match_configs), failed_match_generations, improvements,
+        len(match_configs), scored, config_hashes, scorer_improvements,
+        top_k_entries)
+
+
+# The _ShardSearcher of a worker process, set up once by _init_worker.
+_worker_searcher = None
+
+
+def _init_worker(p_info, host_historian, match_date, optimizer, scorer_names):
+  global _worker_searcher
+  _worker_searcher = _ShardSearcher(
+      p_info, host_historian, match_date, optimizer, scorer_names)
+
+
+def _search_shard_in_worker(shard_args):
+  return _worker_searcher.search(*shard_args)
+
+
+# The (p_info, host_historian) of a SearchPool worker process, & its
+# _ShardSearchers by (match_date, optimizer, scorer_names), least recently
+# used first.
+_pool_inputs = None
+_pool_searchers = collections.OrderedDict()
+
+# How many _ShardSearchers (& their score memos) each SearchPool worker keeps.
+_POOL_SEARCHERS_PER_WORKER = 4
+
+
+def _init_pool_worker(p_info, host_historian):
+  global _pool_inputs
+  _pool_inputs = (p_info, host_historian)
+  _pool_searchers.clear()
+
+
+def _search_shard_in_pool_worker(searcher_key, shard_args):
+  searcher = _pool_searchers.pop(searcher_key, None)
+  if searcher is None:
+    match_date, optimizer, scorer_names = searcher_key
+    searcher = _ShardSearcher(
+        _pool_inputs[0], _pool_inputs[1], match_date, optimizer, scorer_names)
+  _pool_searchers[searcher_key] = searcher
+  while len(_pool_searchers) > _POOL_SEARCHERS_PER_WORKER:
+    _pool_searchers.popitem(last=False)
+  return searcher.search(*shard_args)
+
+
+class SearchPool():
+  """Worker processes that keep the inputs loaded across searches.
+
+  Pass one to get_best_match_config to skip starting processes & setting up
+  searchers for every search, e.g. in a long-running service. Workers get a
+  snapshot of host_historian, so close the pool & make a new one after
+  changing it.
+  """
+
+  def __init__(self, p_info, host_historian, workers):
+    self.workers = workers
+    self._executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_pool_worker,
+        initargs=(p_info, host_historian))
+
+  def submit(self, match_date, optimizer, scorer_names, shard_args):
+    return self._executor.submit(
+        _search_shard_in_pool_worker,
+        (match_date, optimizer, tuple(scorer_names)), shard_args)
+
+  def close(self):
+    self._executor.shutdown()
+
+
+def _iter_futures(submit, shard_args, workers):
+  """Yields the results of submit(args) for each of shard_args, in order."""
+  in_flight = collections.deque()
+  try:
+    for args in shard_args:
+      in_flight.append(submit(args))
+      if len(in_flight) >= workers * _SHARDS_IN_FLIGHT_PER_WORKER:
+        yield in_flight.popleft().result()
+    while in_flight:
+      yield in_flight.popleft().result()
+  finally:
+    # The caller may stop early, so don't wait for shards nobody needs.
+    for future in in_flight:
+      future.cancel()
+
+
+def _iter_shard_results(
+    shard_args, p_info, host_historian, match_date, optimizer, scorer_names,
+    workers, pool=None):
+  """Yields the _ShardResult of each of shard_args, in order."""
+  if pool is not None:
+    yield from _iter_futures(
+        lambda args: pool.submit(match_date, optimizer, scorer_names, args),
+        shard_args, pool.workers)
+    return
+  if workers <= 1:
+    searcher = _ShardSearcher(
+        p_info, host_historian, match_date, optimizer, scorer_names)
+    for args in shard_args:
+      yield searcher.search(*args)
+    return
+
+  executor = concurrent.futures.ProcessPoolExecutor(
+      max_workers=workers,
+      initializer=_init_worker,
+      initargs=(p_info, host_historian, match_date, optimizer, scorer_names))
+  with executor:
+    yield from _iter_futures(
+        lambda args: executor.submit(_search_shard_in_worker, args),
+        shard_args, workers)
+
+
 def get_best_match_config(
-    p_info, host_historian, match_date, n):
+    p_info, host_historian, match_date, n, seed=None, workers=1,
+    optimizer='random', time_budget_s=None, stall_limit=None,
+    duplicate_limit=None, trace=None, metrics=None, scorer_names=('default',),
+    scorer_results=None, k=None, top_configs=None, pool=None,
+    exact_max_participants=_EXACT_MAX_PARTICIPANTS, count_unique=False):
+  """Returns (best_match_config, failed_match_generations).
+
+  The n samples are sharded across `workers` processes. For a given seed the
+  result doesn't depend on the worker count. If seed is None, a random seed
+  is used.
+
+  optimizer is one of OPTIMIZERS. 'random' scores n random configs; the local
+  search optimizers spend the n samples on moves instead, restarting from a
+  random config for each shard. 'exact' ignores n & searches every config
+  with exact_search, stopping only at time_budget_s, for the default scorer;
+  with more than exact_max_participants participants it falls back to
+  'random'.
+
+  The search also stops once time_budget_s seconds have passed, or once the
+  best score hasn't improved for stall_limit samples. With the 'random'
+  optimizer, it also stops once duplicate_limit samples in a row were all
+  configs that were already sampled, i.e. once the reachable configs are
+  likely exhausted. n may be None if any of those is set. Stopping on
+  stall_limit or duplicate_limit is also independent of the worker count.
+
+  If trace is a list, a ConvergencePoint is appended to it every time the
+  best score improves, plus a final one when the search stops.
+
+  If metrics is a dictionary, search counters are stored in it: samples,
+  candidates_generated & candidates_scored (including work past a stall
+  that was discarded, and not counting duplicates that weren't rescored),
+  failed_match_generations, search_s and the per-second rates of each. For
+  the 'random' optimizer with count_unique or duplicate_limit set,
+  unique_configs counts the distinct configs among the samples; that keeps a
+  hash of every distinct sample, so it's off by default. For the 'exact'
+  optimizer, samples are the complete configs scored, candidates_generated
+  the partial configs visited, & proven_optimal, upper_bound &
+  optimality_gap (upper_bound - best_score) tell how far from the best
+  possible score the result may be. exact_fallback is set if it fell back to
+  'random'.
+
+  scorer_names lists the scorers.get_scorer_names() to evaluate every sample
+  with. The first one is the score that's searched for; more than one
+  requires the random optimizer. If scorer_results is a dictionary, it's
+  filled with a scorers.ScorerResult for each scorer: the best of the samples
+  according to that scorer.
+
+  If top_configs is a list, the k best distinct samples (by the first
+  scorer, earliest first on ties) are appended to it as
+  ranked_output.RankedMatchConfig, best first. Keeping them costs O(log k)
+  per sample that makes it into the top k. Requires the random optimizer.
+
+  If pool is a SearchPool for p_info & host_historian, its workers are used
+  instead of `workers` new processes.
+  """
+  if optimizer not in OPTIMIZERS:
+    raise ValueError('unknown optimizer: %s' % optimizer)
+  if (n is None and time_budget_s is None and stall_limit is None and
+      duplicate_limit is None):
+    raise ValueError(
+        'one of n, time_budget_s, stall_limit or duplicate_limit is required')
+  if stall_limit is not None and stall_limit < 1:
+    raise ValueError('stall_limit must be positive')
+  if not scorer_names:
+    raise ValueError('at least one scorer is required')
+  if len(scorer_names) > 1 and optimizer != 'random':
+    raise ValueError('multiple scorers require the random optimizer')
+  if optimizer == 'exact' and scorer_names[0] != 'default':
+    raise ValueError('the exact optimizer only searches the default scorer')
+  if duplicate_limit is not None:
+    if duplicate_limit < 1:
+      raise ValueError('duplicate_limit must be positive')
+    if optimizer != 'random':
+      raise ValueError('duplicate_limit requires the random optimizer')
+  if top_configs is not None:
+    if k is None or k < 1:
+      raise ValueError('k must be positive')
+    if optimizer != 'random':
+      raise ValueError('top_configs requires the random optimizer')
+  else:
+    k = None
+  if pool is not None:
+    workers = pool.workers
+  if seed is None:
+    seed = random.getrandbits(64)
+  start_time = time.time()
+  deadline = None
+  if time_budget_s is not None:
+    deadline = start_time + time_budget_s
+
+  exact_result = None
+  exact_fallback = False
+  if optimizer == 'exact':
+    roster = match_generator.compile_roster(p_info)
+    participant_count = (
+        len(roster.host_ids) + len(roster.other_sprinkler_ids) +
+        len(roster.m_single_ids) + len(roster.f_single_ids))
+    if participant_count > exact_max_participants:
+      optimizer = 'random'
+      exact_fallback = True
+    else:
+      def on_improvement(leaves, score, match_config):
+        if trace is not None:
+          trace.append(ConvergencePoint(
+              time.time() - start_time, leaves, 0, score))
+      exact_result = exact_search.solve(
+          roster, delta_scorer.DeltaScorer(p_info, host_historian, match_date),
+          deadline, on_improvement)
+
+  if n is None:
+    shard_sizes = (_SHARD_SIZE for _ in itertools.count())
+  else:
+    shard_sizes = (min(_SHARD_SIZE, n - start) for start in range(0, n, _SHARD_SIZE))
+  with_hashes = duplicate_limit is not None or count_unique
+  shard_args = (
+      (seed, shard_index, shard_n, deadline, k, with_hashes)
+      for shard_index, shard_n in enumerate(shard_sizes))
+
+  # Reduce in shard order, keeping the earliest config on ties so the result
+  # is the same as a serial run over all shards.
   max_score = None
   best_match_config = None
   failed_match_generations = 0
-  for _ in range(n):
-    match_config, found_match = match_generator.gen_sprinkler_match_config(match_date, p_info)
-    while not found_match:
-      match_config, found_match = match_generator.gen_sprinkler_match_config(match_date, p_info)
-      failed_match_generations += 1
-    push_match_config(
-        host_historian, match_config, match_date)
-    match_config_score = get_match_config_score(
-      p_info, host_historian, match_date)
-    pop_match_config(
-        host_historian, match_config, match_date)
-    if max_score is None or match_config_score > max_score:
-      max_score = match_config_score
-      best_match_config = match_config
+  samples = 0
+  last_improvement = -1
+  candidates_generated = 0
+  candidates_scored = 0
+  shards = 0
+  # With with_hashes, the hashes of the canonical forms of all samples so far,
+  # & how many samples in a row were duplicates of earlier ones.
+  config_hashes = set()
+  duplicate_run = 0
+  # (score, compact match_config) of the best sample for each scorer after the
+  # first.
+  scorer_bests = [(None, None)] * (len(scorer_names) - 1)
+  best_k = None if k is None else top_k.TopK(k)
+  shard_results = ()
+  if exact_result is not None:
+    workers = 1
+    if exact_result.match_config is not None:
+      max_score = exact_result.score
+      best_match_config = exact_result.match_config
+    samples = candidates_scored = exact_result.leaves
+    candidates_generated = exact_result.nodes
+  else:
+    shard_results = _iter_shard_results(
+        shard_args, p_info, host_historian, match_date, optimizer,
+        scorer_names, workers, pool)
+  for shard_result in shard_results:
+    shard_samples = shard_result.samples
+    exhausted = False
+    if duplicate_limit is not None:
+      new_hashes = set()
+      for i, config_hash in enumerate(shard_result.config_hashes):
+        if config_hash in config_hashes or config_hash in new_hashes:
+          duplicate_run += 1
+        else:
+          new_hashes.add(config_hash)
+          duplicate_run = 0
+        if duplicate_run >= duplicate_limit:
+          shard_samples = i + 1
+          exhausted = True
+          break
+
+    stalled = False
+    for i, score, timestamp, failed_so_far, match_config in shard_result.improvements:
+      if i >= shard_samples:
+        break
+      if stall_limit is not None and samples + i - last_improvement > stall_limit:
+        stalled = True
+        break
+      if max_score is None or score > max_score:
+        max_score = score
+        best_match_config = match_config
+        last_improvement = samples + i
+        if trace is not None:
+          trace.append(ConvergencePoint(
+              timestamp - start_time, samples + i + 1,
+              failed_match_generations + failed_so_far, score))
+
+    failed_match_generations += shard_result.failed_match_generations
+    candidates_generated += shard_result.generated
+    candidates_scored += shard_result.scored
+    shards += 1
+    if stall_limit is not None and samples + shard_samples - 1 - last_improvement >= stall_limit:
+      stalled = True
+      shard_samples = min(shard_samples, last_improvement + stall_limit + 1 - samples)
+    config_hashes.update(shard_result.config_hashes[:shard_samples])
+    for j, improvements in enumerate(shard_result.scorer_improvements):
+      for i, score, match_config in improvements:
+        if i >= shard_samples:
+          break
+        if scorer_bests[j][0] is None or score > scorer_bests[j][0]:
+          scorer_bests[j] = (score, match_config)
+    for i, score, canonical_form, match_config in shard_result.top_k_entries:
+      if i >= shard_samples:
+        break
+      best_k.push(score, samples + i, canonical_form, match_config)
+    samples += shard_samples
+    if stalled or exhausted:
+      break
+    if deadline is not None and time.time() >= deadline:
+      break
+
+  elapsed_s = time.time() - start_time
+  if scorer_results is not None and best_match_config is not None:
+    roster = match_generator.compile_roster(p_info)
+    for name, scorer, (score, match_config) in zip(
+        scorer_names,
+        scorers.make_scorers(scorer_names, p_info, host_historian, match_date),
+        [(max_score, best_match_config)] + scorer_bests):
+      scorer_results[name] = scorers.ScorerResult(
+          match_generator.to_match_set(match_config, roster, match_date),
+          score, scorer.get_breakdown(match_config))
+  if top_configs is not None:
+    roster = match_generator.compile_roster(p_info)
+    for score, _, match_config in best_k.get_ranked():
+      top_configs.append(ranked_output.RankedMatchConfig(
+          score, match_generator.to_match_set(match_config, roster, match_date)))
+  if best_match_config is not None:
+    best_match_config = match_generator.to_match_set(
+        best_match_config, match_generator.compile_roster(p_info), match_date)
+  if trace is not None:
+    trace.append(ConvergencePoint(
+        elapsed_s, samples, failed_match_generations, max_score))
+  if metrics is not None:
+    rate_s = max(elapsed_s, 1e-9)
+    metrics.update({
+        'optimizer': optimizer,
+        'seed': seed,
+        'workers': workers,
+        'shards': shards,
+        'samples': samples,
+        'candidates_generated': candidates_generated,
+        'candidates_scored': candidates_scored,
+        'failed_match_generations': failed_match_generations,
+        'search_s': elapsed_s,
+        'candidates_generated_per_s': candidates_generated / rate_s,
+        'candidates_scored_per_s': candidates_scored / rate_s,
+        'best_score': max_score,
+    })
+    if optimizer == 'random' and with_hashes:
+      metrics['unique_configs'] = len(config_hashes)
+    if exact_result is not None:
+      metrics['proven_optimal'] = exact_result.proven_optimal
+      metrics['upper_bound'] = exact_result.upper_bound
+      if max_score is not None:
+        metrics['optimality_gap'] = exact_result.upper_bound - max_score
+    elif exact_fallback:
+      metrics['exact_fallback'] = True
   return best_match_config, failed_match_generations
 
 
+def get_match_dates(first_date, cadence_days, count):
+  """Returns count dates, cadence_days apart, starting at first_date."""
+  return [
+      first_date + datetime.timedelta(days=cadence_days * i)
+      for i in range(count)]
+
+
+def plan_match_configs(
+    p_info, host_historian, match_dates, n, seed=None, traces=None,
+    date_metrics=None, date_scorer_results=None, **search_kwargs):
+  """Returns [(match_date, best_match_config, failed_match_generations)].
+
+  Searches match_dates in increasing order, pushing each date's best match
+  config into host_historian before searching the next date, i.e. the same
+  as running get_best_match_config & push_match_config once per date on the
+  growing history. The search for the i-th date uses seed + i, so a plan is
+  reproducible for a given seed. n & search_kwargs (workers, time_budget_s,
+  ...) apply to each date's search.
+
+  traces, date_metrics & date_scorer_results, if lists, get the trace,
+  metrics & scorer_results of each date's search appended.
+  """
+  match_dates = sorted(match_dates)
+  if len(set(match_dates)) != len(match_dates):
+    raise ValueError('duplicate match dates')
+  if seed is None:
+    seed = random.getrandbits(64)
+  plan = []
+  for i, match_date in enumerate(match_dates):
+    trace = None if traces is None else []
+    metrics = None if date_metrics is None else {}
+    scorer_results = None if date_scorer_results is None else {}
+    best_match_config, failed_match_generations = get_best_match_config(
+        p_info, host_historian, match_date, n, seed=seed + i, trace=trace,
+        metrics=metrics, scorer_results=scorer_results, **search_kwargs)
+    if best_match_config is None:
+      raise ValueError(
+          'no match config found for %s' % match_date.strftime('%Y-%m-%d'))
+    push_match_config(host_historian, best_match_config, match_date)
+    plan.append((match_date, best_match_config, failed_match_generations))
+    if traces is not None:
+      traces.append(trace)
+    if date_metrics is not None:
+      metrics['match_date'] = match_date.strftime('%Y-%m-%d')
+      date_metrics.append(metrics)
+    if date_scorer_results is not None:
+      date_scorer_results.append(scorer_results)
+  return plan
+
+
+# The outcome of run_chapter: the best match config, its failed match
+# generations, the history warnings once it's added & the ranked top configs
+# (None without top_k).
+ChapterResult = collections.namedtuple(
+    'ChapterResult',
+    ['match_config', 'failed_match_generations', 'warnings', 'top_configs'])
+
+
+def load_validated_inputs(
+    participants_csv_path, host_textproto_path, metrics,
+    history_snapshot=False, history_store_path=None):
+  """Returns load_inputs(...) after validate_inputs, timing both in metrics."""
+  with run_metrics.timed_phase(metrics, 'load'):
+    p_info, host_historian = load_inputs(
+        participants_csv_path, host_textproto_path, history_snapshot,
+        history_store_path)
+  with run_metrics.timed_phase(metrics, 'validate'):
+    validate_inputs(
+        p_info, host_historian,
+        shared_history=history_store_path is not None)
+  return p_info, host_historian
+
+
+def write_outputs(
+    host_historian, plan, host_textproto_path, updated_host_textproto_path,
+    metrics, incremental_output=False):
+  """Writes host_historian & returns its warnings, timing both in metrics.
+
+  plan lists the (match_date, match_config) pushed into host_historian since
+  it was loaded from host_textproto_path. With incremental_output they're
+  appended in place if updated_host_textproto_path is host_textproto_path
+  & that gives the same file as rewriting the whole history (see
+  history_writer.append_match_config). Otherwise the whole history is
+  rewritten. host_textproto_path may be None if the history came from a
+  history store.
+  """
+  with run_metrics.timed_phase(metrics, 'serialize'):
+    # Each append only serializes its own match set.
+    appended = (
+        incremental_output and host_textproto_path is not None and
+        os.path.realpath(host_textproto_path) ==
+        os.path.realpath(updated_host_textproto_path))
+    for match_date, match_config in plan:
+      appended = appended and history_writer.append_match_config(
+          updated_host_textproto_path, match_config, match_date)
+    if not appended:
+      history_writer.write_history(host_historian, updated_host_textproto_path)
+  with run_metrics.timed_phase(metrics, 'warnings'):
+    return history_warnings.get_warnings(host_historian)
+
+
+def run_chapter(
+    participants_csv_path, host_textproto_path, updated_host_textproto_path,
+    match_date, n, metrics, history_snapshot=False, history_store_path=None,
+    incremental_output=False, top_k=None, top_k_path=None, profile_path=None,
+    **search_kwargs):
+  """Runs h2h for one chapter & match_date & returns its ChapterResult.
+
+  Loads & validates the inputs (see load_inputs), searches for the best
+  match config (n & search_kwargs as for get_best_match_config), adds it to
+  the history (see get_writable_historian) & writes the history (see
+  write_outputs). metrics gets the search metrics &
+  the wall time of each phase. With top_k, the top_k best configs are also
+  written to top_k_path (see ranked_output.write_ranked). With profile_path,
+  the search runs under run_metrics.maybe_profile.
+
+  Raises ValueError if no match config is found.
+  """
+  p_info, host_historian = load_validated_inputs(
+      participants_csv_path, host_textproto_path, metrics, history_snapshot,
+      history_store_path)
+  top_configs = None if top_k is None else []
+  with run_metrics.timed_phase(metrics, 'search'):
+    with run_metrics.maybe_profile(profile_path):
+      best_match_config, failed_match_generations = get_best_match_config(
+          p_info, host_historian, match_date, n, metrics=metrics, k=top_k,
+          top_configs=top_configs, **search_kwargs)
+  if best_match_config is None:
+    raise ValueError('no match config found')
+  if top_configs is not None:
+    ranked_output.write_ranked(top_configs, top_k_path)
+  host_historian = get_writable_historian(p_info, host_historian)
+  push_match_config(host_historian, best_match_config, match_date)
+  warnings = write_outputs(
+      host_historian, [(match_date, best_match_config)], host_textproto_path,
+      updated_host_textproto_path, metrics, incremental_output)
+  return ChapterResult(
+      best_match_config, failed_match_generations, warnings, top_configs)
+
+
+def print_convergence_trace(trace):
+  for point in trace[:-1]:
+    print('convergence: %.3fs, %d samples, %d failed match generations, best score %f' % (
+        point.elapsed_s, point.samples, point.failed_match_generations,
+        point.best_score))
+  final_point = trace[-1]
+  samples_per_s = final_point.samples / max(final_point.elapsed_s, 1e-9)
+  print('searched %d samples in %.3fs (%.1f samples/s)' % (
+      final_point.samples, final_point.elapsed_s, samples_per_s))
+
+
+def print_exact_result(metrics):
+  if metrics.get('exact_fallback'):
+    print('too many participants for the exact search, searched randomly')
+  elif metrics.get('proven_optimal'):
+    print('proven optimal')
+  elif 'optimality_gap' in metrics:
+    print('optimality gap: %f' % metrics['optimality_gap'])
+
+
+def print_match_config(match_config):
+  for match in match_config.match:
+    if match.host:
+      print(match.host + ': ' + ', '.join([m for m in match.member if m != match.host]))
+    else:
+      print('hostless: ' + ', '.join(match.member))
+
+
+def print_scorer_result(name, scorer_result):
+  print('scorer %s: %s' % (name, ', '.join(
+      '%s %f' % (metric, value)
+      for metric, value in sorted(scorer_result.breakdown.items()))))
+  print_match_config(scorer_result.match_config)
+
+
 def main(argv):
   parser = argparse.ArgumentParser()
   parser.add_argument(
@@ -182,46 +959,289 @@ def main(argv):
       help='participants csv file location')
   parser.add_argument(
       '--host_textproto_path',
-      required=True,
       help='hosting textproto file location')
+  parser.add_argument(
+      '--history_store_path',
+      help='instead of --host_textproto_path, read the hosting history from '
+      'this history store (see history_store), which may also hold other '
+      'chapters. The updated textproto has this chapter\'s events.')
   parser.add_argument(
       '--updated_host_textproto_path',
       required=True,
       help='updated hosting textproto file location')
   parser.add_argument(
       '--match_date',
-      required=True,
       help='date for next h2h meetup. Format: yyyy-mm-dd')
+  parser.add_argument(
+      '--match_dates',
+      help='instead of --match_date, comma-separated dates to plan in one '
+      'run: each date\'s best match config is added to the history before '
+      'searching the next one, & all are written at the end. Search flags '
+      '(--N, --time_budget_s, ...) apply per date.')
+  parser.add_argument(
+      '--date_count',
+      type=int,
+      help='plan this many dates, --cadence_days apart, starting at '
+      '--match_date')
+  parser.add_argument(
+      '--cadence_days',
+      type=int,
+      default=28,
+      help='days between the dates planned with --date_count')
   parser.add_argument(
       '--N',
-      required=True,
-      help='total random valid configs to generate & evaluate')
+      type=int,
+      help='total random valid configs to generate & evaluate. Required '
+      'unless --time_budget_s, --stall_limit or --duplicate_limit is set.')
+  parser.add_argument(
+      '--time_budget_s',
+      type=float,
+      help='stop searching after this many seconds of wall time')
+  parser.add_argument(
+      '--stall_limit',
+      type=int,
+      help='stop searching once the best score hasn\'t improved for this '
+      'many samples')
+  parser.add_argument(
+      '--duplicate_limit',
+      type=int,
+      help='stop searching once this many random samples in a row were '
+      'configs that were already sampled (only with --optimizer=random)')
+  parser.add_argument(
+      '--count_unique_configs',
+      action='store_true',
+      help='count the distinct configs among the random samples')
+  parser.add_argument(
+      '--workers',
+      type=int,
+      default=1,
+      help='number of processes to spread the N samples across')
+  parser.add_argument(
+      '--seed',
+      type=int,
+      help='random seed. Results for a given seed & N are reproducible '
+      'independent of --workers. Defaults to a random seed.')
+  parser.add_argument(
+      '--optimizer',
+      choices=OPTIMIZERS,
+      default='random',
+      help='random: score N random configs. hillclimb/anneal: spend the N '
+      'samples on local search moves from random starting configs. exact: '
+      'search every config for the proven best one (or the best found & how '
+      'far from the best possible it may be, at --time_budget_s), falling '
+      'back to random above --exact_max_participants.')
+  parser.add_argument(
+      '--exact_max_participants',
+      type=int,
+      default=_EXACT_MAX_PARTICIPANTS,
+      help='the most participants --optimizer=exact searches exactly')
+  parser.add_argument(
+      '--history_snapshot',
+      action='store_true',
+      help='load the hosting history from a snapshot stored next to '
+      '--host_textproto_path, (re)building it when the textproto changes')
+  parser.add_argument(
+      '--incremental_output',
+      action='store_true',
+      help='append the new match set in place instead of re-serializing '
+      'the whole history, when --updated_host_textproto_path is '
+      '--host_textproto_path & the file is known to be what a full rewrite '
+      'would give, i.e. this process wrote it (see history_writer). '
+      'Otherwise, or when --match_date isn\'t after the last date, falls '
+      'back to a full rewrite, so the output is the same as without this '
+      'flag.')
+  parser.add_argument(
+      '--metrics_json',
+      help='write per-phase wall times, search counters & peak memory to '
+      'this JSON file')
+  parser.add_argument(
+      '--profile',
+      help='run the search under cProfile & write the stats to this .prof '
+      'file. With --workers > 1 only the parent process is profiled.')
+  parser.add_argument(
+      '--scorers',
+      default='default',
+      help='comma-separated scorers to evaluate every sample with, out of: '
+      '%s. The best match config for the first one is written; the best '
+      'for each is printed with a score breakdown. More than one requires '
+      '--optimizer=random.' % ', '.join(scorers.get_scorer_names()))
+  parser.add_argument(
+      '--top_k',
+      type=int,
+      help='keep the K best distinct match configs & write them, ranked & '
+      'with scores, to --top_k_path (only with --optimizer=random)')
+  parser.add_argument(
+      '--top_k_path',
+      help='where to write the --top_k match configs: JSON if it ends in '
+      '.json, else a textproto with a "# rank R, score S" comment per '
+      'match_set')
+  parser.add_argument(
+      '--commit_ranked_path',
+      help='instead of searching, commit the match config of rank '
+      '--commit_rank from this --top_k_path file to the history')
+  parser.add_argument(
+      '--commit_rank',
+      type=int,
+      default=1,
+      help='rank (from 1) to commit from --commit_ranked_path')
   args = parser.parse_args(args=argv[1:])
+  if (args.host_textproto_path is None) == (args.history_store_path is None):
+    parser.error(
+        'exactly one of --host_textproto_path or --history_store_path is '
+        'required')
+  if args.history_snapshot and args.history_store_path is not None:
+    parser.error('--history_snapshot requires --host_textproto_path')
+  if (args.match_date is None) == (args.match_dates is None):
+    parser.error('exactly one of --match_date or --match_dates is required')
+  if args.date_count is not None:
+    if args.match_date is None:
+      parser.error('--date_count requires --match_date')
+    if args.date_count < 1:
+      parser.error('--date_count must be positive')
+  if args.match_dates is not None:
+    match_dates = [
+        datetime.datetime.strptime(d, '%Y-%m-%d')
+        for d in args.match_dates.split(',')]
+  else:
+    match_dates = get_match_dates(
+        datetime.datetime.strptime(args.match_date, '%Y-%m-%d'),
+        args.cadence_days, args.date_count or 1)
+  if len(set(match_dates)) != len(match_dates):
+    parser.error('duplicate match dates')
+  if len(match_dates) > 1:
+    if args.top_k is not None:
+      parser.error('--top_k only works for a single --match_date')
+    if args.commit_ranked_path is not None:
+      parser.error('--commit_ranked_path only works for a single --match_date')
+  if (args.commit_ranked_path is None and args.N is None and
+      args.time_budget_s is None and args.stall_limit is None and
+      args.duplicate_limit is None):
+    parser.error(
+        'one of --N, --time_budget_s, --stall_limit or --duplicate_limit is '
+        'required')
+  if (args.top_k is None) != (args.top_k_path is None):
+    parser.error('--top_k & --top_k_path must be set together')
+  if args.top_k is not None:
+    if args.top_k < 1:
+      parser.error('--top_k must be positive')
+    if args.optimizer != 'random':
+      parser.error('--top_k requires --optimizer=random')
+  if args.duplicate_limit is not None and args.optimizer != 'random':
+    parser.error('--duplicate_limit requires --optimizer=random')
+  scorer_names = args.scorers.split(',')
+  for name in scorer_names:
+    if name not in scorers.get_scorer_names():
+      parser.error('unknown scorer: %s' % name)
+  if len(scorer_names) > 1 and args.optimizer != 'random':
+    parser.error('multiple --scorers require --optimizer=random')
+  if args.optimizer == 'exact' and scorer_names[0] != 'default':
+    parser.error('--optimizer=exact only searches the default scorer')
 
-  match_date = datetime.datetime.strptime(args.match_date, '%Y-%m-%d')
-  with open(args.participants_csv_path, 'r') as p_csv_file:
-    with open(args.host_textproto_path, 'r') as host_textproto_file:
-      p_info = parse_participant_csv(p_csv_file)
-      matching_history = MatchingHistory()
-      text_format.Parse(host_textproto_file.read(), matching_history)
-      host_historian = historian.from_proto(matching_history)
-      validate_inputs(p_info, host_historian)
+  metrics = {}
+  match_date = match_dates[0]
+  if args.commit_ranked_path is None and len(match_dates) == 1:
+    seed = args.seed
+    if seed is None:
+      seed = random.getrandbits(64)
+    print('seed: %d' % seed)
+    trace = []
+    scorer_results = {}
+    result = run_chapter(
+        args.participants_csv_path, args.host_textproto_path,
+        args.updated_host_textproto_path, match_date, args.N, metrics,
+        history_snapshot=args.history_snapshot,
+        history_store_path=args.history_store_path,
+        incremental_output=args.incremental_output, top_k=args.top_k,
+        top_k_path=args.top_k_path, profile_path=args.profile, seed=seed,
+        workers=args.workers, optimizer=args.optimizer,
+        time_budget_s=args.time_budget_s, stall_limit=args.stall_limit,
+        duplicate_limit=args.duplicate_limit,
+        count_unique=args.count_unique_configs, trace=trace,
+        scorer_names=scorer_names, scorer_results=scorer_results,
+        exact_max_participants=args.exact_max_participants)
+    print_convergence_trace(trace)
+    print_exact_result(metrics)
+    print('failed match generations: %d' % result.failed_match_generations)
+    if 'unique_configs' in metrics:
+      print('unique configs: %d' % metrics['unique_configs'])
+    if len(scorer_names) > 1:
+      for name in scorer_names:
+        print_scorer_result(name, scorer_results[name])
+      print('writing the best match config for scorer %s' % scorer_names[0])
+    if result.top_configs is not None:
+      print('wrote %d ranked match configs to %s' % (
+          len(result.top_configs), args.top_k_path))
+    plan = [(match_date, result.match_config)]
+    warnings = result.warnings
+  else:
+    p_info, host_historian = load_validated_inputs(
+        args.participants_csv_path, args.host_textproto_path, metrics,
+        args.history_snapshot, args.history_store_path)
+    # Committing & planning push to the history before it's written.
+    host_historian = get_writable_historian(p_info, host_historian)
+    if args.commit_ranked_path is not None:
+      ranked = ranked_output.get_ranked(
+          args.commit_ranked_path, args.commit_rank)
+      best_match_config = ranked.match_config
+      if best_match_config.date_yyyymmdd != match_date.strftime('%Y%m%d'):
+        raise ValueError('rank %d of %s is for %s, not --match_date' % (
+            args.commit_rank, args.commit_ranked_path,
+            best_match_config.date_yyyymmdd))
+      validate_match_config(p_info, best_match_config)
+      print('committing rank %d (score %f) of %s' % (
+          args.commit_rank, ranked.score, args.commit_ranked_path))
+      push_match_config(host_historian, best_match_config, match_date)
+      plan = [(match_date, best_match_config)]
+    else:
+      seed = args.seed
+      if seed is None:
+        seed = random.getrandbits(64)
+      print('seed: %d' % seed)
+      traces = []
+      date_metrics = []
+      date_scorer_results = []
+      with run_metrics.timed_phase(metrics, 'search'):
+        with run_metrics.maybe_profile(args.profile):
+          date_plan = plan_match_configs(
+            p_info, host_historian, match_dates, args.N, seed=seed,
+            traces=traces, date_metrics=date_metrics,
+            date_scorer_results=date_scorer_results, workers=args.workers,
+            optimizer=args.optimizer, time_budget_s=args.time_budget_s,
+            stall_limit=args.stall_limit,
+            duplicate_limit=args.duplicate_limit,
+            count_unique=args.count_unique_configs, scorer_names=scorer_names,
+            exact_max_participants=args.exact_max_participants)
+      metrics['dates'] = date_metrics
+      plan = []
+      for i, (match_date, best_match_config, failed_match_generations) in (
+          enumerate(date_plan)):
+        print('match date: %s' % match_date.strftime('%Y-%m-%d'))
+        print_convergence_trace(traces[i])
+        print_exact_result(date_metrics[i])
+        print('failed match generations: %d' % failed_match_generations)
+        if 'unique_configs' in date_metrics[i]:
+          print('unique configs: %d' % date_metrics[i]['unique_configs'])
+        if len(scorer_names) > 1:
+          for name in scorer_names:
+            print_scorer_result(name, date_scorer_results[i][name])
+        plan.append((match_date, best_match_config))
+      if len(scorer_names) > 1:
+        print('writing the best match configs for scorer %s' % scorer_names[0])
+    warnings = write_outputs(
+        host_historian, plan, args.host_textproto_path,
+        args.updated_host_textproto_path, metrics, args.incremental_output)
 
-      best_match_config, failed_match_generations = get_best_match_config(
-        p_info, host_historian, match_date, int(args.N))
-      print('failed match generations: %d' % failed_match_generations)
-
-      push_match_config(
-          host_historian, best_match_config, match_date)
-      with open(args.updated_host_textproto_path, 'w') as out_file:
-        print(text_format.MessageToString(host_historian.to_proto()), file=out_file)
-      for match in best_match_config.match:
-        if match.host:
-          print(match.host + ': ' + ', '.join([m for m in match.member if m != match.host]))
-        else:
-          print('hostless: ' + ', '.join(match.member))
-      for warning in history_warnings.get_warnings(host_historian):
-        print(warning)
+  for match_date, best_match_config in plan:
+    if len(plan) > 1:
+      print('match config for %s:' % match_date.strftime('%Y-%m-%d'))
+    print_match_config(best_match_config)
+  for warning in warnings:
+    print(warning)
+
+  if args.metrics_json:
+    run_metrics.record_peak_memory(metrics)
+    with open(args.metrics_json, 'w') as metrics_file:
+      json.dump(metrics, metrics_file, indent=2, sort_keys=True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,302 @@
+"""Runs h2h for many chapters in one invocation.
+
+Starting the h2h binary once per chapter pays the interpreter & import
+startup every time, & each run only keeps --workers cores busy for its
+search. This binary takes a JSON manifest of chapter jobs & runs whole jobs
+(load, search, write) on one pool of --workers processes:
+
+  {
+    "defaults": {"N": 10000, "optimizer": "random"},
+    "jobs": [
+      {"name": "north", "participants_csv_path": "north.csv",
+       "host_textproto_path": "north.textproto",
+       "updated_host_textproto_path": "north-updated.textproto",
+       "match_date": "2018-10-30", "seed": 1},
+      ...
+    ]
+  }
+
+Each job's keys override the defaults. Relative paths are relative to the
+manifest. A job must have name, participants_csv_path,
+updated_host_textproto_path, match_date, one of host_textproto_path or
+history_store_path (a history_store file, which jobs can share: their
+processes map the same pages), & at least one of N, time_budget_s,
+stall_limit or duplicate_limit. Optional keys: seed,
+optimizer, exact_max_participants, scorers (a list), workers (search
+processes of the job), top_k & top_k_path, incremental_output &
+history_snapshot, as for the h2h binary. Every job is checked before any
+runs.
+
+A failing job doesn't stop the others, even if it kills its worker process:
+its error is recorded in the summary report (--report_path), next to every
+job's seed, score, failed match generations, warnings & phase timings. Exits
+with an error if any job failed.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import run_metrics
+from src.org.fotw.h2h import scorers
+
+
+_REQUIRED_KEYS = (
+    'name', 'match_date', 'participants_csv_path',
+    'updated_host_textproto_path')
+
+# Paths relative to the manifest.
+_PATH_KEYS = (
+    'participants_csv_path', 'host_textproto_path', 'history_store_path',
+    'updated_host_textproto_path', 'top_k_path')
+
+_STOP_KEYS = ('N', 'time_budget_s', 'stall_limit', 'duplicate_limit')
+
+# The type of the value of every job key. Numbers must be positive.
+_KEY_TYPES = {
+    'name': str,
+    'match_date': str,
+    'participants_csv_path': str,
+    'host_textproto_path': str,
+    'history_store_path': str,
+    'updated_host_textproto_path': str,
+    'N': int,
+    'time_budget_s': float,
+    'stall_limit': int,
+    'duplicate_limit': int,
+    'seed': int,
+    'optimizer': str,
+    'exact_max_participants': int,
+    'scorers': list,
+    'workers': int,
+    'top_k': int,
+    'top_k_path': str,
+    'incremental_output': bool,
+    'history_snapshot': bool,
+}
+
+
+def _check_type(key, value):
+  expected_type = _KEY_TYPES[key]
+  if expected_type is float:
+    ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+  elif expected_type is int:
+    ok = isinstance(value, int) and not isinstance(value, bool)
+  else:
+    ok = isinstance(value, expected_type)
+  if not ok:
+    raise ValueError('%s must be a %s, not %r' % (
+        key, expected_type.__name__, value))
+  if expected_type in (int, float) and key != 'seed' and value <= 0:
+    raise ValueError('%s must be positive' % key)
+
+
+def _check_job(job):
+  """Raises ValueError if a job from the manifest can't be run."""
+  if not isinstance(job, dict):
+    raise ValueError('a job must be an object, not %r' % job)
+  unknown_keys = sorted(set(job) - set(_KEY_TYPES))
+  if unknown_keys:
+    raise ValueError('unknown keys: %s' % ', '.join(unknown_keys))
+  for key in _REQUIRED_KEYS:
+    if key not in job:
+      raise ValueError('%s is required' % key)
+  for key, value in job.items():
+    if value is not None or key in _REQUIRED_KEYS:
+      _check_type(key, value)
+  if not any(job.get(key) is not None for key in _STOP_KEYS):
+    raise ValueError('one of %s is required' % ', '.join(_STOP_KEYS))
+  if (job.get('host_textproto_path') is None) == (
+      job.get('history_store_path') is None):
+    raise ValueError(
+        'exactly one of host_textproto_path or history_store_path is required')
+  if job.get('history_snapshot') and job.get('history_store_path') is not None:
+    raise ValueError('history_snapshot requires host_textproto_path')
+  datetime.datetime.strptime(job['match_date'], '%Y-%m-%d')
+  if job.get('optimizer', 'random') not in h2h.OPTIMIZERS:
+    raise ValueError('unknown optimizer: %s' % job['optimizer'])
+  for name in job.get('scorers', ['default']):
+    if name not in scorers.get_scorer_names():
+      raise ValueError('unknown scorer: %s' % name)
+  if (job.get('top_k') is None) != (job.get('top_k_path') is None):
+    raise ValueError('top_k & top_k_path must be set together')
+
+
+def parse_manifest(manifest_path):
+  """Returns the list of job dictionaries of the manifest at manifest_path.
+
+  Defaults are applied & paths are made relative to the working directory.
+  Raises ValueError if any job is malformed, before anything runs.
+  """
+  with open(manifest_path) as manifest_file:
+    manifest = json.load(manifest_file)
+  if not isinstance(manifest, dict):
+    raise ValueError('the manifest must be an object with "jobs"')
+  defaults = manifest.get('defaults', {})
+  manifest_jobs = manifest.get('jobs', [])
+  if not isinstance(defaults, dict):
+    raise ValueError('"defaults" must be an object')
+  if not isinstance(manifest_jobs, list):
+    raise ValueError('"jobs" must be a list')
+  manifest_dir = os.path.dirname(manifest_path)
+  jobs = []
+  names = set()
+  output_paths = set()
+  for i, manifest_job in enumerate(manifest_jobs):
+    if not isinstance(manifest_job, dict):
+      raise ValueError('job %d: a job must be an object' % i)
+    job = dict(defaults)
+    job.update(manifest_job)
+    try:
+      _check_job(job)
+    except ValueError as e:
+      raise ValueError('job %d (%s): %s' % (i, job.get('name', '?'), e))
+    for key in _PATH_KEYS:
+      if job.get(key) is not None:
+        job[key] = os.path.join(manifest_dir, job[key])
+    if job['name'] in names:
+      raise ValueError('duplicate job name: %s' % job['name'])
+    names.add(job['name'])
+    for key in ('updated_host_textproto_path', 'top_k_path'):
+      if job.get(key) is None:
+        continue
+      if job[key] in output_paths:
+        raise ValueError(
+            'job %s: another job also writes %s' % (job['name'], job[key]))
+      output_paths.add(job[key])
+    jobs.append(job)
+  return jobs
+
+
+def run_job(job):
+  """Runs one job like the h2h binary & returns its report dictionary.
+
+  Doesn't raise: errors are reported under 'error'.
+  """
+  start = time.perf_counter()
+  metrics = {}
+  report = {'name': job['name'], 'seed': job.get('seed')}
+  if report['seed'] is None:
+    report['seed'] = random.getrandbits(64)
+  try:
+    search_kwargs = {}
+    if job.get('exact_max_participants') is not None:
+      search_kwargs['exact_max_participants'] = job['exact_max_participants']
+    result = h2h.run_chapter(
+        job['participants_csv_path'], job.get('host_textproto_path'),
+        job['updated_host_textproto_path'],
+        datetime.datetime.strptime(job['match_date'], '%Y-%m-%d'),
+        job.get('N'), metrics,
+        history_snapshot=job.get('history_snapshot', False),
+        history_store_path=job.get('history_store_path'),
+        incremental_output=job.get('incremental_output', False),
+        top_k=job.get('top_k'), top_k_path=job.get('top_k_path'),
+        seed=report['seed'], workers=job.get('workers', 1),
+        optimizer=job.get('optimizer', 'random'),
+        time_budget_s=job.get('time_budget_s'),
+        stall_limit=job.get('stall_limit'),
+        duplicate_limit=job.get('duplicate_limit'),
+        scorer_names=job.get('scorers', ['default']), **search_kwargs)
+    report['warnings'] = result.warnings
+    report['best_score'] = metrics['best_score']
+    report['failed_match_generations'] = result.failed_match_generations
+  except Exception as e:
+    report['error'] = '%s: %s' % (type(e).__name__, e)
+  report['metrics'] = metrics
+  report['wall_s'] = time.perf_counter() - start
+  return report
+
+
+def _run_in_pool(jobs, job_indexes, reports, workers):
+  """Runs jobs[i] for each of job_indexes on a new pool of `workers` processes.
+
+  Fills in reports[i] & returns the job indexes whose pool broke, i.e. some
+  worker process died, before they finished.
+  """
+  broken = []
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+    futures = {executor.submit(run_job, jobs[i]): i for i in job_indexes}
+    for future in concurrent.futures.as_completed(futures):
+      i = futures[future]
+      try:
+        reports[i] = future.result()
+      except concurrent.futures.process.BrokenProcessPool as e:
+        broken.append(i)
+        reports[i] = {
+            'name': jobs[i]['name'], 'error': '%s: %s' % (type(e).__name__, e)}
+      except Exception as e:
+        reports[i] = {
+            'name': jobs[i]['name'], 'error': '%s: %s' % (type(e).__name__, e)}
+  return sorted(broken)
+
+
+def run_jobs(jobs, workers=1):
+  """Returns the reports of jobs, in order, running up to `workers` at once."""
+  if workers <= 1:
+    return [run_job(job) for job in jobs]
+  reports = [None] * len(jobs)
+  broken = _run_in_pool(jobs, range(len(jobs)), reports, workers)
+  # A worker process that dies (e.g. killed for using too much memory) breaks
+  # the whole pool, failing every job that hadn't finished. Rerun those one
+  # at a time in a pool of their own, so only the job at fault fails.
+  for i in broken:
+    _run_in_pool(jobs, [i], reports, 1)
+  return reports
+
+
+def print_report(report):
+  if 'error' in report:
+    print('%s: FAILED: %s' % (report['name'], report['error']))
+    return
+  print('%s: score %f, %d failed match generations, %d warnings, %.2fs' % (
+      report['name'], report['best_score'], report['failed_match_generations'],
+      len(report['warnings']), report['wall_s']))
+
+
+def main(argv):
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+      '--manifest_path',
+      required=True,
+      help='JSON manifest of the chapter jobs to run')
+  parser.add_argument(
+      '--report_path',
+      help='write the per-job summary report to this JSON file')
+  parser.add_argument(
+      '--workers',
+      type=int,
+      default=1,
+      help='number of jobs to run at once, each in its own process')
+  args = parser.parse_args(args=argv[1:])
+
+  try:
+    jobs = parse_manifest(args.manifest_path)
+  except ValueError as e:
+    parser.error(str(e))
+
+  start = time.perf_counter()
+  reports = run_jobs(jobs, workers=args.workers)
+  failed = sum(1 for report in reports if 'error' in report)
+  for report in reports:
+    print_report(report)
+  summary = {
+      'jobs': reports,
+      'failed_jobs': failed,
+      'wall_s': time.perf_counter() - start,
+  }
+  run_metrics.record_peak_memory(summary)
+  if args.report_path:
+    with open(args.report_path, 'w') as report_file:
+      json.dump(summary, report_file, indent=2, sort_keys=True)
+  if failed:
+    sys.exit('%d of %d jobs failed' % (failed, len(reports)))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
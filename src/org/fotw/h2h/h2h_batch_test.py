@@ -0,0 +1,218 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import h2h_batch
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import history_store
+from src.org.fotw.h2h import history_writer
+
+
+def _write_chapter(dir_name, chapter, families):
+  """Writes a chapter's participants csv & history textproto."""
+  with open(os.path.join(dir_name, chapter + '.csv'), 'w') as csv_file:
+    csv_file.write('name,is_family,participating,can_host,children,gender\n')
+    for i in range(families):
+      csv_file.write('%s%d,Y,Y,%s,0,\n' % (chapter, i, 'Y' if i % 3 else 'N'))
+  h = historian.Historian()
+  h.push_host_date(
+      chapter + '1', [chapter + '1', chapter + '2'],
+      datetime.datetime(2018, 10, 2))
+  history_writer.write_history(h, os.path.join(dir_name, chapter + '.textproto'))
+
+
+_run_job = h2h_batch.run_job
+
+
+def _run_job_or_kill_worker(job):
+  """Runs job, except that the 'crash' job kills the worker process."""
+  if job['name'] == 'crash':
+    os._exit(1)
+  return _run_job(job)
+
+
+def _make_job(chapter, **kwargs):
+  job = {
+      'name': chapter,
+      'participants_csv_path': chapter + '.csv',
+      'host_textproto_path': chapter + '.textproto',
+      'updated_host_textproto_path': chapter + '-updated.textproto',
+      'match_date': '2018-10-30',
+  }
+  job.update(kwargs)
+  return job
+
+
+class TestH2HBatch(unittest.TestCase):
+
+  def setUp(self):
+    self._dir = tempfile.TemporaryDirectory()
+    self.addCleanup(self._dir.cleanup)
+    _write_chapter(self._dir.name, 'north', 10)
+    _write_chapter(self._dir.name, 'south', 7)
+
+  def _get_path(self, name):
+    return os.path.join(self._dir.name, name)
+
+  def _write_manifest(self, jobs, defaults=None):
+    manifest_path = self._get_path('manifest.json')
+    with open(manifest_path, 'w') as manifest_file:
+      json.dump({'defaults': defaults or {}, 'jobs': jobs}, manifest_file)
+    return manifest_path
+
+  def _read(self, name):
+    with open(self._get_path(name)) as f:
+      return f.read()
+
+  def test_jobs_match_h2h_runs(self):
+    for chapter, seed in [('north', 1), ('south', 2)]:
+      h2h.main([
+          'h2h', '--participants_csv_path', self._get_path(chapter + '.csv'),
+          '--host_textproto_path', self._get_path(chapter + '.textproto'),
+          '--updated_host_textproto_path',
+          self._get_path(chapter + '-expected.textproto'),
+          '--match_date', '2018-10-30', '--N', '500', '--seed', str(seed)])
+    manifest_path = self._write_manifest(
+        [_make_job('north', seed=1), _make_job('south', seed=2)],
+        defaults={'N': 500})
+    for workers in [1, 2]:
+      reports = h2h_batch.run_jobs(
+          h2h_batch.parse_manifest(manifest_path), workers=workers)
+      self.assertEqual(['north', 'south'], [r['name'] for r in reports])
+      for report in reports:
+        self.assertNotIn('error', report)
+        self.assertEqual(
+            self._read(report['name'] + '-expected.textproto'),
+            self._read(report['name'] + '-updated.textproto'))
+        self.assertIn('search', report['metrics']['phase_s'])
+
+  def test_store_jobs_match_textproto_jobs(self):
+    # One store with the histories of both chapters.
+    h = historian.Historian()
+    for chapter in ['north', 'south']:
+      h.push_host_date(
+          chapter + '1', [chapter + '1', chapter + '2'],
+          datetime.datetime(2018, 10, 2))
+    history_store.write_store(h, self._get_path('all.store'))
+    jobs = []
+    for chapter, seed in [('north', 1), ('south', 2)]:
+      jobs.append(_make_job(chapter, seed=seed))
+      jobs.append(_make_job(
+          chapter + '-store', seed=seed, participants_csv_path=chapter + '.csv',
+          host_textproto_path=None, history_store_path='all.store',
+          updated_host_textproto_path=chapter + '-store.textproto'))
+    reports = h2h_batch.run_jobs(
+        h2h_batch.parse_manifest(self._write_manifest(jobs, {'N': 500})),
+        workers=2)
+    for report in reports:
+      self.assertNotIn('error', report)
+    h2h.main([
+        'h2h', '--participants_csv_path', self._get_path('north.csv'),
+        '--history_store_path', self._get_path('all.store'),
+        '--updated_host_textproto_path', self._get_path('north-main.textproto'),
+        '--match_date', '2018-10-30', '--N', '500', '--seed', '1'])
+    for chapter in ['north', 'south']:
+      self.assertEqual(
+          self._read(chapter + '-updated.textproto'),
+          self._read(chapter + '-store.textproto'))
+    self.assertEqual(
+        self._read('north-updated.textproto'),
+        self._read('north-main.textproto'))
+    self.assertEqual(reports[0]['warnings'], reports[1]['warnings'])
+
+  def test_failed_job_is_isolated(self):
+    manifest_path = self._write_manifest([
+        _make_job('missing', participants_csv_path='missing.csv', N=100),
+        _make_job('north', N=100, seed=1),
+    ])
+    report_path = self._get_path('report.json')
+    with self.assertRaisesRegex(SystemExit, '1 of 2 jobs failed'):
+      h2h_batch.main([
+          'h2h_batch', '--manifest_path', manifest_path, '--report_path',
+          report_path, '--workers', '2'])
+    with open(report_path) as report_file:
+      summary = json.load(report_file)
+    self.assertEqual(1, summary['failed_jobs'])
+    missing, north = summary['jobs']
+    self.assertRegex(missing['error'], 'FileNotFoundError')
+    self.assertNotIn('error', north)
+    self.assertEqual(1, north['seed'])
+    self.assertTrue(os.path.exists(self._get_path('north-updated.textproto')))
+
+  def test_dead_worker_only_fails_its_job(self):
+    manifest_path = self._write_manifest([
+        _make_job('north', N=100, seed=1),
+        _make_job('crash', participants_csv_path='north.csv',
+                  updated_host_textproto_path='crash-updated.textproto'),
+        _make_job('south', N=100, seed=2),
+    ], defaults={'N': 100})
+    with mock.patch.object(h2h_batch, 'run_job', _run_job_or_kill_worker):
+      reports = h2h_batch.run_jobs(
+          h2h_batch.parse_manifest(manifest_path), workers=2)
+    self.assertEqual(['north', 'crash', 'south'], [r['name'] for r in reports])
+    self.assertRegex(reports[1]['error'], 'BrokenProcessPool')
+    self.assertNotIn('error', reports[0])
+    self.assertNotIn('error', reports[2])
+
+  def test_parse_manifest_rejects_bad_jobs(self):
+    for jobs in [
+        [_make_job('north', N=100, n=100)],
+        [_make_job('north')],
+        [_make_job('north', N=100, match_date='2018/10/30')],
+        [_make_job('north', N=100, optimizer='greedy')],
+        [_make_job('north', N=100, scorers=['nope'])],
+        [_make_job('north', N=100), _make_job('north', N=100)],
+        [_make_job('north', N=100),
+         _make_job('south', N=100,
+                   updated_host_textproto_path='north-updated.textproto')],
+        [_make_job('north', N='100')],
+        [_make_job('north', N=100, seed='1')],
+        [_make_job('north', N=100, time_budget_s=0)],
+        [_make_job('north', N=100, incremental_output='yes')],
+        [_make_job('north', N=100, workers=True)],
+        [_make_job('north', N=100, top_k=3)],
+        [_make_job('north', N=100, name=None)],
+        ['north'],
+        [_make_job('north', N=100, history_store_path='all.store')],
+        [_make_job('north', N=100, host_textproto_path=None)],
+    ]:
+      with self.assertRaises(ValueError):
+        h2h_batch.parse_manifest(self._write_manifest(jobs))
+
+  def test_parse_manifest_rejects_bad_structure(self):
+    for manifest in [[], {'jobs': {}}, {'defaults': [], 'jobs': []}]:
+      manifest_path = self._get_path('manifest.json')
+      with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+      with self.assertRaises(ValueError):
+        h2h_batch.parse_manifest(manifest_path)
+
+  def test_job_search_options(self):
+    manifest_path = self._write_manifest([
+        _make_job('north', N=500, seed=1, workers=2, top_k=3,
+                  top_k_path='north-top.json'),
+        _make_job('south', optimizer='exact', exact_max_participants=5, N=500,
+                  seed=2),
+    ])
+    reports = h2h_batch.run_jobs(
+        h2h_batch.parse_manifest(manifest_path), workers=2)
+    for report in reports:
+      self.assertNotIn('error', report)
+    with open(self._get_path('north-top.json')) as top_k_file:
+      self.assertEqual(3, len(json.load(top_k_file)))
+    self.assertTrue(reports[1]['metrics']['exact_fallback'])
+
+  def test_parse_manifest_applies_defaults_and_paths(self):
+    jobs = h2h_batch.parse_manifest(self._write_manifest(
+        [_make_job('north'), _make_job('south', N=5)], defaults={'N': 100}))
+    self.assertEqual([100, 5], [job['N'] for job in jobs])
+    self.assertEqual(
+        self._get_path('north.csv'), jobs[0]['participants_csv_path'])
+
+
+if __name__ == '__main__':
+  unittest.main()
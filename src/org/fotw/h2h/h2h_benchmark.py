@@ -0,0 +1,147 @@
+"""Benchmarks each stage of the h2h pipeline on synthetic workloads.
+
+For every roster size, generates a participants CSV & a multi-year hosting
+history textproto (see synthetic_workload) and times each stage separately.
+Results are written as JSON so that runs can be compared for regressions.
+
+Example:
+bazel-bin/src/org/fotw/h2h/h2h_benchmark --roster_sizes 20,200,2000 \
+  --output_path /tmp/h2h-benchmark.json
+"""
+
+import argparse
+import io
+import json
+import random
+import sys
+import time
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import history_warnings
+from src.org.fotw.h2h import match_generator
+from src.org.fotw.h2h import synthetic_workload
+from src.org.fotw.h2h import textproto_reader
+from src.org.fotw.h2h.h2h_pb2 import MatchingHistory
+
+from com_google_protobuf_python_srcs.python.google.protobuf import text_format
+
+
+def _time(fn, repeats):
+  """Returns (seconds per call, last result) of calling fn repeats times."""
+  start = time.perf_counter()
+  for _ in range(repeats):
+    result = fn()
+  return (time.perf_counter() - start) / repeats, result
+
+
+def _parse_history_with_text_format(textproto_str):
+  """Reads a history the way h2h did before textproto_reader, for comparison."""
+  matching_history = MatchingHistory()
+  text_format.Parse(textproto_str, matching_history)
+  return historian.from_proto(matching_history)
+
+
+def run_benchmark(roster_size, n_dates, n, candidates, repeats, rng, **roster_kwargs):
+  """Returns a dictionary of workload sizes & per-stage timings in seconds."""
+  csv_str = synthetic_workload.gen_participants_csv(roster_size, rng, **roster_kwargs)
+  p_info = h2h.parse_participant_csv(io.StringIO(csv_str))
+  textproto_str = text_format.MessageToString(
+      synthetic_workload.gen_historian(p_info, n_dates, rng).to_proto())
+  match_date = synthetic_workload.get_next_date(n_dates)
+
+  stages = {}
+  stages['csv_parse_s'], _ = _time(
+      lambda: h2h.parse_participant_csv(io.StringIO(csv_str)), repeats)
+  stages['history_load_s'], host_historian = _time(
+      lambda: textproto_reader.read_historian(io.StringIO(textproto_str)),
+      repeats)
+  stages['history_load_text_format_s'], _ = _time(
+      lambda: _parse_history_with_text_format(textproto_str), repeats)
+
+  match_configs = []
+
+  def gen():
+    match_config, _ = match_generator.gen_sprinkler_match_config(
+        match_date, p_info, rng)
+    match_configs.append(match_config)
+  gen_s, _ = _time(gen, candidates)
+  stages['gen_sprinkler_match_config_s'] = gen_s
+
+  configs = iter(match_configs)
+
+  def score():
+    match_config = next(configs)
+    h2h.push_match_config(host_historian, match_config, match_date)
+    h2h.get_match_config_score(p_info, host_historian, match_date)
+    h2h.pop_match_config(host_historian, match_config, match_date)
+  stages['get_match_config_score_s'], _ = _time(score, candidates)
+
+  stages['get_best_match_config_s'], (best_match_config, _) = _time(
+      lambda: h2h.get_best_match_config(
+          p_info, host_historian, match_date, n, seed=0),
+      repeats)
+
+  h2h.push_match_config(host_historian, best_match_config, match_date)
+  stages['to_proto_s'], _ = _time(
+      lambda: text_format.MessageToString(host_historian.to_proto()), repeats)
+  stages['get_warnings_s'], _ = _time(
+      lambda: history_warnings.get_warnings(host_historian), repeats)
+
+  return {
+      'roster_size': roster_size,
+      'past_dates': n_dates,
+      'N': n,
+      'csv_bytes': len(csv_str),
+      'history_textproto_bytes': len(textproto_str),
+      'stages': stages,
+  }
+
+
+def main(argv):
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+      '--roster_sizes', default='20,100,500,2000',
+      help='comma-separated roster sizes to benchmark')
+  parser.add_argument(
+      '--past_dates', type=int, default=60,
+      help='number of past dates in the synthetic history')
+  parser.add_argument(
+      '--family_fraction', type=float, default=0.6,
+      help='fraction of the roster that are families (the rest are singles)')
+  parser.add_argument(
+      '--host_fraction', type=float, default=0.8,
+      help='fraction of the families that can host')
+  parser.add_argument(
+      '--N', type=int, default=1000,
+      help='samples for the end-to-end get_best_match_config stage')
+  parser.add_argument(
+      '--candidates', type=int, default=100,
+      help='candidates to time the per-candidate generate & score stages with')
+  parser.add_argument(
+      '--repeats', type=int, default=1,
+      help='times to repeat each of the other stages')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument(
+      '--output_path',
+      help='where to write the JSON results. Defaults to stdout.')
+  args = parser.parse_args(args=argv[1:])
+
+  rng = random.Random(args.seed)
+  results = [
+      run_benchmark(
+          roster_size, args.past_dates, args.N, args.candidates, args.repeats,
+          rng, family_fraction=args.family_fraction,
+          host_fraction=args.host_fraction)
+      for roster_size in [int(x) for x in args.roster_sizes.split(',')]
+  ]
+  report = {'seed': args.seed, 'results': results}
+  if args.output_path:
+    with open(args.output_path, 'w') as out_file:
+      json.dump(report, out_file, indent=2, sort_keys=True)
+  else:
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,253 @@
+"""Long-running h2h matcher service.
+
+Loads the participants & hosting history once & keeps the Historian in
+memory, so interactive what-if searches skip the cold start of the h2h
+binary. Requests & responses are JSON objects, one per line, over a Unix
+socket (--socket_path) or a localhost TCP port (--port):
+
+  {"method": "search", "match_date": "2018-10-30", "n": 10000}
+    Optional: time_budget_s, stall_limit, duplicate_limit, seed, optimizer,
+    scorers (a list) & top_k, as for the h2h binary. Responds with the best
+    match_config, its score, the seed & the search metrics, plus the ranked
+    top_configs if top_k is set.
+  {"method": "commit", "match_config": {...}}
+    Adds a match_config returned by search to the history & writes the
+    history to --updated_host_textproto_path.
+  {"method": "warnings"}
+    Responds with the history warnings.
+
+Failed requests get {"error": message}. Requests are handled one at a time;
+searches run on a pool of --workers processes that's recreated after every
+commit.
+
+With --history_store_path, searches read the history store (see
+history_store) until the first commit, which switches to a Historian of the
+chapter's events (see h2h.get_writable_historian). Commits don't change the
+store; fold the updated textproto back in with history_store update.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import random
+import sys
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import history_warnings
+from src.org.fotw.h2h import history_writer
+from src.org.fotw.h2h import ranked_output
+
+
+class MatcherService():
+  """Answers request dictionaries against in-memory inputs."""
+
+  def __init__(
+      self, p_info, host_historian, host_textproto_path,
+      updated_host_textproto_path, workers=1, incremental_output=False):
+    self._p_info = p_info
+    self._host_historian = host_historian
+    # The history to push to & read warnings from, once it's needed.
+    self._writable_historian = None
+    # The latest history textproto, for appending committed match configs.
+    # None if the history came from a history store.
+    self._textproto_path = host_textproto_path
+    self._updated_host_textproto_path = updated_host_textproto_path
+    self._workers = workers
+    self._incremental_output = incremental_output
+    self._pool = None
+
+  def _get_pool(self):
+    if self._workers > 1 and self._pool is None:
+      self._pool = h2h.SearchPool(
+          self._p_info, self._host_historian, self._workers)
+    return self._pool
+
+  def _get_writable_historian(self):
+    if self._writable_historian is None:
+      self._writable_historian = h2h.get_writable_historian(
+          self._p_info, self._host_historian)
+    return self._writable_historian
+
+  def close(self):
+    if self._pool is not None:
+      self._pool.close()
+      self._pool = None
+
+  def handle(self, request):
+    """Returns the response dictionary for a request dictionary."""
+    method = request.get('method')
+    if method == 'search':
+      return self._search(request)
+    if method == 'commit':
+      return self._commit(request)
+    if method == 'warnings':
+      return {'warnings': history_warnings.get_warnings(
+          self._get_writable_historian())}
+    raise ValueError('unknown method: %s' % method)
+
+  def _search(self, request):
+    match_date = datetime.datetime.strptime(request['match_date'], '%Y-%m-%d')
+    seed = request.get('seed')
+    if seed is None:
+      seed = random.getrandbits(64)
+    k = request.get('top_k')
+    top_configs = None if k is None else []
+    metrics = {}
+    best_match_config, failed_match_generations = h2h.get_best_match_config(
+        self._p_info, self._host_historian, match_date, request.get('n'),
+        seed=seed, optimizer=request.get('optimizer', 'random'),
+        time_budget_s=request.get('time_budget_s'),
+        stall_limit=request.get('stall_limit'),
+        duplicate_limit=request.get('duplicate_limit'), metrics=metrics,
+        scorer_names=request.get('scorers', ['default']), k=k,
+        top_configs=top_configs, pool=self._get_pool())
+    if best_match_config is None:
+      raise ValueError('no match config found')
+    response = {
+        'seed': seed,
+        'score': metrics['best_score'],
+        'failed_match_generations': failed_match_generations,
+        'match_config': ranked_output.match_config_to_json(best_match_config),
+        'metrics': metrics,
+    }
+    if top_configs is not None:
+      response['top_configs'] = [
+          {'score': ranked.score,
+           'match_config': ranked_output.match_config_to_json(
+               ranked.match_config)}
+          for ranked in top_configs]
+    return response
+
+  def _commit(self, request):
+    match_config = ranked_output.match_config_from_json(request['match_config'])
+    match_date = datetime.datetime.strptime(
+        match_config.date_yyyymmdd, '%Y%m%d')
+    # A shared history store may hold other chapters' matches on match_date.
+    if any(m in self._p_info
+           for _, members in self._host_historian.get_events(match_date)
+           for m in members):
+      raise ValueError(
+          'the history already has matches on %s' % match_config.date_yyyymmdd)
+    h2h.validate_match_config(self._p_info, match_config)
+    self._host_historian = self._get_writable_historian()
+    h2h.push_match_config(self._host_historian, match_config, match_date)
+    # The pool's workers have the old history.
+    self.close()
+    # Commits after the first append to the file the previous one wrote.
+    appended = (
+        self._incremental_output and
+        self._textproto_path == self._updated_host_textproto_path and
+        history_writer.append_match_config(
+            self._updated_host_textproto_path, match_config, match_date))
+    if not appended:
+      history_writer.write_history(
+          self._host_historian, self._updated_host_textproto_path)
+    self._textproto_path = self._updated_host_textproto_path
+    return {'committed': match_config.date_yyyymmdd}
+
+
+async def start_server(service, socket_path=None, port=None):
+  """Returns an asyncio server answering requests with service."""
+  loop = asyncio.get_running_loop()
+  # Searches block, so they run off the event loop, one at a time.
+  executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+  async def handle_connection(reader, writer):
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        try:
+          response = await loop.run_in_executor(
+              executor, service.handle, json.loads(line))
+        except Exception as e:
+          response = {'error': str(e)}
+        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+        await writer.drain()
+    finally:
+      writer.close()
+
+  if socket_path is not None:
+    return await asyncio.start_unix_server(handle_connection, path=socket_path)
+  return await asyncio.start_server(
+      handle_connection, host='127.0.0.1', port=port)
+
+
+async def _serve(service, socket_path, port):
+  server = await start_server(service, socket_path=socket_path, port=port)
+  print('serving on %s' % (socket_path or 'localhost:%d' % port))
+  async with server:
+    await server.serve_forever()
+
+
+def main(argv):
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+      '--participants_csv_path',
+      required=True,
+      help='participants csv file location')
+  parser.add_argument(
+      '--host_textproto_path',
+      help='hosting textproto file location')
+  parser.add_argument(
+      '--history_store_path',
+      help='instead of --host_textproto_path, read the hosting history from '
+      'this history store (see h2h)')
+  parser.add_argument(
+      '--updated_host_textproto_path',
+      required=True,
+      help='where to write the hosting history after each commit')
+  parser.add_argument(
+      '--socket_path',
+      help='serve on this Unix socket')
+  parser.add_argument(
+      '--port',
+      type=int,
+      help='serve on this localhost TCP port')
+  parser.add_argument(
+      '--workers',
+      type=int,
+      default=1,
+      help='number of search processes, kept running between searches')
+  parser.add_argument(
+      '--history_snapshot',
+      action='store_true',
+      help='load the hosting history through a snapshot (see h2h)')
+  parser.add_argument(
+      '--incremental_output',
+      action='store_true',
+      help='append match configs committed after the first one instead of '
+      'rewriting the history (see h2h)')
+  args = parser.parse_args(args=argv[1:])
+  if (args.socket_path is None) == (args.port is None):
+    parser.error('exactly one of --socket_path or --port is required')
+  if (args.host_textproto_path is None) == (args.history_store_path is None):
+    parser.error(
+        'exactly one of --host_textproto_path or --history_store_path is '
+        'required')
+  if args.history_snapshot and args.history_store_path is not None:
+    parser.error('--history_snapshot requires --host_textproto_path')
+
+  p_info, host_historian = h2h.load_inputs(
+      args.participants_csv_path, args.host_textproto_path,
+      args.history_snapshot, args.history_store_path)
+  h2h.validate_inputs(
+      p_info, host_historian,
+      shared_history=args.history_store_path is not None)
+  service = MatcherService(
+      p_info, host_historian, args.host_textproto_path,
+      args.updated_host_textproto_path, workers=args.workers,
+      incremental_output=args.incremental_output)
+  try:
+    asyncio.run(_serve(service, args.socket_path, args.port))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    service.close()
+
+
+if __name__ == '__main__':
+  main(sys.argv)
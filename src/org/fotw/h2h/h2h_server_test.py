@@ -0,0 +1,213 @@
+import asyncio
+import copy
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import h2h_server
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import history_store
+from src.org.fotw.h2h import history_writer
+from src.org.fotw.h2h import ranked_output
+
+
+def _make_roster():
+  p_info = {}
+  for i in range(10):
+    p = h2h.Participant(
+        name='family%d' % i, is_family=True, participating=True,
+        can_host=(i % 3 != 0), child_count=0, gender_if_single='')
+    p_info[p.name] = p
+  return p_info
+
+
+class TestMatcherService(unittest.TestCase):
+
+  def setUp(self):
+    self._dir = tempfile.TemporaryDirectory()
+    self._p_info = _make_roster()
+    self._host_historian = historian.Historian()
+    self._host_historian.push_host_date(
+        'family1', ['family1', 'family2'], datetime.datetime(2018, 10, 2))
+    self._textproto_path = os.path.join(self._dir.name, 'history.textproto')
+    history_writer.write_history(self._host_historian, self._textproto_path)
+    self._updated_path = os.path.join(self._dir.name, 'updated.textproto')
+
+  def tearDown(self):
+    self._dir.cleanup()
+
+  def _make_service(self, workers=1):
+    service = h2h_server.MatcherService(
+        self._p_info, copy.deepcopy(self._host_historian), self._textproto_path,
+        self._updated_path, workers=workers, incremental_output=True)
+    self.addCleanup(service.close)
+    return service
+
+  def test_search_matches_h2h(self):
+    expected_config, _ = h2h.get_best_match_config(
+        self._p_info, self._host_historian, datetime.datetime(2018, 10, 30),
+        1500, seed=4)
+    for workers in [1, 2]:
+      response = self._make_service(workers).handle({
+          'method': 'search', 'match_date': '2018-10-30', 'n': 1500,
+          'seed': 4, 'top_k': 3})
+      self.assertEqual(
+          expected_config,
+          ranked_output.match_config_from_json(response['match_config']))
+      self.assertEqual(4, response['seed'])
+      self.assertEqual(3, len(response['top_configs']))
+      self.assertEqual(
+          response['match_config'], response['top_configs'][0]['match_config'])
+
+  def test_commit_then_search(self):
+    service = self._make_service(workers=2)
+    request = {'method': 'search', 'match_date': '2018-10-30', 'n': 1500, 'seed': 4}
+    match_config = service.handle(request)['match_config']
+    self.assertEqual(
+        {'committed': '20181030'},
+        service.handle({'method': 'commit', 'match_config': match_config}))
+
+    h2h.push_match_config(
+        self._host_historian,
+        ranked_output.match_config_from_json(match_config),
+        datetime.datetime(2018, 10, 30))
+    expected_path = os.path.join(self._dir.name, 'expected.textproto')
+    history_writer.write_history(self._host_historian, expected_path)
+    with open(expected_path) as expected, open(self._updated_path) as updated:
+      self.assertEqual(expected.read(), updated.read())
+
+    # Searches after the commit see the new history.
+    request['match_date'] = '2018-11-27'
+    expected_config, _ = h2h.get_best_match_config(
+        self._p_info, self._host_historian, datetime.datetime(2018, 11, 27),
+        1500, seed=4)
+    self.assertEqual(
+        expected_config,
+        ranked_output.match_config_from_json(
+            service.handle(request)['match_config']))
+
+  def test_later_commits_append(self):
+    service = self._make_service()
+    expected_path = os.path.join(self._dir.name, 'expected.textproto')
+    for match_date, hosts in [('20181030', (4, 5)), ('20181127', (7, 8))]:
+      match_config = {
+          'date_yyyymmdd': match_date,
+          'matches': [{'host': 'family%d' % hosts[0],
+                       'members': ['family%d' % i for i in hosts]}]}
+      with mock.patch.object(
+          history_writer, 'write_history',
+          wraps=history_writer.write_history) as write_history:
+        service.handle({'method': 'commit', 'match_config': match_config})
+      # Only the first commit rewrites the whole history.
+      self.assertEqual(match_date == '20181030', write_history.called)
+      h2h.push_match_config(
+          self._host_historian,
+          ranked_output.match_config_from_json(match_config),
+          datetime.datetime.strptime(match_date, '%Y%m%d'))
+    history_writer.write_history(self._host_historian, expected_path)
+    with open(expected_path) as expected, open(self._updated_path) as updated:
+      self.assertEqual(expected.read(), updated.read())
+
+  def test_history_store(self):
+    # The store also holds another chapter's history.
+    shared_historian = copy.deepcopy(self._host_historian)
+    shared_historian.push_host_date(
+        'other1', ['other1', 'other2'], datetime.datetime(2018, 10, 9))
+    store_path = os.path.join(self._dir.name, 'all.store')
+    history_store.write_store(shared_historian, store_path)
+    service = h2h_server.MatcherService(
+        self._p_info, history_store.HistoryStore(store_path), None,
+        self._updated_path, workers=2, incremental_output=True)
+    self.addCleanup(service.close)
+    expected_service = self._make_service(workers=2)
+    expected_path = self._updated_path + '.expected'
+    expected_service._updated_host_textproto_path = expected_path
+
+    request = {'method': 'search', 'match_date': '2018-10-30', 'n': 1500, 'seed': 4}
+    match_config = service.handle(request)['match_config']
+    self.assertEqual(
+        expected_service.handle(request)['match_config'], match_config)
+    self.assertEqual(
+        expected_service.handle({'method': 'warnings'}),
+        service.handle({'method': 'warnings'}))
+    for s in [service, expected_service]:
+      s.handle({'method': 'commit', 'match_config': match_config})
+    with open(expected_path) as expected, open(self._updated_path) as updated:
+      self.assertEqual(expected.read(), updated.read())
+
+  def test_commit_rejects_existing_date(self):
+    service = self._make_service()
+    match_config = {
+        'date_yyyymmdd': '20181002',
+        'matches': [{'host': 'family4', 'members': ['family4', 'family5']}]}
+    with self.assertRaises(ValueError):
+      service.handle({'method': 'commit', 'match_config': match_config})
+
+  def test_commit_ignores_other_chapters_dates(self):
+    shared_historian = copy.deepcopy(self._host_historian)
+    shared_historian.push_host_date(
+        'other1', ['other1', 'other2'], datetime.datetime(2018, 10, 9))
+    store_path = os.path.join(self._dir.name, 'all.store')
+    history_store.write_store(shared_historian, store_path)
+    service = h2h_server.MatcherService(
+        self._p_info, history_store.HistoryStore(store_path), None,
+        self._updated_path)
+    self.addCleanup(service.close)
+    match_config = {
+        'date_yyyymmdd': '20181009',
+        'matches': [{'host': 'family4', 'members': ['family4', 'family5']}]}
+    self.assertEqual(
+        {'committed': '20181009'},
+        service.handle({'method': 'commit', 'match_config': match_config}))
+
+  def test_warnings_reuse_writable_historian(self):
+    store_path = os.path.join(self._dir.name, 'history.store')
+    history_store.write_store(self._host_historian, store_path)
+    service = h2h_server.MatcherService(
+        self._p_info, history_store.HistoryStore(store_path), None,
+        self._updated_path)
+    self.addCleanup(service.close)
+    with mock.patch.object(
+        h2h, 'get_writable_historian',
+        wraps=h2h.get_writable_historian) as get_writable_historian:
+      first = service.handle({'method': 'warnings'})
+      self.assertEqual(first, service.handle({'method': 'warnings'}))
+    self.assertEqual(1, get_writable_historian.call_count)
+
+  def test_warnings(self):
+    self.assertIn('warnings', self._make_service().handle({'method': 'warnings'}))
+
+  def test_unknown_method(self):
+    with self.assertRaises(ValueError):
+      self._make_service().handle({'method': 'nope'})
+
+  def test_socket(self):
+    service = self._make_service()
+    socket_path = os.path.join(self._dir.name, 'h2h.sock')
+
+    async def run_client():
+      server = await h2h_server.start_server(service, socket_path=socket_path)
+      async with server:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        responses = []
+        for request in [
+            {'method': 'search', 'match_date': '2018-10-30', 'n': 100, 'seed': 1},
+            {'method': 'nope'}]:
+          writer.write(json.dumps(request).encode('utf-8') + b'\n')
+          await writer.drain()
+          responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    search_response, error_response = asyncio.run(run_client())
+    self.assertIn('match_config', search_response)
+    self.assertEqual({'error': 'unknown method: nope'}, error_response)
+
+
+if __name__ == '__main__':
+  unittest.main()
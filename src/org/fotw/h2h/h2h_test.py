@@ -1,9 +1,18 @@
+import contextlib
 import copy
 import datetime
+import io
+import os
+import random
+import tempfile
 import unittest
+from unittest import mock
 
 from src.org.fotw.h2h import h2h
 from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import history_writer
+from src.org.fotw.h2h import synthetic_workload
+from src.org.fotw.h2h import textproto_reader
 from src.org.fotw.h2h.h2h_pb2 import Match, MatchSet
 
 
@@ -150,6 +159,369 @@ class TestH2H(unittest.TestCase):
     
     self.assertEqual(expected_config, best_config)
 
+  def _make_roster(self):
+    p_info = {}
+    for i in range(10):
+      p = self._make_simple_participant('family%d' % i, can_host=(i % 3 != 0))
+      p_info[p.name] = p
+    return p_info
+
+  def test_get_best_match_config_is_reproducible_for_seed(self):
+    p_info = self._make_roster()
+    match_date = datetime.datetime(2018, 10, 30)
+
+    first_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, 2500, seed=7)
+    second_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, 2500, seed=7)
+    self.assertEqual(first_config, second_config)
+
+  def test_get_best_match_config_independent_of_workers(self):
+    p_info = self._make_roster()
+    host_historian = historian.Historian()
+    host_historian.push_host_date(
+        'family1', ['family2', 'family3'], datetime.datetime(2018, 10, 22))
+    match_date = datetime.datetime(2018, 10, 30)
+
+    serial_config, _ = h2h.get_best_match_config(
+        p_info, host_historian, match_date, 2500, seed=11, workers=1)
+    parallel_config, _ = h2h.get_best_match_config(
+        p_info, host_historian, match_date, 2500, seed=11, workers=3)
+    self.assertEqual(serial_config, parallel_config)
+
+  def test_get_best_match_config_search_pool(self):
+    p_info = self._make_roster()
+    host_historian = historian.Historian()
+    match_date = datetime.datetime(2018, 10, 30)
+    pool = h2h.SearchPool(p_info, host_historian, 2)
+    self.addCleanup(pool.close)
+
+    for seed, optimizer in [(11, 'random'), (3, 'anneal'), (11, 'random')]:
+      expected_config, _ = h2h.get_best_match_config(
+          p_info, host_historian, match_date, 2500, seed=seed,
+          optimizer=optimizer)
+      pooled_config, _ = h2h.get_best_match_config(
+          p_info, host_historian, match_date, 2500, seed=seed,
+          optimizer=optimizer, pool=pool)
+      self.assertEqual(expected_config, pooled_config)
+
+  def test_get_best_match_config_local_search_independent_of_workers(self):
+    p_info = self._make_roster()
+    match_date = datetime.datetime(2018, 10, 30)
+
+    serial_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, 2500, seed=3, workers=1,
+        optimizer='anneal')
+    parallel_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, 2500, seed=3, workers=2,
+        optimizer='anneal')
+    self.assertEqual(serial_config, parallel_config)
+
+  def test_get_best_match_config_stall_limit_independent_of_workers(self):
+    p_info = self._make_roster()
+    match_date = datetime.datetime(2018, 10, 30)
+
+    serial_trace = []
+    serial_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, None, seed=5, workers=1,
+        stall_limit=1500, trace=serial_trace)
+    parallel_trace = []
+    parallel_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, None, seed=5, workers=2,
+        stall_limit=1500, trace=parallel_trace)
+
+    self.assertEqual(serial_config, parallel_config)
+    self.assertEqual(
+        [(p.samples, p.best_score) for p in serial_trace],
+        [(p.samples, p.best_score) for p in parallel_trace])
+    # The search stops stall_limit samples after the last improvement.
+    self.assertEqual(serial_trace[-2].samples + 1500, serial_trace[-1].samples)
+
+  def test_get_best_match_config_time_budget(self):
+    p_info = self._make_roster()
+    trace = []
+    best_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), datetime.datetime(2018, 10, 30), None,
+        seed=5, time_budget_s=0.2, trace=trace)
+
+    self.assertIsNotNone(best_config)
+    self.assertLess(trace[-1].elapsed_s, 2)
+    best_scores = [point.best_score for point in trace]
+    self.assertEqual(sorted(best_scores), best_scores)
+
+  def test_get_best_match_config_zero_time_budget(self):
+    for optimizer, workers in [('random', 1), ('random', 2), ('anneal', 1)]:
+      trace = []
+      best_config, _ = h2h.get_best_match_config(
+          self._make_roster(), historian.Historian(),
+          datetime.datetime(2018, 10, 30), None, seed=5, workers=workers,
+          optimizer=optimizer, time_budget_s=0, trace=trace)
+      self.assertIsNotNone(best_config)
+      self.assertGreaterEqual(trace[-1].samples, 1)
+
+  def test_main_zero_time_budget(self):
+    with tempfile.TemporaryDirectory() as dir_name:
+      csv_path = os.path.join(dir_name, 'participants.csv')
+      with open(csv_path, 'w') as csv_file:
+        csv_file.write('name,is_family,participating,can_host,children,gender\n')
+        for name in self._make_roster():
+          csv_file.write('%s,Y,Y,Y,0,\n' % name)
+      host_textproto_path = os.path.join(dir_name, 'hosting.textproto')
+      history_writer.write_history(historian.Historian(), host_textproto_path)
+      updated_path = os.path.join(dir_name, 'updated.textproto')
+      with contextlib.redirect_stdout(io.StringIO()):
+        h2h.main([
+            'h2h', '--participants_csv_path', csv_path,
+            '--host_textproto_path', host_textproto_path,
+            '--updated_host_textproto_path', updated_path,
+            '--match_date', '2018-10-30', '--time_budget_s', '0'])
+      self.assertEqual(
+          10, len(textproto_reader.load_historian(updated_path).get_all_names()))
+
+  def test_get_best_match_config_metrics(self):
+    p_info = self._make_roster()
+    trace = []
+    metrics = {}
+    _, failed_match_generations = h2h.get_best_match_config(
+        p_info, historian.Historian(), datetime.datetime(2018, 10, 30), 2500,
+        seed=5, trace=trace, metrics=metrics, count_unique=True)
+
+    self.assertEqual(2500, metrics['samples'])
+    self.assertEqual(2500, metrics['candidates_generated'])
+    # Duplicate configs are only scored once.
+    self.assertEqual(metrics['unique_configs'], metrics['candidates_scored'])
+    self.assertLess(metrics['unique_configs'], 2500)
+    self.assertEqual(3, metrics['shards'])
+    self.assertEqual(failed_match_generations, metrics['failed_match_generations'])
+    self.assertEqual(trace[-1].best_score, metrics['best_score'])
+    self.assertGreater(metrics['candidates_scored_per_s'], 0)
+
+  def test_score_memo_stays_within_budget(self):
+    rng = random.Random(3)
+    match_date = datetime.datetime(2018, 10, 30)
+    small_p_info = synthetic_workload.gen_p_info(12, rng)
+    large_p_info = synthetic_workload.gen_p_info(60, rng)
+
+    with mock.patch.object(h2h, '_SCORE_MEMO_MAX_BYTES', 50000):
+      searcher = h2h._ShardSearcher(
+          small_p_info, historian.Historian(), match_date, 'random',
+          ('default',))
+      for shard_index in range(5):
+        searcher.search(5, shard_index, 1000, None)
+        memo = searcher._score_memo
+        self.assertLessEqual(memo.get_bytes(), 50000)
+        self.assertGreater(len(memo), 0)
+
+      # Large rosters only memoize searches that look for duplicates.
+      searcher = h2h._ShardSearcher(
+          large_p_info, historian.Historian(), match_date, 'random',
+          ('default',))
+      searcher.search(5, 0, 100, None)
+      self.assertIsNone(searcher._score_memo)
+      searcher.search(5, 1, 1000, None, with_hashes=True)
+      self.assertLessEqual(searcher._score_memo.get_bytes(), 50000)
+      self.assertGreater(len(searcher._score_memo), 0)
+
+  def test_get_best_match_config_hashes_only_when_needed(self):
+    p_info = self._make_roster()
+    match_date = datetime.datetime(2018, 10, 30)
+    searcher = h2h._ShardSearcher(
+        p_info, historian.Historian(), match_date, 'random', ('default',))
+    self.assertEqual([], searcher.search(5, 0, 100, None).config_hashes)
+    self.assertEqual(
+        100,
+        len(searcher.search(5, 0, 100, None, with_hashes=True).config_hashes))
+
+    metrics = {}
+    h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, 100, seed=5, metrics=metrics)
+    self.assertNotIn('unique_configs', metrics)
+
+  def test_get_best_match_config_duplicate_limit_independent_of_workers(self):
+    # 4 hosts paired up 4! / 2! ways, with the 2 other families sprinkled in
+    # 2 ways: 24 reachable configs.
+    p_info = {}
+    for i in range(6):
+      p = self._make_simple_participant('family%d' % i, can_host=(i < 4))
+      p_info[p.name] = p
+    match_date = datetime.datetime(2018, 10, 30)
+
+    results = []
+    for workers in [1, 2]:
+      trace = []
+      metrics = {}
+      best_config, _ = h2h.get_best_match_config(
+          p_info, historian.Historian(), match_date, None, seed=5,
+          workers=workers, duplicate_limit=200, trace=trace, metrics=metrics)
+      results.append(
+          (best_config, trace[-1].samples, metrics['unique_configs']))
+
+    self.assertEqual(results[0], results[1])
+    _, samples, unique_configs = results[0]
+    self.assertEqual(24, unique_configs)
+    self.assertLess(samples, 1000)
+
+  def test_get_best_match_config_scorer_results(self):
+    p_info = self._make_roster()
+    host_historian = historian.Historian()
+    host_historian.push_host_date(
+        'family1', ['family2', 'family3'], datetime.datetime(2018, 10, 22))
+    match_date = datetime.datetime(2018, 10, 30)
+    scorer_names = ['default', 'rel_dev', 'extra_effort']
+
+    results = []
+    for workers in [1, 2]:
+      scorer_results = {}
+      best_config, _ = h2h.get_best_match_config(
+          p_info, host_historian, match_date, 2500, seed=3, workers=workers,
+          scorer_names=scorer_names, scorer_results=scorer_results)
+      results.append(scorer_results)
+
+    self.assertEqual(results[0], results[1])
+    self.assertEqual(set(scorer_names), set(results[0]))
+    default_result = results[0]['default']
+    self.assertEqual(best_config, default_result.match_config)
+    self.assertEqual(default_result.score, default_result.breakdown['score'])
+    # Searching for the default score alone finds the same config.
+    self.assertEqual(
+        best_config,
+        h2h.get_best_match_config(
+            p_info, host_historian, match_date, 2500, seed=3)[0])
+    for name in scorer_names:
+      self.assertEqual(
+          results[0][name].score, results[0][name].breakdown['score'])
+
+  def test_get_best_match_config_top_configs_independent_of_workers(self):
+    p_info = self._make_roster()
+    match_date = datetime.datetime(2018, 10, 30)
+
+    results = []
+    for workers in [1, 2]:
+      top_configs = []
+      best_config, _ = h2h.get_best_match_config(
+          p_info, historian.Historian(), match_date, None, seed=5,
+          workers=workers, stall_limit=1500, k=10, top_configs=top_configs)
+      results.append((best_config, top_configs))
+
+    self.assertEqual(results[0], results[1])
+    best_config, top_configs = results[0]
+    self.assertEqual(10, len(top_configs))
+    self.assertEqual(best_config, top_configs[0].match_config)
+    scores = [ranked.score for ranked in top_configs]
+    self.assertEqual(sorted(scores, reverse=True), scores)
+    self.assertEqual(
+        10, len(set(str(ranked.match_config) for ranked in top_configs)))
+
+  def test_get_best_match_config_top_configs_are_distinct(self):
+    # 24 reachable configs (see the duplicate_limit test).
+    p_info = {}
+    for i in range(6):
+      p = self._make_simple_participant('family%d' % i, can_host=(i < 4))
+      p_info[p.name] = p
+    top_configs = []
+    h2h.get_best_match_config(
+        p_info, historian.Historian(), datetime.datetime(2018, 10, 30), 2500,
+        seed=5, k=30, top_configs=top_configs)
+
+    self.assertEqual(24, len(top_configs))
+    self.assertEqual(
+        24, len(set(str(ranked.match_config) for ranked in top_configs)))
+
+  def test_get_best_match_config_top_configs_require_random(self):
+    with self.assertRaises(ValueError):
+      h2h.get_best_match_config(
+          self._make_roster(), historian.Historian(),
+          datetime.datetime(2018, 10, 30), 100, optimizer='anneal', k=3,
+          top_configs=[])
+
+  def test_plan_match_configs_matches_one_run_per_date(self):
+    p_info = self._make_roster()
+    match_dates = h2h.get_match_dates(datetime.datetime(2018, 10, 30), 28, 3)
+    planned_historian = historian.Historian()
+    traces = []
+    date_metrics = []
+    plan = h2h.plan_match_configs(
+        p_info, planned_historian, match_dates, 1500, seed=9, traces=traces,
+        date_metrics=date_metrics)
+
+    expected_historian = historian.Historian()
+    for i, match_date in enumerate(match_dates):
+      best_config, _ = h2h.get_best_match_config(
+          p_info, expected_historian, match_date, 1500, seed=9 + i)
+      h2h.push_match_config(expected_historian, best_config, match_date)
+      self.assertEqual(match_date, plan[i][0])
+      self.assertEqual(best_config, plan[i][1])
+    self.assertEqual(expected_historian.to_proto(), planned_historian.to_proto())
+    self.assertEqual(3, len(traces))
+    self.assertEqual(
+        ['2018-10-30', '2018-11-27', '2018-12-25'],
+        [m['match_date'] for m in date_metrics])
+
+  def test_plan_match_configs_rejects_duplicate_dates(self):
+    match_date = datetime.datetime(2018, 10, 30)
+    with self.assertRaises(ValueError):
+      h2h.plan_match_configs(
+          self._make_roster(), historian.Historian(), [match_date, match_date],
+          100, seed=1)
+
+  def test_get_best_match_config_multiple_scorers_require_random(self):
+    with self.assertRaises(ValueError):
+      h2h.get_best_match_config(
+          self._make_roster(), historian.Historian(),
+          datetime.datetime(2018, 10, 30), 100, optimizer='anneal',
+          scorer_names=['default', 'rel_dev'])
+
+  def test_get_best_match_config_duplicate_limit_requires_random(self):
+    with self.assertRaises(ValueError):
+      h2h.get_best_match_config(
+          self._make_roster(), historian.Historian(),
+          datetime.datetime(2018, 10, 30), 100, optimizer='hillclimb',
+          duplicate_limit=10)
+
+  def test_get_best_match_config_exact(self):
+    p_info = self._make_roster()
+    match_date = datetime.datetime(2018, 10, 30)
+    sampled_metrics = {}
+    h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, 2500, seed=7,
+        metrics=sampled_metrics)
+    metrics = {}
+    trace = []
+    best_config, failed_match_generations = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, None, optimizer='exact',
+        time_budget_s=60, metrics=metrics, trace=trace)
+    self.assertEqual('20181030', best_config.date_yyyymmdd)
+    self.assertEqual(0, failed_match_generations)
+    self.assertTrue(metrics['proven_optimal'])
+    self.assertEqual(0, metrics['optimality_gap'])
+    self.assertGreaterEqual(metrics['best_score'], sampled_metrics['best_score'])
+    self.assertEqual(metrics['best_score'], trace[-1].best_score)
+    host_historian = historian.Historian()
+    h2h.push_match_config(host_historian, best_config, match_date)
+    self.assertEqual(
+        metrics['best_score'],
+        h2h.get_match_config_score(p_info, host_historian, match_date))
+
+  def test_get_best_match_config_exact_falls_back_to_random(self):
+    p_info = self._make_roster()
+    match_date = datetime.datetime(2018, 10, 30)
+    expected_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, 500, seed=3)
+    metrics = {}
+    best_config, _ = h2h.get_best_match_config(
+        p_info, historian.Historian(), match_date, 500, seed=3,
+        optimizer='exact', metrics=metrics, exact_max_participants=9)
+    self.assertEqual(expected_config, best_config)
+    self.assertTrue(metrics['exact_fallback'])
+    self.assertEqual('random', metrics['optimizer'])
+
+  def test_get_best_match_config_exact_requires_default_scorer(self):
+    with self.assertRaises(ValueError):
+      h2h.get_best_match_config(
+          self._make_roster(), historian.Historian(),
+          datetime.datetime(2018, 10, 30), 100, optimizer='exact',
+          scorer_names=['rel_dev'])
+
 
 if __name__ == '__main__':
   unittest.main()
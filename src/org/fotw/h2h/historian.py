@@ -4,209 +4,516 @@ Historian is a class that tracks event dates for a given pair of people.
 
 from src.org.fotw.h2h.h2h_pb2 import MatchingHistory, MatchSet, Match
 
+from array import array
 from collections import defaultdict
-import copy
+import bisect
 import datetime
 
 
 _TEXTPROTO_DATE_FORMAT = '%Y%m%d'
 
+# The last meet & host ordinals of pairs that never met or hosted.
+NEVER = 0
 
-def from_proto(matching_history):
-  h = Historian()
+# A previous last ordinal (see Historian._add_date) that isn't known.
+_UNKNOWN = -1
+
+
+def _iter_proto_events(matching_history):
   for match_set in matching_history.match_set:
     try:
       event_date = datetime.datetime.strptime(match_set.date_yyyymmdd, _TEXTPROTO_DATE_FORMAT)
     except ValueError:
       raise Exception('failed to parse match date %s' % match_set.date_yyyymmdd)
     for match in match_set.match:
-      if match.host:
-          h.push_host_date(match.host, match.member, event_date)
-      else:
-        h.push_hostless_date(match.member, event_date)
-  return h
+      yield event_date, match.host, match.member
 
 
-class TwoLevelDateDictionary():
-  def __init__(self):
-    # self._d[a][b] is a sorted list of dates
-    self._d = {}
-  
-  def keys(self):
-    return self._d.keys()
-  
-  def l2_keys(self, a):
-    if a not in self._d:
-      return []  # getters should not modify.
-    return self._d[a].keys()
-
-  def get_event_dates(self, a, b):
-    if a not in self._d:
-      return []  # getters should not modify.
-    if b not in self._d[a]:
-      return []  # getters should not modify.
-    return self._d[a][b]
-
-  def push_event_date(self, a, b, event_date):
-    if a not in self._d:
-      self._d[a] = {}
-    if b not in self._d[a]:
-      self._d[a][b] = []
-
-    mut_date_list = self._d[a][b]
-    if event_date not in mut_date_list:
-      mut_date_list.append(event_date)
-    mut_date_list.sort()
-
-  def pop_event_date(self, a, b, event_date):
-    if a not in self._d:
-      raise ValueError('pop from empty list')
-    if b not in self._d[a]:
-      raise ValueError('pop from empty list')
-
-    mut_date_list = self._d[a][b]
-    if event_date not in mut_date_list:
-      raise ValueError('event date to remove is not present')
-    mut_date_list.remove(event_date)
+def from_proto(matching_history):
+  return from_events(_iter_proto_events(matching_history))
 
 
-class Historian():
-  def __init__(self):
-    # self._host_dates[a][b] returns the list of times that a has hosted b
-    self._host_dates = TwoLevelDateDictionary()
+def from_events(events):
+  """Returns the Historian of (event_date, host, members) events.
 
-    # self._hostless_dates[a][b] returns the list of times that a has met with b
-    # and there was no host. In this dictionary, ordering doesn't
-    # matter so self._hostless_dates[a][b] = self._hostless_dates[b][a]    
-    self._hostless_dates = TwoLevelDateDictionary()
+  host is '' for hostless gatherings. The result is the same as pushing the
+  events one by one with push_host_date & push_hostless_date. They're pushed
+  in date order (keeping the order of events on the same date), so every
+  push only appends to the sorted date lists.
+  """
+  h = Historian()
+  for event_date, host, members in sorted(events, key=lambda event: event[0]):
+    if host:
+      h.push_host_date(host, members, event_date)
+    else:
+      h.push_hostless_date(members, event_date)
+  return h
 
-    # self._meet_dates[a][b] returns the list of times that a has met with b
-    # independent of whether a was hosting b. In this dictionary, ordering doesn't
-    # matter so self._meet_dates[a][b] = self._meet_dates[b][a]    
-    # Note: self._meet_dates also includes self._host_dates
-    self._meet_dates = TwoLevelDateDictionary()
 
-  def get_past_host_names(self):
-    return self._host_dates.keys()
+def get_event_pairs(events):
+  """Returns (meet_pairs, host_pairs) of (host, members) events.
+
+  meet_pairs are the sorted (a, b) tuples of everyone who met & host_pairs
+  the (host, guest) tuples. Co-guests of a hosted event don't meet.
+  """
+  meet_pairs = set()
+  host_pairs = set()
+  for host, members in events:
+    if host:
+      for member in members:
+        if member != host:
+          meet_pairs.add((host, member) if host < member else (member, host))
+          host_pairs.add((host, member))
+    else:
+      for a in members:
+        for b in members:
+          if a < b:
+            meet_pairs.add((a, b))
+  return meet_pairs, host_pairs
+
+
+def _meet_in(events, a, b):
+  """Returns whether a & b meet in any of the (host, members) events."""
+  for host, members in events:
+    if host:
+      if (host == a and b in members) or (host == b and a in members):
+        return True
+    elif a in members and b in members:
+      return True
+  return False
+
+
+def _host_in(events, host, guest):
+  """Returns whether host hosts guest in any of the (host, members) events."""
+  return any(
+      event_host == host and guest in members
+      for event_host, members in events)
 
-  def get_all_names(self):
-    name_set = set()
-    for a in self._meet_dates.keys():
-      name_set.add(a)
-      for b in self._meet_dates.l2_keys(a):
-        name_set.add(b)
 
-    return name_set
+class Historian():
+  """Tracks who met whom & who hosted whom, by date.
 
-  def get_host_dates(self, a, b):
-    return self._host_dates.get_event_dates(a, b)
+  The event log is the only record of dates. Per pair, only the meet & host
+  counts & the ordinals of the last meet & host dates are kept, sparsely for
+  the pairs that ever met, so the scoring queries are O(1) and memory grows
+  with the events & pairs rather than with every pair's dates.
+  get_meetup_dates & get_host_dates are derived from the event log when
+  called.
+  """
 
-  def push_host_date(self, host, members, event_date):
-    for member in members:
-      if member == host:
-        continue
-      self._meet_dates.push_event_date(host, member, event_date)
-      self._meet_dates.push_event_date(member, host, event_date)
+  def __init__(self):
+    # The primary event log. self._events[event_date] is the list of
+    # (host, members) tuples pushed for event_date in push order, where host
+    # is '' for hostless gatherings. self._event_dates is the sorted list of
+    # dates with events.
+    self._events = {}
+    self._event_dates = []
+
+    # Names are interned to dense integer ids on first push.
+    # self._name_ids[a] is the id of a and self._names[id] is its name.
+    self._name_ids = {}
+    self._names = []
+
+    # self._name_dates[i] is the sorted list of distinct dates with an event
+    # that i hosted or was a member of.
+    self._name_dates = []
+
+    # self._pair_slots[i][j] == self._pair_slots[j][i] is the slot of the
+    # pair of ids i & j, for every pair that has met. self._meet_counts[slot]
+    # is the number of dates they met on & self._last_meet_ordinals[slot]
+    # the ordinal of the last one. Host stats are directed:
+    # self._host_counts[2 * slot + (i > j)] is the number of dates i hosted j
+    # & self._last_host_ordinals at the same index the ordinal of the last.
+    # The _prev_*_ordinals are the last ordinals before the last day, or
+    # _UNKNOWN, so that popping the last date is usually O(1).
+    self._pair_slots = []
+    self._meet_counts = array('i')
+    self._last_meet_ordinals = array('i')
+    self._prev_meet_ordinals = array('i')
+    self._host_counts = array('i')
+    self._last_host_ordinals = array('i')
+    self._prev_host_ordinals = array('i')
+
+    # self._hosted_ordinals[i] is the sorted list of distinct date ordinals
+    # on which i hosted, and self._hosted_ordinal_guests[i][ordinal] is the
+    # number of guests i hosted on that date.
+    self._hosted_ordinals = []
+    self._hosted_ordinal_guests = []
+
+    # self._total_host_counts[i] is the total number of (guest, date) pairs
+    # i hosted, i.e. the sum of self.get_host_count(a, b) over all b.
+    self._total_host_counts = array('i')
+
+  def _intern(self, a):
+    name_id = self._name_ids.get(a)
+    if name_id is None:
+      name_id = len(self._names)
+      self._name_ids[a] = name_id
+      self._names.append(a)
+      self._name_dates.append([])
+      self._pair_slots.append({})
+      self._hosted_ordinals.append([])
+      self._hosted_ordinal_guests.append({})
+      self._total_host_counts.append(0)
+    return name_id
+
+  def _get_slot(self, a_id, b_id):
+    """Returns the slot of ids a & b, adding one if they never met."""
+    slot = self._pair_slots[a_id].get(b_id)
+    if slot is None:
+      slot = len(self._meet_counts)
+      self._pair_slots[a_id][b_id] = slot
+      self._pair_slots[b_id][a_id] = slot
+      self._meet_counts.append(0)
+      self._last_meet_ordinals.append(NEVER)
+      self._prev_meet_ordinals.append(NEVER)
+      self._host_counts.extend((0, 0))
+      self._last_host_ordinals.extend((NEVER, NEVER))
+      self._prev_host_ordinals.extend((NEVER, NEVER))
+    return slot
+
+  def _find_slot(self, a, b):
+    """Returns the slot of names a & b, or None."""
+    a_id = self._name_ids.get(a)
+    b_id = self._name_ids.get(b)
+    if a_id is None or b_id is None:
+      return None
+    return self._pair_slots[a_id].get(b_id)
+
+  def _get_dates_through(self, name_id, ordinal):
+    """Returns the dates of name_id's events up to & including day ordinal."""
+    name_dates = self._name_dates[name_id]
+    return name_dates[:bisect.bisect_left(
+        name_dates, datetime.datetime.fromordinal(ordinal + 1))]
+
+  def _find_last_ordinal(self, name_id, ordinal, is_match, first_ordinal=1):
+    """Returns the last day ordinal of name_id's dates with is_match(events).
+
+    Only days first_ordinal through ordinal are searched; NEVER if none match.
+    """
+    name_dates = self._name_dates[name_id]
+    i = bisect.bisect_left(
+        name_dates, datetime.datetime.fromordinal(ordinal + 1)) - 1
+    first_date = datetime.datetime.fromordinal(first_ordinal)
+    while i >= 0 and name_dates[i] >= first_date:
+      if is_match(self._events[name_dates[i]]):
+        return name_dates[i].toordinal()
+      i -= 1
+    return NEVER
+
+  @staticmethod
+  def _add_date(counts, lasts, prevs, i, ordinal):
+    """Counts a date on day ordinal in the stats at index i."""
+    counts[i] += 1
+    if ordinal > lasts[i]:
+      prevs[i] = lasts[i]
+      lasts[i] = ordinal
+    elif ordinal < lasts[i] and prevs[i] != _UNKNOWN:
+      prevs[i] = max(prevs[i], ordinal)
+
+  def _remove_date(self, counts, lasts, prevs, i, name_id, ordinal, is_match):
+    """Uncounts a date on day ordinal from the stats at index i.
+
+    is_match(events) is whether the pair's meeting (or hosting) is among
+    events; name_id's dates are searched with it when the new last ordinal
+    isn't known.
+    """
+    counts[i] -= 1
+    if not counts[i]:
+      lasts[i] = prevs[i] = NEVER
+    elif ordinal < lasts[i]:
+      if prevs[i] == ordinal:
+        prevs[i] = _UNKNOWN
+    elif self._find_last_ordinal(name_id, ordinal, is_match, ordinal):
+      pass  # Another date on the same day.
+    elif prevs[i] != _UNKNOWN:
+      lasts[i] = prevs[i]
+      prevs[i] = _UNKNOWN
+    else:
+      lasts[i] = self._find_last_ordinal(name_id, ordinal - 1, is_match)
+
+  def _add_meet_date(self, a, b, ordinal):
+    a_id = self._intern(a)
+    self._add_date(
+        self._meet_counts, self._last_meet_ordinals, self._prev_meet_ordinals,
+        self._get_slot(a_id, self._intern(b)), ordinal)
+
+  def _remove_meet_date(self, a, b, ordinal):
+    a_id = self._name_ids[a]
+    self._remove_date(
+        self._meet_counts, self._last_meet_ordinals, self._prev_meet_ordinals,
+        self._pair_slots[a_id][self._name_ids[b]], a_id, ordinal,
+        lambda events: _meet_in(events, a, b))
+
+  def _add_host_date(self, host, guest, event_date):
+    host_id = self._intern(host)
+    guest_id = self._intern(guest)
+    ordinal = event_date.toordinal()
+    self._add_date(
+        self._host_counts, self._last_host_ordinals, self._prev_host_ordinals,
+        2 * self._get_slot(host_id, guest_id) + (host_id > guest_id), ordinal)
+    self._total_host_counts[host_id] += 1
+
+    guest_counts = self._hosted_ordinal_guests[host_id]
+    if ordinal not in guest_counts:
+      guest_counts[ordinal] = 0
+      bisect.insort(self._hosted_ordinals[host_id], ordinal)
+    guest_counts[ordinal] += 1
+
+  def _remove_host_date(self, host, guest, event_date):
+    host_id = self._name_ids[host]
+    guest_id = self._name_ids[guest]
+    ordinal = event_date.toordinal()
+    self._remove_date(
+        self._host_counts, self._last_host_ordinals, self._prev_host_ordinals,
+        2 * self._pair_slots[host_id][guest_id] + (host_id > guest_id),
+        host_id, ordinal, lambda events: _host_in(events, host, guest))
+    self._total_host_counts[host_id] -= 1
+
+    guest_counts = self._hosted_ordinal_guests[host_id]
+    guest_counts[ordinal] -= 1
+    if guest_counts[ordinal] == 0:
+      del guest_counts[ordinal]
+      ordinals = self._hosted_ordinals[host_id]
+      # Usually the most recent date, so this is O(1) for push/pop searches.
+      del ordinals[bisect.bisect_left(ordinals, ordinal)]
+
+  def _push_event(self, host, members, event_date):
+    """Adds the event to the log & updates the stats of its new pairs."""
+    events = self._events.get(event_date)
+    if events is None:
+      events = self._events[event_date] = []
+      bisect.insort(self._event_dates, event_date)
+    ordinal = event_date.toordinal()
+    meet_pairs, host_pairs = get_event_pairs([(host, members)])
+    # Pairs that already met (or hosted) on event_date don't get another
+    # date. That can only be if their last date is on the same day, so the
+    # date's other events are only checked then.
+    old_pairs = None
+    for a, b in sorted(meet_pairs):
+      slot = self._find_slot(a, b)
+      if slot is not None and self._last_meet_ordinals[slot] >= ordinal:
+        if old_pairs is None:
+          old_pairs = get_event_pairs(events)
+        if (a, b) in old_pairs[0]:
+          continue
+      self._add_meet_date(a, b, ordinal)
+    for host_name, guest in sorted(host_pairs):
+      slot = self._find_slot(host_name, guest)
+      if slot is not None:
+        i = 2 * slot + (self._name_ids[host_name] > self._name_ids[guest])
+        if self._last_host_ordinals[i] >= ordinal:
+          if old_pairs is None:
+            old_pairs = get_event_pairs(events)
+          if (host_name, guest) in old_pairs[1]:
+            continue
+      self._add_host_date(host_name, guest, event_date)
+
+    events.append((host, tuple(members)))
+    for name in dict.fromkeys(([host] if host else []) + list(members)):
+      name_dates = self._name_dates[self._intern(name)]
+      i = bisect.bisect_left(name_dates, event_date)
+      if i == len(name_dates) or name_dates[i] != event_date:
+        name_dates.insert(i, event_date)
+
+  def _pop_event(self, host, members, event_date):
+    """Removes the event from the log & updates the stats of its pairs."""
+    events = self._events.get(event_date, [])
+    sorted_members = sorted(members)
+    # Searching from the end makes push/pop searches O(1).
+    i = len(events) - 1
+    while i >= 0:
+      if events[i][0] == host and sorted(events[i][1]) == sorted_members:
+        break
+      i -= 1
+    if i < 0:
+      raise ValueError('event to remove is not present')
+    del events[i]
+    if not events:
+      del self._events[event_date]
+      del self._event_dates[bisect.bisect_left(self._event_dates, event_date)]
+
+    remaining_names = set()
+    for event_host, event_members in events:
+      remaining_names.add(event_host)
+      remaining_names.update(event_members)
+    for name in dict.fromkeys(([host] if host else []) + list(members)):
+      if name not in remaining_names:
+        name_dates = self._name_dates[self._name_ids[name]]
+        del name_dates[bisect.bisect_left(name_dates, event_date)]
+
+    ordinal = event_date.toordinal()
+    meet_pairs, host_pairs = get_event_pairs([(host, members)])
+    remaining_meet_pairs, remaining_host_pairs = get_event_pairs(events)
+    for a, b in sorted(meet_pairs - remaining_meet_pairs):
+      self._remove_meet_date(a, b, ordinal)
+    for host_name, guest in sorted(host_pairs - remaining_host_pairs):
+      self._remove_host_date(host_name, guest, event_date)
 
-      self._host_dates.push_event_date(host, member, event_date)
+  def push_host_date(self, host, members, event_date):
+    self._push_event(host, members, event_date)
 
   def pop_host_date(self, host, members, event_date):
-    for member in members:
-      if member == host:
-        continue
-      self._meet_dates.pop_event_date(host, member, event_date)
-      self._meet_dates.pop_event_date(member, host, event_date)
-
-      self._host_dates.pop_event_date(host, member, event_date)
+    self._pop_event(host, members, event_date)
 
   def push_hostless_date(self, group, event_date):
-    for a in group:
-      for b in group:
-        if a == b:
-          continue
-        self._meet_dates.push_event_date(a, b, event_date)
-        self._hostless_dates.push_event_date(a, b, event_date)
-
+    self._push_event('', group, event_date)
 
   def pop_hostless_date(self, group, event_date):
-    for a in group:
-      for b in group:
-        if a == b:
-          continue
-        self._meet_dates.pop_event_date(a, b, event_date)
-        self._hostless_dates.pop_event_date(a, b, event_date)
+    self._pop_event('', group, event_date)
 
-  def get_meetup_dates(self, a, b):
-    return self._meet_dates.get_event_dates(a, b)
+  def get_past_host_names(self):
+    return [
+        name for name, total_host_count in zip(
+            self._names, self._total_host_counts)
+        if total_host_count]
+
+  def get_all_names(self):
+    """Returns the names of everyone who met someone."""
+    return set(
+        name for name, slots in zip(self._names, self._pair_slots)
+        if any(self._meet_counts[slot] for slot in slots.values()))
+
+  def _get_pair_names(self, a, is_counted):
+    a_id = self._name_ids.get(a)
+    if a_id is None:
+      return []
+    return [
+        self._names[b_id] for b_id, slot in self._pair_slots[a_id].items()
+        if is_counted(a_id, b_id, slot)]
 
   def get_past_guests(self, a):
-    return self._host_dates.l2_keys(a)
+    return self._get_pair_names(
+        a, lambda a_id, b_id, slot: self._host_counts[2 * slot + (a_id > b_id)])
 
   def get_past_associates(self, a):
-    return self._meet_dates.l2_keys(a)
-
-  def to_proto(self):
-    date_to_host_to_guests = defaultdict(lambda: defaultdict(set))
-    date_to_hostless_gatherings = defaultdict(set)
+    return self._get_pair_names(
+        a, lambda a_id, b_id, slot: self._meet_counts[slot])
 
-    for a in sorted(self._host_dates.keys()):
-      for b in self._host_dates.l2_keys(a):
-        if b == a:
-          continue
-        for event_date in self.get_host_dates(a, b):
-          date_to_host_to_guests[event_date][a].add(a)
-          date_to_host_to_guests[event_date][a].add(b)
+  def get_meetup_dates(self, a, b):
+    """Returns the sorted dates a & b met on, from the event log."""
+    slot = self._find_slot(a, b)
+    if slot is None or not self._meet_counts[slot]:
+      return []
+    return [
+        event_date for event_date in self._get_dates_through(
+            self._name_ids[a], self._last_meet_ordinals[slot])
+        if _meet_in(self._events[event_date], a, b)]
 
-    for a in self._hostless_dates.keys():
-      for b in self._hostless_dates.l2_keys(a):
-        for event_date in self._hostless_dates.get_event_dates(a, b):
-          date_to_hostless_gatherings[event_date].add((a, b))
+  def get_host_dates(self, a, b):
+    """Returns the sorted dates a hosted b on, from the event log."""
+    slot = self._find_slot(a, b)
+    if slot is None:
+      return []
+    i = 2 * slot + (self._name_ids[a] > self._name_ids[b])
+    if not self._host_counts[i]:
+      return []
+    return [
+        event_date for event_date in self._get_dates_through(
+            self._name_ids[a], self._last_host_ordinals[i])
+        if _host_in(self._events[event_date], a, b)]
+
+  def get_meet_count(self, a, b):
+    """Equivalent to len(self.get_meetup_dates(a, b)), in O(1)."""
+    slot = self._find_slot(a, b)
+    return 0 if slot is None else self._meet_counts[slot]
+
+  def get_host_count(self, a, b):
+    """Equivalent to len(self.get_host_dates(a, b)), in O(1)."""
+    slot = self._find_slot(a, b)
+    if slot is None:
+      return 0
+    return self._host_counts[2 * slot + (self._name_ids[a] > self._name_ids[b])]
+
+  def get_last_meet_ordinal(self, a, b):
+    """Returns the day ordinal of the last date a & b met, or NEVER, in O(1)."""
+    slot = self._find_slot(a, b)
+    return NEVER if slot is None else self._last_meet_ordinals[slot]
+
+  def get_last_host_ordinal(self, a, b):
+    """Returns the day ordinal of the last date a hosted b, or NEVER, in O(1)."""
+    slot = self._find_slot(a, b)
+    if slot is None:
+      return NEVER
+    return self._last_host_ordinals[
+        2 * slot + (self._name_ids[a] > self._name_ids[b])]
+
+  def get_total_host_count(self, a):
+    """Returns the sum of len(self.get_host_dates(a, b)) over all b, in O(1)."""
+    if a not in self._name_ids:
+      return 0
+    return self._total_host_counts[self._name_ids[a]]
+
+  def get_last_host_date(self, a):
+    """Returns the most recent date a hosted anyone, or None.
+
+    Dates are day granular (as in the textproto), so the time of day of the
+    pushed datetimes is dropped.
+    """
+    if a not in self._name_ids:
+      return None
+    ordinals = self._hosted_ordinals[self._name_ids[a]]
+    if not ordinals:
+      return None
+    return datetime.datetime.fromordinal(ordinals[-1])
+
+  def get_event_dates(self):
+    """Returns the sorted list of dates with events. Don't modify it."""
+    return self._event_dates
+
+  def get_events(self, event_date):
+    """Returns the (host, members) events of event_date in push order.
+
+    host is '' for hostless gatherings. Don't modify the returned list.
+    """
+    return self._events.get(event_date, [])
+
+  def get_last_event_dates(self, k, hosted_only=False):
+    """Returns the (up to) k most recent event dates, in increasing order.
+
+    With hosted_only, only dates on which someone hosted a guest count (i.e.
+    dates that appear in get_host_dates).
+    """
+    last_dates = []
+    i = len(self._event_dates) - 1
+    while i >= 0 and len(last_dates) < k:
+      event_date = self._event_dates[i]
+      if not hosted_only or any(
+          host and any(m != host for m in members)
+          for host, members in self._events[event_date]):
+        last_dates.append(event_date)
+      i -= 1
+    last_dates.reverse()
+    return last_dates
 
+  def to_proto(self):
+    """Serializes the event log, in O(events)."""
     matching_history = MatchingHistory()
-    all_event_dates = set(list(date_to_host_to_guests.keys()) + list(date_to_hostless_gatherings.keys()))
-    for event_date in sorted(all_event_dates):
+    for event_date in self._event_dates:
+      host_to_members = defaultdict(set)
+      hostless_groups = set()
+      for host, members in self._events[event_date]:
+        if host:
+          guests = [m for m in members if m != host]
+          if guests:
+            host_to_members[host].add(host)
+            host_to_members[host].update(guests)
+        else:
+          group = tuple(sorted(set(members)))
+          if len(group) > 1:
+            hostless_groups.add(group)
+      if not host_to_members and not hostless_groups:
+        continue  # Nobody met.
+
       match_set = matching_history.match_set.add()
       match_set.date_yyyymmdd = event_date.strftime(_TEXTPROTO_DATE_FORMAT)
+      for host in sorted(host_to_members.keys()):
+        match = match_set.match.add()
+        match.host = host
+        match.member.extend(sorted(host_to_members[host]))
+      # Sorting by the sorted members sorts by each group's first member.
+      for hostless_group in sorted(hostless_groups):
+        match = match_set.match.add()
+        match.member.extend(hostless_group)
 
-      if event_date in date_to_host_to_guests:
-        for host in sorted(date_to_host_to_guests[event_date].keys()):
-          match = match_set.match.add()
-          match.host = host
-          del match.member[:]  # Or potentially match.ClearField('member')
-          match.member.extend(sorted(date_to_host_to_guests[event_date][host]))
-      
-      if event_date in date_to_hostless_gatherings:
-        hostless_groups = []
-        name_to_group_index = {}
-        for (a, b) in date_to_hostless_gatherings[event_date]:
-          if a in name_to_group_index and b in name_to_group_index:
-            if name_to_group_index[a] == name_to_group_index[b]:
-              continue # No need to merge
-            # Merge groups (from b's group to a's group)!
-            to_idx = name_to_group_index[a]
-            from_idx = name_to_group_index[b]
-            hostless_groups[to_idx].update(hostless_groups[from_idx])
-            # Update name_to_group_index for old group members
-            for m in hostless_groups[from_idx]:
-              name_to_group_index[m] = to_idx
-            # Empty the old group so there's no ambiguity
-            hostless_groups[from_idx] = set()
-          elif a in name_to_group_index:
-            hostless_groups[name_to_group_index[a]].add(b)
-            name_to_group_index[b] = name_to_group_index[a]
-          elif b in name_to_group_index:
-            hostless_groups[name_to_group_index[b]].add(a)
-            name_to_group_index[a] = name_to_group_index[b]
-          else:
-            hostless_groups.append(set([a, b]))
-            name_to_group_index[a] = len(hostless_groups) - 1
-            name_to_group_index[b] = name_to_group_index[a]
-
-        hostless_groups = [g for g in hostless_groups if len(g) > 0]
-        hostless_groups.sort(key=lambda group: min(group))
-        for hostless_group in hostless_groups:
-          match = match_set.match.add()
-          del match.member[:]  # Or potentially match.ClearField('member')
-          match.member.extend(sorted(hostless_group))
-    
     return matching_history
@@ -5,6 +5,7 @@ from com_google_protobuf_python_srcs.python.google.protobuf import text_format
 
 import datetime
 import os
+import random
 import unittest
 
 class TestHistorian(unittest.TestCase):
@@ -65,6 +66,170 @@ class TestHistorian(unittest.TestCase):
     # pops last date.
     self.assertEqual([event_date_a, event_date_b], h.get_host_dates('a', 'b'))
 
+  def test_counts_track_push_pop(self):
+    h = historian.Historian()
+
+    event_date_a = datetime.datetime(2018, 10, 30)
+    event_date_b = datetime.datetime(2018, 10, 31)
+
+    h.push_host_date('a', ['a', 'b', 'c'], event_date_a)
+    h.push_host_date('a', ['b'], event_date_b)
+    h.push_hostless_date(['b', 'c', 'd'], event_date_b)
+    # Pushing a date that's already present doesn't count twice.
+    h.push_host_date('a', ['b'], event_date_b)
+
+    self.assertEqual(2, h.get_meet_count('a', 'b'))
+    self.assertEqual(2, h.get_meet_count('b', 'a'))
+    # Co-guests of a hosted match don't count as meeting.
+    self.assertEqual(1, h.get_meet_count('b', 'c'))
+    self.assertEqual(0, h.get_meet_count('a', 'd'))
+    self.assertEqual(0, h.get_meet_count('a', 'unknown'))
+    self.assertEqual(2, h.get_host_count('a', 'b'))
+    self.assertEqual(0, h.get_host_count('b', 'a'))
+    self.assertEqual(3, h.get_total_host_count('a'))
+    self.assertEqual(0, h.get_total_host_count('b'))
+    self.assertEqual(event_date_b, h.get_last_host_date('a'))
+    self.assertIsNone(h.get_last_host_date('b'))
+
+    # The date stays while another event on it still has a & b meeting.
+    h.pop_host_date('a', ['b'], event_date_b)
+    self.assertEqual(2, h.get_meet_count('a', 'b'))
+
+    h.pop_host_date('a', ['b'], event_date_b)
+    h.pop_hostless_date(['b', 'c', 'd'], event_date_b)
+
+    self.assertEqual(1, h.get_meet_count('a', 'b'))
+    self.assertEqual(0, h.get_meet_count('b', 'c'))
+    self.assertEqual(1, h.get_host_count('a', 'b'))
+    self.assertEqual(2, h.get_total_host_count('a'))
+    self.assertEqual(event_date_a, h.get_last_host_date('a'))
+
+    h.pop_host_date('a', ['a', 'b', 'c'], event_date_a)
+    self.assertEqual(0, h.get_meet_count('a', 'b'))
+    self.assertEqual(0, h.get_total_host_count('a'))
+    self.assertIsNone(h.get_last_host_date('a'))
+
+  def test_event_log(self):
+    h = historian.Historian()
+
+    event_date_a = datetime.datetime(2018, 10, 30)
+    event_date_b = datetime.datetime(2018, 11, 6)
+    event_date_c = datetime.datetime(2018, 11, 13)
+
+    h.push_host_date('a', ['a', 'b'], event_date_a)
+    h.push_hostless_date(['c', 'd', 'e'], event_date_b)
+    h.push_hostless_date(['c', 'f', 'g'], event_date_b)
+    h.push_host_date('b', ['b', 'c'], event_date_c)
+
+    self.assertEqual([event_date_a, event_date_b, event_date_c], h.get_event_dates())
+    self.assertEqual(
+        [('', ('c', 'd', 'e')), ('', ('c', 'f', 'g'))],
+        h.get_events(event_date_b))
+    self.assertEqual([event_date_b, event_date_c], h.get_last_event_dates(2))
+    self.assertEqual(
+        [event_date_a, event_date_c], h.get_last_event_dates(2, hosted_only=True))
+
+    # Overlapping hostless groups on the same date stay separate.
+    match_set = h.to_proto().match_set[1]
+    self.assertEqual(
+        [['c', 'd', 'e'], ['c', 'f', 'g']],
+        [list(match.member) for match in match_set.match])
+
+    h.pop_hostless_date(['c', 'f', 'g'], event_date_b)
+    self.assertEqual(1, h.get_meet_count('c', 'd'))
+    self.assertEqual(0, h.get_meet_count('c', 'f'))
+
+    h.pop_host_date('b', ['b', 'c'], event_date_c)
+    self.assertEqual([event_date_a, event_date_b], h.get_event_dates())
+    with self.assertRaises(ValueError):
+      h.pop_host_date('b', ['b', 'c'], event_date_c)
+
+  def _get_state(self, h):
+    """Returns everything the Historian's getters can observe."""
+    names = sorted(h.get_all_names())
+    return {
+        'names': names,
+        'past_host_names': sorted(h.get_past_host_names()),
+        'event_dates': list(h.get_event_dates()),
+        'events': [h.get_events(d) for d in h.get_event_dates()],
+        'proto': h.to_proto(),
+        'pairs': [
+            (h.get_meetup_dates(a, b), h.get_host_dates(a, b),
+             h.get_meet_count(a, b), h.get_host_count(a, b),
+             h.get_last_meet_ordinal(a, b), h.get_last_host_ordinal(a, b))
+            for a in names for b in names],
+        'hosts': [
+            (h.get_total_host_count(a), h.get_last_host_date(a),
+             sorted(h.get_past_guests(a)), sorted(h.get_past_associates(a)),
+             h._hosted_ordinals[h._name_ids[a]],
+             h._hosted_ordinal_guests[h._name_ids[a]])
+            for a in names],
+    }
+
+  def _assert_consistent(self, h):
+    """Checks the pair stats against dates scanned from the event log."""
+    names = sorted(set(
+        m for d in h.get_event_dates() for host, members in h.get_events(d)
+        for m in members + ((host,) if host else ())))
+    for a in names:
+      for b in names:
+        meet_dates = [
+            d for d in h.get_event_dates()
+            if a != b and any(
+                (host and ((host == a and b in members) or
+                           (host == b and a in members))) or
+                (not host and a in members and b in members)
+                for host, members in h.get_events(d))]
+        host_dates = [
+            d for d in h.get_event_dates()
+            if a != b and (a, b) in set(
+                (host, m) for host, members in h.get_events(d) for m in members)]
+        self.assertEqual(meet_dates, h.get_meetup_dates(a, b))
+        self.assertEqual(len(meet_dates), h.get_meet_count(a, b))
+        self.assertEqual(
+            meet_dates[-1].toordinal() if meet_dates else historian.NEVER,
+            h.get_last_meet_ordinal(a, b))
+        self.assertEqual(host_dates, h.get_host_dates(a, b))
+        self.assertEqual(len(host_dates), h.get_host_count(a, b))
+        self.assertEqual(
+            host_dates[-1].toordinal() if host_dates else historian.NEVER,
+            h.get_last_host_ordinal(a, b))
+
+  def test_from_events_matches_pushes(self):
+    rng = random.Random(3)
+    names = ['p%d' % i for i in range(8)]
+    events = []
+    for _ in range(300):
+      # Out of order dates, repeated dates & times of day, duplicate members.
+      event_date = datetime.datetime(2018, 1, 1, rng.choice([0, 12])) + (
+          datetime.timedelta(days=rng.randrange(40)))
+      members = [rng.choice(names) for _ in range(rng.randint(1, 4))]
+      host = rng.choice(members) if rng.random() < 0.7 else ''
+      events.append((event_date, host, members))
+
+    pushed = historian.Historian()
+    for event_date, host, members in events:
+      if host:
+        pushed.push_host_date(host, members, event_date)
+      else:
+        pushed.push_hostless_date(members, event_date)
+    loaded = historian.from_events(events)
+    self.assertEqual(self._get_state(pushed), self._get_state(loaded))
+    self._assert_consistent(pushed)
+
+    # Bulk-loaded histories support push & pop like any other.
+    for i, (event_date, host, members) in enumerate(events[::-1]):
+      if host:
+        pushed.pop_host_date(host, members, event_date)
+        loaded.pop_host_date(host, members, event_date)
+      else:
+        pushed.pop_hostless_date(members, event_date)
+        loaded.pop_hostless_date(members, event_date)
+      self.assertEqual(self._get_state(pushed), self._get_state(loaded))
+      if i % 20 == 0:
+        self._assert_consistent(loaded)
+    self.assertEqual([], loaded.get_event_dates())
+
   def test_write_textproto_str(self):
     test_srcdir = os.environ['TEST_SRCDIR']
     testing_textproto_path = test_srcdir + '/__main__/src/org/fotw/h2h/h2h-testing-textproto.txt'
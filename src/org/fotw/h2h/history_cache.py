@@ -0,0 +1,90 @@
+"""Caches the Historian built from a hosting textproto in a snapshot file.
+
+Parsing the textproto & replaying it into a Historian gets slower with every
+year of history. The snapshot stores the pickled Historian together with the
+SHA-256 of the textproto it was built from, and is rebuilt automatically
+whenever the textproto's content changes.
+
+Snapshots are pickles, so only load snapshots that this tool wrote.
+"""
+
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+
+from src.org.fotw.h2h import textproto_reader
+
+
+# Bump whenever the pickled Historian's fields change so that old snapshots
+# are rebuilt instead of being loaded.
+_SNAPSHOT_VERSION = 4
+
+_SNAPSHOT_SUFFIX = '.snapshot'
+
+
+def get_snapshot_path(textproto_path):
+  return textproto_path + _SNAPSHOT_SUFFIX
+
+
+def _read_snapshot(snapshot_path, textproto_sha256):
+  """Returns the snapshotted Historian, or None if it's missing or stale."""
+  try:
+    with open(snapshot_path, 'rb') as snapshot_file:
+      snapshot = pickle.load(snapshot_file)
+  except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+    return None
+  if not isinstance(snapshot, dict):
+    return None
+  if snapshot.get('version') != _SNAPSHOT_VERSION:
+    return None
+  if snapshot.get('textproto_sha256') != textproto_sha256:
+    return None
+  return snapshot.get('historian')
+
+
+def _write_snapshot(snapshot_path, textproto_sha256, host_historian):
+  snapshot = {
+      'version': _SNAPSHOT_VERSION,
+      'textproto_sha256': textproto_sha256,
+      'historian': host_historian,
+  }
+  # Write to a unique temporary file next to the snapshot first, so readers
+  # never see a partial snapshot & concurrent writers don't clobber each
+  # other's temporary files.
+  fd, tmp_path = tempfile.mkstemp(
+      dir=os.path.dirname(os.path.abspath(snapshot_path)),
+      prefix=os.path.basename(snapshot_path) + '.', suffix='.tmp')
+  try:
+    with os.fdopen(fd, 'wb') as snapshot_file:
+      pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+  except BaseException:
+    os.remove(tmp_path)
+    raise
+
+
+def load_historian(textproto_path, snapshot_path=None):
+  """Returns the Historian for the textproto at textproto_path.
+
+  Loads it from the snapshot at snapshot_path (by default next to the
+  textproto) if that's up to date, and (re)writes the snapshot otherwise.
+  """
+  if snapshot_path is None:
+    snapshot_path = get_snapshot_path(textproto_path)
+  with open(textproto_path, 'rb') as textproto_file:
+    textproto_bytes = textproto_file.read()
+  textproto_sha256 = hashlib.sha256(textproto_bytes).hexdigest()
+
+  host_historian = _read_snapshot(snapshot_path, textproto_sha256)
+  if host_historian is not None:
+    return host_historian
+
+  host_historian = textproto_reader.read_historian(
+      line.decode('utf-8') for line in io.BytesIO(textproto_bytes))
+  try:
+    _write_snapshot(snapshot_path, textproto_sha256, host_historian)
+  except OSError:
+    pass  # The snapshot is only an optimization.
+  return host_historian
@@ -0,0 +1,77 @@
+from src.org.fotw.h2h import history_cache
+from src.org.fotw.h2h import textproto_reader
+
+from com_google_protobuf_python_srcs.python.google.protobuf import text_format
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+class TestHistoryCache(unittest.TestCase):
+
+  def setUp(self):
+    test_srcdir = os.environ['TEST_SRCDIR']
+    testing_textproto_path = test_srcdir + '/__main__/src/org/fotw/h2h/h2h-testing-textproto.txt'
+    self._tmp_dir = tempfile.mkdtemp()
+    self._textproto_path = os.path.join(self._tmp_dir, 'history.txt')
+    shutil.copyfile(testing_textproto_path, self._textproto_path)
+    with open(self._textproto_path, 'r') as textproto_file:
+      self._textproto_str = textproto_file.read()
+
+  def tearDown(self):
+    shutil.rmtree(self._tmp_dir)
+
+  def _load(self):
+    with mock.patch.object(
+        textproto_reader, 'read_historian',
+        wraps=textproto_reader.read_historian) as read_historian:
+      h = history_cache.load_historian(self._textproto_path)
+    return h, read_historian.called
+
+  def test_reuses_snapshot(self):
+    h, rebuilt = self._load()
+    self.assertTrue(rebuilt)
+    self.assertTrue(os.path.exists(
+        history_cache.get_snapshot_path(self._textproto_path)))
+
+    cached_h, rebuilt = self._load()
+    self.assertFalse(rebuilt)
+    self.assertEqual(
+        text_format.MessageToString(h.to_proto()),
+        text_format.MessageToString(cached_h.to_proto()))
+    self.assertEqual(self._textproto_str, text_format.MessageToString(cached_h.to_proto()))
+
+  def test_rebuilds_stale_snapshot(self):
+    self._load()
+    with open(self._textproto_path, 'a') as textproto_file:
+      textproto_file.write(
+          'match_set {\n  date_yyyymmdd: "20210407"\n'
+          '  match {\n    member: "Earl"\n    member: "Zed"\n    host: "Zed"\n  }\n}\n')
+
+    h, rebuilt = self._load()
+    self.assertTrue(rebuilt)
+    self.assertEqual(['Earl'], list(h.get_past_guests('Zed')))
+
+  def test_rebuilds_corrupt_snapshot(self):
+    self._load()
+    with open(history_cache.get_snapshot_path(self._textproto_path), 'wb') as f:
+      f.write(b'not a snapshot')
+
+    h, rebuilt = self._load()
+    self.assertTrue(rebuilt)
+    self.assertEqual(self._textproto_str, text_format.MessageToString(h.to_proto()))
+
+  def test_failed_snapshot_write_leaves_no_files(self):
+    with mock.patch.object(
+        history_cache.pickle, 'dump', side_effect=OSError('disk full')):
+      h, rebuilt = self._load()
+    self.assertTrue(rebuilt)
+    self.assertEqual(self._textproto_str, text_format.MessageToString(h.to_proto()))
+    self.assertEqual(['history.txt'], os.listdir(self._tmp_dir))
+
+
+if __name__ == '__main__':
+  unittest.main()
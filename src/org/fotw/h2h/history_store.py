@@ -0,0 +1,473 @@
+"""A memory-mapped, columnar, read-only store of a hosting history.
+
+Holding a multi-chapter history as a Historian costs every process its own
+nested dicts of datetime lists. A store file holds the same events as
+fixed-width columns, one row per (event, member):
+
+  date ordinal (i32), host id (i32, -1 if hostless), member id (i32),
+  flags (u8: _HOSTED, _EVENT_START)
+
+plus a name dictionary, per-pair indexes into sorted date columns & per-name
+hosting aggregates. HistoryStore opens it with mmap & answers the read
+queries of Historian (the ones scorers & warnings use) straight from the
+mapped pages, so worker processes share one copy through the page cache.
+A HistoryStore pickles as just its path, so e.g. h2h.SearchPool workers
+reopen the file instead of receiving a copy of the history.
+
+One store may hold the histories of several chapters (with distinct
+participant names). h2h, h2h_batch & h2h_server search a chapter against
+the store given by --history_store_path & write that chapter's events (see
+HistoryStore.to_historian) plus the new match set as a textproto. update
+folds such a textproto back into the store, replacing that chapter's events.
+
+Dates are stored as day ordinals, like the textproto. Textprotos convert to
+a store & back without loss: the result is what history_writer writes for
+the textproto.
+
+Usage:
+  history_store to_store --textproto_path=history.textproto --store_path=history.store
+  history_store to_store --textproto_path=a.textproto --textproto_path=b.textproto --store_path=history.store
+  history_store update --textproto_path=a_updated.textproto --store_path=history.store
+  history_store to_textproto --store_path=history.store --textproto_path=history.textproto
+
+Stores are written through a temporary file, so processes that have the old
+store mapped keep reading it until they reopen the path.
+"""
+
+import argparse
+import bisect
+import datetime
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import history_writer
+from src.org.fotw.h2h import textproto_reader
+
+
+_MAGIC = b'H2HSTORE'
+_VERSION = 1
+
+# Magic, version, byte order ('<' or '>'), then the lengths of the sections.
+_HEADER = struct.Struct('<8sI1s3xIIIIIII')
+
+# Row flags.
+_HOSTED = 1
+_EVENT_START = 2
+
+_NO_HOST = -1
+
+_BYTE_ORDER = b'<' if sys.byteorder == 'little' else b'>'
+
+
+def _align(n):
+  return (n + 7) & ~7
+
+
+def _iter_historian_events(host_historian):
+  for event_date in host_historian.get_event_dates():
+    for host, members in host_historian.get_events(event_date):
+      yield event_date, host, members
+
+
+def _get_pair_dates(host_historian):
+  """Returns ({(a, b): meet dates}, {(host, guest): host dates}).
+
+  Both directions of each meeting pair are keyed. Scanning the event log
+  once is much cheaper than asking for the dates of every pair.
+  """
+  meet_dates = {}
+  host_dates = {}
+  for event_date in host_historian.get_event_dates():
+    meet_pairs, host_pairs = historian.get_event_pairs(
+        host_historian.get_events(event_date))
+    for a, b in meet_pairs:
+      meet_dates.setdefault((a, b), []).append(event_date)
+      meet_dates.setdefault((b, a), []).append(event_date)
+    for pair in host_pairs:
+      host_dates.setdefault(pair, []).append(event_date)
+  return meet_dates, host_dates
+
+
+def _get_pair_index(pair_dates, name_ids, n):
+  """Returns (keys, starts, date ordinals) arrays for {(a, b): dates}.
+
+  keys are a_id * n + b_id in increasing order, and the dates of the i-th
+  key are ordinals[starts[i]:starts[i + 1]].
+  """
+  keyed = sorted(
+      (name_ids[a] * n + name_ids[b], dates)
+      for (a, b), dates in pair_dates.items())
+  keys = array('q')
+  starts = array('I', [0])
+  ordinals = array('i')
+  for key, dates in keyed:
+    keys.append(key)
+    ordinals.extend(d.toordinal() for d in dates)
+    starts.append(len(ordinals))
+  return keys, starts, ordinals
+
+
+def write_store(host_historian, store_path):
+  """Writes the events & indexes of a Historian (or HistoryStore) to store_path."""
+  names = []
+  name_ids = {}
+  dates = array('i')
+  hosts = array('i')
+  members = array('i')
+  flags = array('B')
+
+  def intern(name):
+    name_id = name_ids.get(name)
+    if name_id is None:
+      name_id = name_ids[name] = len(names)
+      names.append(name)
+    return name_id
+
+  for event_date, host, event_members in _iter_historian_events(host_historian):
+    ordinal = event_date.toordinal()
+    host_id = intern(host) if host else _NO_HOST
+    flag = (_HOSTED if host else 0) | _EVENT_START
+    for member in event_members:
+      dates.append(ordinal)
+      hosts.append(host_id)
+      members.append(intern(member))
+      flags.append(flag)
+      flag &= ~_EVENT_START
+
+  n = len(names)
+  meet_dates, host_dates = _get_pair_dates(host_historian)
+  meet_index = _get_pair_index(meet_dates, name_ids, n)
+  host_index = _get_pair_index(host_dates, name_ids, n)
+  total_host_counts = array('i', [
+      host_historian.get_total_host_count(a) for a in names])
+  last_host_ordinals = array('i', [
+      (host_historian.get_last_host_date(a) or datetime.datetime.min).toordinal()
+      for a in names])
+
+  encoded_names = [name.encode('utf-8') for name in names]
+  name_offsets = array('I', [0])
+  for encoded_name in encoded_names:
+    name_offsets.append(name_offsets[-1] + len(encoded_name))
+  sections = [
+      name_offsets, b''.join(encoded_names), dates, hosts, members, flags,
+      meet_index[0], meet_index[1], meet_index[2],
+      host_index[0], host_index[1], host_index[2],
+      total_host_counts, last_host_ordinals,
+  ]
+  header = _HEADER.pack(
+      _MAGIC, _VERSION, _BYTE_ORDER, n, len(dates), len(meet_index[0]),
+      len(meet_index[2]), len(host_index[0]), len(host_index[2]),
+      name_offsets[-1])
+  # Write to a unique temporary file next to the store first, so processes
+  # mapping the old store never see a partial one.
+  fd, tmp_path = tempfile.mkstemp(
+      dir=os.path.dirname(os.path.abspath(store_path)),
+      prefix=os.path.basename(store_path) + '.', suffix='.tmp')
+  try:
+    with os.fdopen(fd, 'wb') as store_file:
+      store_file.write(header)
+      offset = _align(len(header))
+      store_file.write(b'\0' * (offset - len(header)))
+      for section in sections:
+        data = section if isinstance(section, bytes) else section.tobytes()
+        store_file.write(data)
+        padding = _align(len(data)) - len(data)
+        store_file.write(b'\0' * padding)
+    os.replace(tmp_path, store_path)
+  except BaseException:
+    os.remove(tmp_path)
+    raise
+
+
+def merge_histories(host_historians):
+  """Returns a Historian with the events of all host_historians.
+
+  E.g. several chapters' histories, to write to one store. Events of the
+  same date keep the order of host_historians.
+  """
+  return historian.from_events(
+      event for host_historian in host_historians
+      for event in _iter_historian_events(host_historian))
+
+
+def update_store(store_path, chapter_historian):
+  """Replaces a chapter's events in the store at store_path.
+
+  The store's events of anyone in chapter_historian's events are dropped &
+  chapter_historian's events (e.g. those h2h wrote after a commit) take
+  their place. The events of other chapters stay as they are.
+  """
+  names = set()
+  for _, _, members in _iter_historian_events(chapter_historian):
+    names.update(members)
+  with HistoryStore(store_path) as store:
+    events = [
+        (event_date, host, members)
+        for event_date, host, members in store.iter_events()
+        if not any(m in names for m in members)]
+  events.extend(_iter_historian_events(chapter_historian))
+  write_store(historian.from_events(events), store_path)
+
+
+class HistoryStore():
+  """Read-only, Historian-compatible view of a store file.
+
+  Supports the Historian getters, to_proto & to_historian (for pushing).
+  close() unmaps the file; a HistoryStore is also a context manager that
+  closes it.
+  """
+
+  def __init__(self, store_path):
+    self._store_path = store_path
+    with open(store_path, 'rb') as store_file:
+      size = os.fstat(store_file.fileno()).st_size
+      if size < _HEADER.size:
+        raise ValueError('not a version %d history store: %s' % (
+            _VERSION, store_path))
+      self._mmap = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ)
+    self._view = memoryview(self._mmap)
+    self._sections = []
+    try:
+      self._map_sections()
+    except ValueError:
+      self.close()
+      raise
+
+  def _map_sections(self):
+    (magic, version, byte_order, n, n_rows, n_meet_pairs, n_meet_dates,
+     n_host_pairs, n_host_dates, names_size) = _HEADER.unpack_from(self._view)
+    if magic != _MAGIC or version != _VERSION:
+      raise ValueError('not a version %d history store: %s' % (
+          _VERSION, self._store_path))
+    if byte_order != _BYTE_ORDER:
+      raise ValueError(
+          'history store has the wrong byte order: %s' % self._store_path)
+
+    offset = _align(_HEADER.size)
+    for fmt, count in [
+        ('I', n + 1), ('B', names_size),
+        ('i', n_rows), ('i', n_rows), ('i', n_rows), ('B', n_rows),
+        ('q', n_meet_pairs), ('I', n_meet_pairs + 1), ('i', n_meet_dates),
+        ('q', n_host_pairs), ('I', n_host_pairs + 1), ('i', n_host_dates),
+        ('i', n), ('i', n)]:
+      size = count * struct.calcsize(fmt)
+      if offset + size > len(self._view):
+        raise ValueError('truncated history store: %s' % self._store_path)
+      with self._view[offset:offset + size] as section:
+        self._sections.append(section.cast(fmt))
+      offset += _align(size)
+    (name_offsets, names_blob, self._dates, self._hosts, self._members,
+     self._flags, self._meet_keys, self._meet_starts, self._meet_ordinals,
+     self._host_keys, self._host_starts, self._host_ordinals,
+     self._total_host_counts, self._last_host_ordinals) = self._sections
+
+    self._names = [
+        bytes(names_blob[name_offsets[i]:name_offsets[i + 1]]).decode('utf-8')
+        for i in range(n)]
+    self._name_ids = {name: i for i, name in enumerate(self._names)}
+    self._event_dates = None
+
+  def __reduce__(self):
+    # Other processes map the same file rather than copying the history.
+    return (HistoryStore, (self._store_path,))
+
+  def close(self):
+    """Unmaps the file. The store can't be read afterwards."""
+    for section in self._sections:
+      section.release()
+    self._sections = []
+    self._view.release()
+    self._mmap.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def _get_pair_range(self, keys, starts, a, b):
+    a_id = self._name_ids.get(a)
+    b_id = self._name_ids.get(b)
+    if a_id is None or b_id is None:
+      return 0, 0
+    key = a_id * len(self._names) + b_id
+    i = bisect.bisect_left(keys, key)
+    if i == len(keys) or keys[i] != key:
+      return 0, 0
+    return starts[i], starts[i + 1]
+
+  def _get_pair_names(self, keys, a):
+    """Returns the names b of the (a, b) keys, in id order."""
+    a_id = self._name_ids.get(a)
+    if a_id is None:
+      return []
+    n = len(self._names)
+    lo = bisect.bisect_left(keys, a_id * n)
+    hi = bisect.bisect_left(keys, (a_id + 1) * n)
+    return [self._names[keys[i] - a_id * n] for i in range(lo, hi)]
+
+  def get_meetup_dates(self, a, b):
+    start, end = self._get_pair_range(self._meet_keys, self._meet_starts, a, b)
+    return [datetime.datetime.fromordinal(o) for o in self._meet_ordinals[start:end]]
+
+  def get_meet_count(self, a, b):
+    start, end = self._get_pair_range(self._meet_keys, self._meet_starts, a, b)
+    return end - start
+
+  def get_host_dates(self, a, b):
+    start, end = self._get_pair_range(self._host_keys, self._host_starts, a, b)
+    return [datetime.datetime.fromordinal(o) for o in self._host_ordinals[start:end]]
+
+  def get_host_count(self, a, b):
+    start, end = self._get_pair_range(self._host_keys, self._host_starts, a, b)
+    return end - start
+
+  def get_last_meet_ordinal(self, a, b):
+    start, end = self._get_pair_range(self._meet_keys, self._meet_starts, a, b)
+    return self._meet_ordinals[end - 1] if end > start else historian.NEVER
+
+  def get_last_host_ordinal(self, a, b):
+    start, end = self._get_pair_range(self._host_keys, self._host_starts, a, b)
+    return self._host_ordinals[end - 1] if end > start else historian.NEVER
+
+  def get_total_host_count(self, a):
+    a_id = self._name_ids.get(a)
+    return 0 if a_id is None else self._total_host_counts[a_id]
+
+  def get_last_host_date(self, a):
+    a_id = self._name_ids.get(a)
+    if a_id is None or self._total_host_counts[a_id] == 0:
+      return None
+    return datetime.datetime.fromordinal(self._last_host_ordinals[a_id])
+
+  def get_past_guests(self, a):
+    return self._get_pair_names(self._host_keys, a)
+
+  def get_past_associates(self, a):
+    return self._get_pair_names(self._meet_keys, a)
+
+  def get_past_host_names(self):
+    n = len(self._names)
+    return list(dict.fromkeys(self._names[key // n] for key in self._host_keys))
+
+  def get_all_names(self):
+    n = len(self._names)
+    return set(self._names[key // n] for key in self._meet_keys)
+
+  def get_event_dates(self):
+    """Returns the sorted list of dates with events. Don't modify it."""
+    if self._event_dates is None:
+      self._event_dates = [
+          datetime.datetime.fromordinal(o) for o in dict.fromkeys(self._dates)]
+    return self._event_dates
+
+  def get_events(self, event_date):
+    """Returns the (host, members) events of event_date in push order."""
+    ordinal = event_date.toordinal()
+    if datetime.datetime.fromordinal(ordinal) != event_date:
+      return []
+    lo = bisect.bisect_left(self._dates, ordinal)
+    hi = bisect.bisect_right(self._dates, ordinal)
+    return self._get_row_events(lo, hi)
+
+  def _get_row_events(self, lo, hi):
+    events = []
+    for i in range(lo, hi):
+      member = self._names[self._members[i]]
+      if self._flags[i] & _EVENT_START:
+        host_id = self._hosts[i]
+        events.append((self._names[host_id] if host_id != _NO_HOST else '', [member]))
+      else:
+        events[-1][1].append(member)
+    return [(host, tuple(members)) for host, members in events]
+
+  def get_last_event_dates(self, k, hosted_only=False):
+    """Returns the (up to) k most recent event dates, in increasing order.
+
+    With hosted_only, only dates on which someone hosted a guest count.
+    """
+    last_dates = []
+    event_dates = self.get_event_dates()
+    i = len(event_dates) - 1
+    while i >= 0 and len(last_dates) < k:
+      event_date = event_dates[i]
+      if not hosted_only or any(
+          host and any(m != host for m in members)
+          for host, members in self.get_events(event_date)):
+        last_dates.append(event_date)
+      i -= 1
+    last_dates.reverse()
+    return last_dates
+
+  def iter_events(self):
+    """Yields (event_date, host, members) for every event, in order."""
+    rows = len(self._dates)
+    lo = 0
+    while lo < rows:
+      hi = bisect.bisect_right(self._dates, self._dates[lo], lo)
+      event_date = datetime.datetime.fromordinal(self._dates[lo])
+      for host, members in self._get_row_events(lo, hi):
+        yield event_date, host, members
+      lo = hi
+
+  def to_historian(self, names=None):
+    """Returns a Historian with the same events, e.g. to push to.
+
+    With names (e.g. a chapter's participants), only the events of anyone in
+    names are kept.
+    """
+    events = self.iter_events()
+    if names is not None:
+      events = (
+          (event_date, host, members) for event_date, host, members in events
+          if any(m in names for m in members))
+    return historian.from_events(events)
+
+  def to_proto(self):
+    return self.to_historian().to_proto()
+
+
+def main(argv):
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+      'direction',
+      choices=['to_store', 'update', 'to_textproto'],
+      help='to_store: convert --textproto_path to --store_path, merging the '
+      'histories if --textproto_path is given more than once. '
+      'update: replace the events of the chapter in --textproto_path in '
+      '--store_path. '
+      'to_textproto: convert --store_path to --textproto_path.')
+  parser.add_argument(
+      '--textproto_path',
+      required=True,
+      action='append',
+      help='hosting textproto file location')
+  parser.add_argument(
+      '--store_path',
+      required=True,
+      help='history store file location')
+  args = parser.parse_args(args=argv[1:])
+  if args.direction != 'to_store' and len(args.textproto_path) > 1:
+    parser.error('%s takes one --textproto_path' % args.direction)
+
+  if args.direction == 'to_store':
+    write_store(
+        merge_histories(
+            textproto_reader.load_historian(textproto_path)
+            for textproto_path in args.textproto_path),
+        args.store_path)
+  elif args.direction == 'update':
+    update_store(
+        args.store_path,
+        textproto_reader.load_historian(args.textproto_path[0]))
+  else:
+    with HistoryStore(args.store_path) as store:
+      history_writer.write_history(store, args.textproto_path[0])
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,217 @@
+import datetime
+import os
+import pickle
+import random
+import tempfile
+import unittest
+
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import history_store
+from src.org.fotw.h2h import history_writer
+
+
+def _get_random_historian(seed):
+  rng = random.Random(seed)
+  names = ['p%d' % i for i in range(10)] + ['é']
+  h = historian.Historian()
+  for _ in range(200):
+    event_date = datetime.datetime(2018, 1, 1) + datetime.timedelta(
+        days=rng.randrange(60))
+    members = [rng.choice(names) for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.7:
+      h.push_host_date(rng.choice(members), members, event_date)
+    else:
+      h.push_hostless_date(members, event_date)
+  return h
+
+
+def _get_other_chapter_historian(seed):
+  """Returns a random Historian with other names than _get_random_historian."""
+  other_h = historian.Historian()
+  h = _get_random_historian(seed)
+  for event_date in h.get_event_dates():
+    for host, members in h.get_events(event_date):
+      members = ['other ' + m for m in members]
+      if host:
+        other_h.push_host_date('other ' + host, members, event_date)
+      else:
+        other_h.push_hostless_date(members, event_date)
+  return other_h
+
+
+def _get_reads(h, names):
+  """Returns the results of the Historian read API on names."""
+  reads = {
+      'all_names': set(h.get_all_names()),
+      'past_host_names': set(h.get_past_host_names()),
+      'event_dates': list(h.get_event_dates()),
+      'last_event_dates': [
+          h.get_last_event_dates(k, hosted_only)
+          for k in range(5) for hosted_only in (False, True)],
+  }
+  for event_date in h.get_event_dates() + [datetime.datetime(2000, 1, 1)]:
+    reads[event_date] = list(h.get_events(event_date))
+  for a in names:
+    reads[a] = (
+        h.get_total_host_count(a), h.get_last_host_date(a),
+        set(h.get_past_guests(a)), set(h.get_past_associates(a)))
+    for b in names:
+      reads[a, b] = (
+          h.get_meetup_dates(a, b), h.get_meet_count(a, b),
+          h.get_host_dates(a, b), h.get_host_count(a, b),
+          h.get_last_meet_ordinal(a, b), h.get_last_host_ordinal(a, b))
+  return reads
+
+
+class TestHistoryStore(unittest.TestCase):
+
+  def setUp(self):
+    self._tmp_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp_dir.cleanup)
+
+  def _get_path(self, name):
+    return os.path.join(self._tmp_dir.name, name)
+
+  def test_reads_match_historian(self):
+    for seed in range(3):
+      h = _get_random_historian(seed)
+      store_path = self._get_path('history%d.store' % seed)
+      history_store.write_store(h, store_path)
+      store = history_store.HistoryStore(store_path)
+      names = sorted(h.get_all_names()) + ['nobody']
+      self.assertEqual(_get_reads(h, names), _get_reads(store, names))
+      self.assertEqual(h.to_proto(), store.to_proto())
+
+  def test_empty(self):
+    store_path = self._get_path('empty.store')
+    history_store.write_store(historian.Historian(), store_path)
+    store = history_store.HistoryStore(store_path)
+    self.assertEqual(set(), store.get_all_names())
+    self.assertEqual([], store.get_event_dates())
+    self.assertEqual(0, store.get_meet_count('a', 'b'))
+    self.assertIsNone(store.get_last_host_date('a'))
+
+  def test_store_of_store_is_identical(self):
+    h = _get_random_historian(4)
+    history_store.write_store(h, self._get_path('a.store'))
+    history_store.write_store(
+        history_store.HistoryStore(self._get_path('a.store')),
+        self._get_path('b.store'))
+    with open(self._get_path('a.store'), 'rb') as a, open(
+        self._get_path('b.store'), 'rb') as b:
+      self.assertEqual(a.read(), b.read())
+
+  def test_pickles_as_path(self):
+    h = _get_random_historian(5)
+    store_path = self._get_path('history.store')
+    history_store.write_store(h, store_path)
+    store = history_store.HistoryStore(store_path)
+    pickled = pickle.dumps(store)
+    self.assertLess(len(pickled), 200 + len(store_path))
+    names = sorted(h.get_all_names())
+    self.assertEqual(_get_reads(h, names), _get_reads(pickle.loads(pickled), names))
+
+  def test_rejects_other_files(self):
+    textproto_path = self._get_path('history.textproto')
+    history_writer.write_history(_get_random_historian(6), textproto_path)
+    with self.assertRaisesRegex(ValueError, 'not a version 1 history store'):
+      history_store.HistoryStore(textproto_path)
+
+  def test_rejects_short_and_truncated_files(self):
+    store_path = self._get_path('history.store')
+    history_store.write_store(_get_random_historian(8), store_path)
+    with open(store_path, 'rb') as store_file:
+      data = store_file.read()
+    for size in [0, 10, len(data) // 2]:
+      truncated_path = self._get_path('truncated%d.store' % size)
+      with open(truncated_path, 'wb') as truncated_file:
+        truncated_file.write(data[:size])
+      with self.assertRaises(ValueError):
+        history_store.HistoryStore(truncated_path)
+
+  def test_close(self):
+    store_path = self._get_path('history.store')
+    history_store.write_store(_get_random_historian(9), store_path)
+    with history_store.HistoryStore(store_path) as store:
+      self.assertTrue(store.get_event_dates())
+      store.get_meetup_dates('p1', 'p2')
+    with self.assertRaises(ValueError):
+      store.get_meet_count('p1', 'p2')
+
+  def test_to_historian_of_names(self):
+    h = _get_random_historian(10)
+    other_h = _get_random_historian(11)
+    for event_date in other_h.get_event_dates():
+      for host, members in other_h.get_events(event_date):
+        members = ['other ' + m for m in members]
+        if host:
+          h.push_host_date('other ' + host, members, event_date)
+        else:
+          h.push_hostless_date(members, event_date)
+    store_path = self._get_path('history.store')
+    history_store.write_store(h, store_path)
+    with history_store.HistoryStore(store_path) as store:
+      names = set(_get_random_historian(10).get_all_names())
+      self.assertEqual(
+          _get_random_historian(10).to_proto(),
+          store.to_historian(names).to_proto())
+      self.assertEqual(h.to_proto(), store.to_historian().to_proto())
+
+  def test_merge_and_update(self):
+    h = _get_random_historian(12)
+    other_h = _get_other_chapter_historian(13)
+    store_path = self._get_path('history.store')
+    history_store.write_store(
+        history_store.merge_histories([h, other_h]), store_path)
+    with history_store.HistoryStore(store_path) as store:
+      self.assertEqual(h.to_proto(), store.to_historian(
+          h.get_all_names()).to_proto())
+      self.assertEqual(other_h.to_proto(), store.to_historian(
+          other_h.get_all_names()).to_proto())
+
+    # Commit a date to the first chapter & fold it back into the store.
+    h.push_host_date('p1', ['p1', 'p2'], datetime.datetime(2018, 3, 30))
+    history_store.update_store(store_path, h)
+    with history_store.HistoryStore(store_path) as store:
+      self.assertEqual(h.to_proto(), store.to_historian(
+          h.get_all_names()).to_proto())
+      self.assertEqual(other_h.to_proto(), store.to_historian(
+          other_h.get_all_names()).to_proto())
+    self.assertEqual(
+        [self._get_path('history.store')],
+        [self._get_path(f) for f in os.listdir(self._tmp_dir.name)])
+
+  def test_main_merges_textprotos(self):
+    paths = []
+    for name, h in [('a', _get_random_historian(14)),
+                    ('b', _get_other_chapter_historian(15))]:
+      paths.append(self._get_path(name + '.textproto'))
+      history_writer.write_history(h, paths[-1])
+    store_path = self._get_path('history.store')
+    history_store.main([
+        'history_store', 'to_store', '--textproto_path', paths[0],
+        '--textproto_path', paths[1], '--store_path', store_path])
+    with history_store.HistoryStore(store_path) as store:
+      self.assertEqual(
+          history_store.merge_histories([
+              _get_random_historian(14), _get_other_chapter_historian(15)
+          ]).to_proto(),
+          store.to_proto())
+
+  def test_textproto_round_trip(self):
+    textproto_path = self._get_path('history.textproto')
+    store_path = self._get_path('history.store')
+    round_trip_path = self._get_path('round_trip.textproto')
+    history_writer.write_history(_get_random_historian(7), textproto_path)
+    history_store.main([
+        'history_store', 'to_store', '--textproto_path', textproto_path,
+        '--store_path', store_path])
+    history_store.main([
+        'history_store', 'to_textproto', '--textproto_path', round_trip_path,
+        '--store_path', store_path])
+    with open(textproto_path) as original, open(round_trip_path) as round_trip:
+      self.assertEqual(original.read(), round_trip.read())
+
+
+if __name__ == '__main__':
+  unittest.main()
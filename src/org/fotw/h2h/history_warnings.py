@@ -1,62 +1,62 @@
-"""Detects bad signs in a given h2h hosting history."""
+"""Detects bad signs in a given h2h hosting history.
+
+Only the last few hosted dates matter, so the warnings are computed in a
+single pass over the events of those dates (from the historian's event log)
+rather than over every pair of participants.
+"""
+
+from collections import defaultdict
+
 
 def get_warnings(host_history):
+  last_3_dates = host_history.get_last_event_dates(3, hosted_only=True)
+
+  # The dates of last_3_dates on which each pair (a, b) with a < b met, and
+  # on which each participant hosted.
+  pair_dates = defaultdict(set)
+  host_dates = defaultdict(set)
+  for event_date in last_3_dates:
+    for host, members in host_history.get_events(event_date):
+      if host:
+        for member in members:
+          if member == host:
+            continue
+          pair_dates[(host, member) if host < member else (member, host)].add(event_date)
+          host_dates[host].add(event_date)
+      else:
+        for a in members:
+          for b in members:
+            if a < b:
+              pair_dates[(a, b)].add(event_date)
+
   warnings = []
-  warnings += _get_repair_warnings(host_history)
-  warnings += _get_hosting_fairness_warnings(host_history)
+  warnings += _get_repair_warnings(last_3_dates, pair_dates)
+  warnings += _get_hosting_fairness_warnings(last_3_dates[-2:], host_dates)
   return warnings
 
 
-def _get_repair_warnings(host_history):
+def _get_repair_warnings(last_3_dates, pair_dates):
   warnings = []
-  all_dates = set()
-  for a in host_history.get_past_host_names():
-    for b in host_history.get_past_guests(a):
-      for event_date in host_history.get_host_dates(a, b):
-        all_dates.add(event_date)
-
-  sorted_dates = sorted(all_dates)
-  last_3_dates = sorted_dates[len(sorted_dates)-3:]
-  for a in host_history.get_all_names():
-    for b in host_history.get_all_names():
-      if b <= a:
-        continue
-
-      all_match_dates = host_history.get_meetup_dates(a, b)
-
-      if last_3_dates[len(last_3_dates) - 1] not in all_match_dates:
-        # if the most recent match doesn't contribute, then it doesn't matter.
-        continue
-
-      if last_3_dates[1] in all_match_dates and last_3_dates[2] in all_match_dates:
-        warnings.append('SEVERE repair warning: %s & %s' % (a, b))
-        continue
-
-      repair_count = 0
-      for x in last_3_dates:
-        if x in all_match_dates:
-          repair_count += 1
-      if repair_count >= 2:
-        warnings.append('MODERATE repair warning: %s & %s' % (a, b))
+  if len(last_3_dates) < 2:
+    return warnings
+  for (a, b) in sorted(pair_dates):
+    match_dates = pair_dates[(a, b)]
+    if last_3_dates[-1] not in match_dates:
+      # if the most recent match doesn't contribute, then it doesn't matter.
+      continue
+
+    if last_3_dates[-2] in match_dates:
+      warnings.append('SEVERE repair warning: %s & %s' % (a, b))
+    elif len(match_dates) >= 2:
+      warnings.append('MODERATE repair warning: %s & %s' % (a, b))
   return warnings
 
 
-def _get_hosting_fairness_warnings(host_history):
+def _get_hosting_fairness_warnings(last_2_dates, host_dates):
   warnings = []
-  all_dates = set()
-  for a in host_history.get_past_host_names():
-    for b in host_history.get_past_guests(a):
-      for event_date in host_history.get_host_dates(a, b):
-        all_dates.add(event_date)
-
-  sorted_dates = sorted(all_dates)
-  last_2_dates = sorted_dates[len(sorted_dates)-2:]
-  for a in host_history.get_all_names():
-    all_host_dates = []
-    for b in host_history.get_all_names():
-      all_host_dates += host_history.get_host_dates(a, b)
-    all_host_dates = set(all_host_dates)
-
-    if last_2_dates[0] in all_host_dates and last_2_dates[1] in all_host_dates:
+  if len(last_2_dates) < 2:
+    return warnings
+  for a in sorted(host_dates):
+    if last_2_dates[0] in host_dates[a] and last_2_dates[1] in host_dates[a]:
       warnings.append('hosting fairness warning: %s hosted 2+ times' % a)
   return warnings
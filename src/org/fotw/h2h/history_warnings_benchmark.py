@@ -0,0 +1,42 @@
+"""Times history_warnings.get_warnings on synthetic histories.
+
+The warnings only look at the last few hosted dates, so the time should grow
+with the number of people meeting on those dates, not with the roster size
+cubed or with the length of the history.
+
+Example:
+bazel-bin/src/org/fotw/h2h/history_warnings_benchmark --roster_sizes 50,500
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from src.org.fotw.h2h import history_warnings
+from src.org.fotw.h2h import synthetic_workload
+
+
+def main(argv):
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--roster_sizes', default='20,100,500,2000')
+  parser.add_argument('--past_dates', default='12,120')
+  parser.add_argument('--repeats', type=int, default=5)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args(args=argv[1:])
+
+  rng = random.Random(args.seed)
+  print('roster_size\tpast_dates\tseconds_per_call\twarnings')
+  for n_dates in [int(x) for x in args.past_dates.split(',')]:
+    for roster_size in [int(x) for x in args.roster_sizes.split(',')]:
+      p_info = synthetic_workload.gen_p_info(roster_size, rng)
+      h = synthetic_workload.gen_historian(p_info, n_dates, rng)
+      start = time.perf_counter()
+      for _ in range(args.repeats):
+        warnings = history_warnings.get_warnings(h)
+      elapsed = (time.perf_counter() - start) / args.repeats
+      print('%d\t%d\t%.6f\t%d' % (roster_size, n_dates, elapsed, len(warnings)))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -1,4 +1,5 @@
 import datetime
+import random
 import unittest
 
 from src.org.fotw.h2h import historian
@@ -14,6 +15,62 @@ def _dict_to_historian(d):
   return host_h
 
 
+def _reference_get_warnings(host_history):
+  """The original all-pairs implementation, for comparison."""
+  all_dates = set()
+  for a in host_history.get_past_host_names():
+    for b in host_history.get_past_guests(a):
+      for event_date in host_history.get_host_dates(a, b):
+        all_dates.add(event_date)
+  sorted_dates = sorted(all_dates)
+
+  warnings = []
+  last_3_dates = sorted_dates[len(sorted_dates)-3:]
+  for a in host_history.get_all_names():
+    for b in host_history.get_all_names():
+      if b <= a:
+        continue
+      all_match_dates = host_history.get_meetup_dates(a, b)
+      if last_3_dates[len(last_3_dates) - 1] not in all_match_dates:
+        continue
+      if last_3_dates[1] in all_match_dates and last_3_dates[2] in all_match_dates:
+        warnings.append('SEVERE repair warning: %s & %s' % (a, b))
+        continue
+      repair_count = 0
+      for x in last_3_dates:
+        if x in all_match_dates:
+          repair_count += 1
+      if repair_count >= 2:
+        warnings.append('MODERATE repair warning: %s & %s' % (a, b))
+
+  last_2_dates = sorted_dates[len(sorted_dates)-2:]
+  for a in host_history.get_all_names():
+    all_host_dates = []
+    for b in host_history.get_all_names():
+      all_host_dates += host_history.get_host_dates(a, b)
+    all_host_dates = set(all_host_dates)
+    if last_2_dates[0] in all_host_dates and last_2_dates[1] in all_host_dates:
+      warnings.append('hosting fairness warning: %s hosted 2+ times' % a)
+  return warnings
+
+
+def _random_historian(rng):
+  names = ['p%d' % i for i in range(8)]
+  h = historian.Historian()
+  event_date = datetime.datetime(2018, 1, 3)
+  for _ in range(6):
+    rng.shuffle(names)
+    h.push_host_date(names[0], names[0:3], event_date)
+    h.push_host_date(names[3], names[3:5], event_date)
+    h.push_hostless_date(names[5:8], event_date)
+    event_date += datetime.timedelta(days=7)
+    if rng.random() < 0.3:
+      # A date with only hostless gatherings.
+      h.push_hostless_date(names[1:4], event_date)
+      event_date += datetime.timedelta(days=7)
+  return h
+
+
 class TestHistoryWarnings(unittest.TestCase):
 
   def test_zero_state(self):
@@ -32,3 +89,24 @@ class TestHistoryWarnings(unittest.TestCase):
     self.assertEqual(
         1,
         len(history_warnings.get_warnings(_dict_to_historian(host_info))))
+
+  def test_matches_reference_implementation(self):
+    rng = random.Random(1)
+    for _ in range(50):
+      h = _random_historian(rng)
+      self.assertEqual(
+          sorted(_reference_get_warnings(h)),
+          sorted(history_warnings.get_warnings(h)))
+
+  def test_short_history(self):
+    h = historian.Historian()
+    h.push_host_date('a', ['a', 'b'], datetime.datetime(2018, 10, 23))
+    h.push_host_date('a', ['a', 'b'], datetime.datetime(2018, 10, 30))
+    self.assertEqual(
+        ['SEVERE repair warning: a & b',
+         'hosting fairness warning: a hosted 2+ times'],
+        history_warnings.get_warnings(h))
+
+
+if __name__ == '__main__':
+  unittest.main()
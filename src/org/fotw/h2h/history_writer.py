@@ -0,0 +1,109 @@
+"""Writes hosting history textprotos.
+
+write_history rewrites the whole history. append_match_config only
+serializes the new match config and appends it to the textproto in place,
+which produces the same bytes as write_history as long as:
+ - the textproto is what write_history would write for its history, and
+ - the new match date is later than every date in it.
+append_match_config checks both: the first by only appending to files that
+this process wrote with write_history or append_match_config & that haven't
+changed since.
+"""
+
+import datetime
+import os
+
+from src.org.fotw.h2h import historian
+
+from com_google_protobuf_python_srcs.python.google.protobuf import text_format
+
+
+_DATE_FIELD = b'date_yyyymmdd: "'
+
+# How far back from the end of the file to start looking for the last date.
+_TAIL_CHUNK_SIZE = 4096
+
+# The _get_file_stamp of every textproto this process wrote, by real path.
+_written_stamps = {}
+
+
+def _get_file_stamp(path):
+  st = os.stat(path)
+  return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
+def _record_written(path):
+  _written_stamps[os.path.realpath(path)] = _get_file_stamp(path)
+
+
+def _is_written(path):
+  """Returns whether path is unchanged since this process last wrote it."""
+  stamp = _written_stamps.get(os.path.realpath(path))
+  try:
+    return stamp is not None and stamp == _get_file_stamp(path)
+  except FileNotFoundError:
+    return False
+
+
+def write_history(host_historian, textproto_path):
+  with open(textproto_path, 'w') as out_file:
+    print(text_format.MessageToString(host_historian.to_proto()), file=out_file)
+  _record_written(textproto_path)
+
+
+def _render_match_config(match_config, match_date):
+  """Returns the textproto of match_config, as write_history would write it."""
+  h = historian.Historian()
+  for match in match_config.match:
+    if match.host:
+      h.push_host_date(match.host, match.member, match_date)
+    else:
+      h.push_hostless_date(match.member, match_date)
+  return text_format.MessageToString(h.to_proto()).encode('utf-8')
+
+
+def _get_last_date(textproto_file):
+  """Returns the last date in a textproto written by write_history, or None.
+
+  write_history writes dates in increasing order, so this only reads the end
+  of the file.
+  """
+  textproto_file.seek(0, 2)
+  size = textproto_file.tell()
+  chunk_size = _TAIL_CHUNK_SIZE
+  while True:
+    start = max(0, size - chunk_size)
+    textproto_file.seek(start)
+    tail = textproto_file.read(size - start)
+    i = tail.rfind(_DATE_FIELD)
+    if i >= 0:
+      date_str = tail[i + len(_DATE_FIELD):i + len(_DATE_FIELD) + 8]
+      return datetime.datetime.strptime(date_str.decode('ascii'), '%Y%m%d')
+    if start == 0:
+      return None
+    chunk_size *= 2
+
+
+def append_match_config(textproto_path, match_config, match_date):
+  """Appends match_config to textproto_path in place.
+
+  Returns False (without writing anything) if the result wouldn't be
+  byte-identical to write_history, in which case the caller should use
+  write_history instead. Costs O(new matches) rather than O(history).
+  """
+  if not _is_written(textproto_path):
+    return False
+  with open(textproto_path, 'r+b') as textproto_file:
+    # write_history ends the file with the message's trailing newline plus
+    # the one added by print().
+    textproto_file.seek(0, 2)
+    size = textproto_file.tell()
+    last_date = _get_last_date(textproto_file)
+    if last_date is not None and match_date <= last_date:
+      return False
+    # Replace print()'s trailing newline with the new match set.
+    textproto_file.seek(size - 1)
+    textproto_file.truncate()
+    textproto_file.write(_render_match_config(match_config, match_date) + b'\n')
+  _record_written(textproto_path)
+  return True
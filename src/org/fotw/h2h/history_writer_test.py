@@ -0,0 +1,107 @@
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import history_writer
+from src.org.fotw.h2h.h2h_pb2 import Match, MatchingHistory, MatchSet
+
+from com_google_protobuf_python_srcs.python.google.protobuf import text_format
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _push_match_config(h, match_config, match_date):
+  for match in match_config.match:
+    if match.host:
+      h.push_host_date(match.host, match.member, match_date)
+    else:
+      h.push_hostless_date(match.member, match_date)
+
+
+class TestHistoryWriter(unittest.TestCase):
+
+  def setUp(self):
+    test_srcdir = os.environ['TEST_SRCDIR']
+    testing_textproto_path = test_srcdir + '/__main__/src/org/fotw/h2h/h2h-testing-textproto.txt'
+    with open(testing_textproto_path, 'r') as testing_textproto:
+      matching_history = MatchingHistory()
+      text_format.Parse(testing_textproto.read(), matching_history)
+    self._historian = historian.from_proto(matching_history)
+
+    self._tmp_dir = tempfile.mkdtemp()
+    self._textproto_path = os.path.join(self._tmp_dir, 'history.txt')
+    history_writer.write_history(self._historian, self._textproto_path)
+
+    self._match_config = MatchSet(
+        date_yyyymmdd='20210407',
+        match=[
+            Match(host='Weavers', member=['Weavers', 'Earl']),
+            Match(member=['Christian', 'Al', 'Bo']),
+        ])
+
+  def tearDown(self):
+    shutil.rmtree(self._tmp_dir)
+
+  def _read(self, path):
+    with open(path, 'rb') as f:
+      return f.read()
+
+  def _full_rewrite(self, match_date):
+    _push_match_config(self._historian, self._match_config, match_date)
+    full_path = os.path.join(self._tmp_dir, 'full.txt')
+    history_writer.write_history(self._historian, full_path)
+    return self._read(full_path)
+
+  def test_append_in_place(self):
+    match_date = datetime.datetime(2021, 4, 7)
+    self.assertTrue(history_writer.append_match_config(
+        self._textproto_path, self._match_config, match_date))
+
+    self.assertEqual(self._full_rewrite(match_date), self._read(self._textproto_path))
+
+  def test_append_twice(self):
+    match_date = datetime.datetime(2021, 4, 7)
+    self.assertTrue(history_writer.append_match_config(
+        self._textproto_path, self._match_config, match_date))
+    _push_match_config(self._historian, self._match_config, match_date)
+    self._match_config.date_yyyymmdd = '20210414'
+    match_date = datetime.datetime(2021, 4, 14)
+    self.assertTrue(history_writer.append_match_config(
+        self._textproto_path, self._match_config, match_date))
+
+    self.assertEqual(self._full_rewrite(match_date), self._read(self._textproto_path))
+
+  def test_append_to_empty_history(self):
+    self._historian = historian.Historian()
+    history_writer.write_history(self._historian, self._textproto_path)
+    match_date = datetime.datetime(2021, 4, 7)
+    self.assertTrue(history_writer.append_match_config(
+        self._textproto_path, self._match_config, match_date))
+
+    self.assertEqual(self._full_rewrite(match_date), self._read(self._textproto_path))
+
+  def test_refuses_dates_that_are_not_last(self):
+    original = self._read(self._textproto_path)
+    self.assertFalse(history_writer.append_match_config(
+        self._textproto_path, self._match_config,
+        datetime.datetime(2021, 3, 24)))
+    self.assertEqual(original, self._read(self._textproto_path))
+
+  def test_refuses_files_it_did_not_write(self):
+    match_date = datetime.datetime(2021, 4, 7)
+    other_path = os.path.join(self._tmp_dir, 'other.txt')
+    shutil.copyfile(self._textproto_path, other_path)
+    self.assertFalse(history_writer.append_match_config(
+        other_path, self._match_config, match_date))
+
+    # Nor files changed since it wrote them, e.g. reformatted by hand.
+    original = self._read(self._textproto_path)
+    with open(self._textproto_path, 'ab') as f:
+      f.write(b'\n')
+    self.assertFalse(history_writer.append_match_config(
+        self._textproto_path, self._match_config, match_date))
+    self.assertEqual(original + b'\n', self._read(self._textproto_path))
+
+if __name__ == '__main__':
+  unittest.main()
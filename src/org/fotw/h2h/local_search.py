@@ -0,0 +1,175 @@
+"""Local search over match configs, as an alternative to pure random sampling.
+
+Starting from a generated match config, the optimizers repeatedly apply a
+random feasibility-preserving move and keep it depending on the score change:
+
+ - swap two guests between hosted matches.
+ - swap the hosts of two hosted matches, re-pairing each host with the
+   other match's guests.
+ - move a single between two hostless groups.
+
+'hillclimb' keeps moves that don't lower the score. 'anneal' also keeps worse
+moves with probability exp(score_delta / temperature), with the temperature
+cooling geometrically over the run.
+"""
+
+import math
+import time
+
+from src.org.fotw.h2h import match_generator
+
+
+OPTIMIZERS = ['random', 'hillclimb', 'anneal']
+
+# Scores change in steps of 1e6 per day/guest of host service, so the
+# temperature starts out accepting a one unit loss about 1/3 of the time and
+# ends up accepting only rel dev losses that are tiny.
+_INITIAL_TEMPERATURE = 1e6
+_FINAL_TEMPERATURE = 1e-2
+
+
+class _Match():
+  """A mutable compact match: a host id (or None) & a list of member ids."""
+
+  def __init__(self, host, member):
+    self.host = host
+    self.member = member
+
+
+class _MatchConfig():
+  """A mutable compact match config (see match_generator.CompiledRoster)."""
+
+  def __init__(self, compact_config):
+    self.match = [
+        _Match(host_id, list(member_ids)) for host_id, member_ids in compact_config]
+
+  def to_compact(self):
+    return tuple(
+        (match.host, tuple(sorted(match.member))) for match in self.match)
+
+  def view(self):
+    """Returns the config as (host_id, member_ids) pairs, without copying ids."""
+    return [(match.host, match.member) for match in self.match]
+
+
+def _all_feasible(matches, participants):
+  return all(
+      match_generator.is_feasible_compact_match(m.host, m.member, participants)
+      for m in matches)
+
+
+# Each move mutates config in place and returns a function that undoes it,
+# or returns None (leaving config as is) if no feasible move was found.
+def _swap_guests(config, participants, rng):
+  hosted = [match for match in config.match if match.host is not None]
+  if len(hosted) < 2:
+    return None
+  a, b = rng.sample(hosted, 2)
+  a_guests = [i for i, m in enumerate(a.member) if m != a.host]
+  b_guests = [i for i, m in enumerate(b.member) if m != b.host]
+  if not a_guests or not b_guests:
+    return None
+  i = rng.choice(a_guests)
+  j = rng.choice(b_guests)
+
+  def undo():
+    a.member[i], b.member[j] = b.member[j], a.member[i]
+  undo()
+  if not _all_feasible([a, b], participants):
+    undo()
+    return None
+  return undo
+
+
+def _swap_hosts(config, participants, rng):
+  hosted = [match for match in config.match if match.host is not None]
+  if len(hosted) < 2:
+    return None
+  a, b = rng.sample(hosted, 2)
+  i = a.member.index(a.host)
+  j = b.member.index(b.host)
+
+  def undo():
+    a.member[i], b.member[j] = b.member[j], a.member[i]
+    a.host, b.host = b.host, a.host
+  undo()
+  if not _all_feasible([a, b], participants):
+    undo()
+    return None
+  return undo
+
+
+def _move_single(config, participants, rng):
+  hostless = [match for match in config.match if match.host is None]
+  if len(hostless) < 2:
+    return None
+  a, b = rng.sample(hostless, 2)
+  i = rng.randrange(len(a.member))
+  b.member.append(a.member.pop(i))
+
+  def undo():
+    a.member.insert(i, b.member.pop())
+  if not _all_feasible([a, b], participants):
+    undo()
+    return None
+  return undo
+
+
+_MOVES = [_swap_guests, _swap_hosts, _move_single]
+
+
+def optimize(
+    start_config, participants, score_fn, n, rng, optimizer, deadline=None,
+    on_improvement=None):
+  """Runs up to n steps of local search from start_config.
+
+  start_config is a compact match config and participants is the
+  CompiledRoster.participants its ids refer to. score_fn is called with
+  compact match configs, except that their members may be unsorted lists
+  (e.g. DeltaScorer.score_compact). The search stops
+  early once time.time() reaches deadline. on_improvement(step, score,
+  match_config) is called every time the best score improves, starting with
+  step 0 for start_config.
+
+  Returns (max_score, best_match_config, steps) where best_match_config is a
+  compact match config.
+  """
+  if optimizer not in ('hillclimb', 'anneal'):
+    raise ValueError('unknown local search optimizer: %s' % optimizer)
+  config = _MatchConfig(start_config)
+  score = score_fn(config.view())
+  max_score = score
+  best_match_config = config.to_compact()
+  if on_improvement is not None:
+    on_improvement(0, max_score, best_match_config)
+
+  cooling = 0
+  if n > 1:
+    cooling = math.log(_FINAL_TEMPERATURE / _INITIAL_TEMPERATURE) / (n - 1)
+  step = 1
+  while step < n:
+    if deadline is not None and time.time() >= deadline:
+      break
+    undo = rng.choice(_MOVES)(config, participants, rng)
+    step += 1
+    if undo is None:
+      continue
+    new_score = score_fn(config.view())
+    delta = new_score - score
+    if delta >= 0:
+      accept = True
+    elif optimizer == 'anneal':
+      temperature = _INITIAL_TEMPERATURE * math.exp(cooling * (step - 1))
+      accept = rng.random() < math.exp(delta / temperature)
+    else:
+      accept = False
+    if not accept:
+      undo()
+      continue
+    score = new_score
+    if score > max_score:
+      max_score = score
+      best_match_config = config.to_compact()
+      if on_improvement is not None:
+        on_improvement(step - 1, max_score, best_match_config)
+  return max_score, best_match_config, step
@@ -0,0 +1,52 @@
+"""Compares best score versus CPU time for each search optimizer.
+
+Builds a synthetic roster & history, then runs get_best_match_config with
+growing N for every optimizer in local_search.OPTIMIZERS and prints the best
+score found and the time it took.
+
+Example:
+bazel-bin/src/org/fotw/h2h/local_search_benchmark --roster_size 70
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import local_search
+from src.org.fotw.h2h import synthetic_workload
+
+
+def main(argv):
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--roster_size', type=int, default=70)
+  parser.add_argument('--past_dates', type=int, default=24)
+  parser.add_argument(
+      '--N', default='1000,3000,10000,30000',
+      help='comma-separated sample counts to run each optimizer with')
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args(args=argv[1:])
+
+  rng = random.Random(args.seed)
+  p_info = synthetic_workload.gen_p_info(args.roster_size, rng)
+  host_historian = synthetic_workload.gen_historian(p_info, args.past_dates, rng)
+  match_date = synthetic_workload.get_next_date(args.past_dates)
+
+  print('optimizer\tN\tseconds\tbest_score')
+  for optimizer in local_search.OPTIMIZERS:
+    for n in [int(x) for x in args.N.split(',')]:
+      start = time.process_time()
+      best_match_config, _ = h2h.get_best_match_config(
+          p_info, host_historian, match_date, n, seed=args.seed,
+          optimizer=optimizer)
+      elapsed = time.process_time() - start
+
+      h2h.push_match_config(host_historian, best_match_config, match_date)
+      score = h2h.get_match_config_score(p_info, host_historian, match_date)
+      h2h.pop_match_config(host_historian, best_match_config, match_date)
+      print('%s\t%d\t%.3f\t%.3f' % (optimizer, n, elapsed, score))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,121 @@
+import datetime
+import random
+import unittest
+
+from src.org.fotw.h2h import delta_scorer
+from src.org.fotw.h2h import fixtures
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import local_search
+from src.org.fotw.h2h import match_generator
+
+
+def _members(compact_config):
+  return sorted(m for _, member_ids in compact_config for m in member_ids)
+
+
+def _gen_feasible_config(roster, rng):
+  for _ in range(100):
+    compact_config = match_generator.gen_compiled_sprinkler_match_config(
+        roster, rng)
+    if all(match_generator.is_feasible_compact_match(
+        *match, roster.participants) for match in compact_config):
+      return compact_config
+  raise AssertionError('no feasible match config generated')
+
+
+class TestLocalSearch(unittest.TestCase):
+
+  def _optimize(self, optimizer, seed):
+    rng = random.Random(seed)
+    p_info = fixtures.make_p_info(8, 14, can_host=lambda i: i % 4 != 3)
+    h = fixtures.make_historian(p_info, rng)
+    match_date = datetime.datetime(2020, 2, 1)
+    scorer = delta_scorer.DeltaScorer(p_info, h, match_date)
+    roster = match_generator.compile_roster(p_info)
+    start_config = match_generator.gen_compiled_sprinkler_match_config(
+        roster, rng)
+    max_score, best_config, steps = local_search.optimize(
+        start_config, roster.participants, scorer.score_compact, 500, rng,
+        optimizer)
+    self.assertEqual(500, steps)
+    return roster, scorer, start_config, max_score, best_config
+
+  def test_moves_preserve_feasibility(self):
+    # Every family can host & has fewer than _LARGE_FAMILY_CHILD_COUNT
+    # children, so generated configs are feasible whenever the singles
+    # spread out evenly.
+    p_info = fixtures.make_p_info(5, 14, can_host=lambda i: True)
+    roster = match_generator.compile_roster(p_info)
+    h = fixtures.make_historian(p_info, random.Random(6))
+    scorer = delta_scorer.DeltaScorer(p_info, h, datetime.datetime(2020, 2, 1))
+    for optimizer in ['hillclimb', 'anneal']:
+      rng = random.Random(1)
+      start_config = _gen_feasible_config(roster, rng)
+      _, best_config, _ = local_search.optimize(
+          start_config, roster.participants, scorer.score_compact, 500, rng,
+          optimizer)
+      self.assertNotEqual(start_config, best_config)
+      self.assertEqual(_members(start_config), _members(best_config))
+      self.assertEqual(len(start_config), len(best_config))
+      for start_match, match in zip(start_config, best_config):
+        self.assertEqual(start_match[0] is None, match[0] is None)
+        self.assertTrue(match_generator.is_feasible_compact_match(
+            *match, roster.participants))
+
+  def test_swap_hosts(self):
+    roster = match_generator.compile_roster(
+        fixtures.make_p_info(4, 2, can_host=lambda i: True))
+    config = local_search._MatchConfig(((0, (0, 1, 4)), (2, (2, 3, 5))))
+    undo = local_search._swap_hosts(
+        config, roster.participants, random.Random(0))
+    self.assertEqual(
+        {(2, (1, 2, 4)), (0, (0, 3, 5))}, set(config.to_compact()))
+    undo()
+    self.assertEqual(((0, (0, 1, 4)), (2, (2, 3, 5))), config.to_compact())
+
+  def test_returns_score_of_best_config(self):
+    for optimizer in ['hillclimb', 'anneal']:
+      _, scorer, start_config, max_score, best_config = self._optimize(
+          optimizer, 2)
+      self.assertEqual(scorer.score_compact(best_config), max_score)
+      self.assertGreaterEqual(max_score, scorer.score_compact(start_config))
+
+  def test_reports_improvements(self):
+    rng = random.Random(4)
+    p_info = fixtures.make_p_info(8, 14, can_host=lambda i: i % 4 != 3)
+    h = fixtures.make_historian(p_info, rng)
+    match_date = datetime.datetime(2020, 2, 1)
+    scorer = delta_scorer.DeltaScorer(p_info, h, match_date)
+    roster = match_generator.compile_roster(p_info)
+    start_config = match_generator.gen_compiled_sprinkler_match_config(
+        roster, rng)
+    improvements = []
+    max_score, best_config, _ = local_search.optimize(
+        start_config, roster.participants, scorer.score_compact, 500, rng,
+        'hillclimb', on_improvement=lambda *args: improvements.append(args))
+
+    self.assertEqual(0, improvements[0][0])
+    self.assertEqual((max_score, best_config), improvements[-1][1:])
+    scores = [score for _, score, _ in improvements]
+    self.assertEqual(sorted(set(scores)), scores)
+
+  def test_stops_at_deadline(self):
+    rng = random.Random(5)
+    p_info = fixtures.make_p_info(8, 14, can_host=lambda i: i % 4 != 3)
+    match_date = datetime.datetime(2020, 2, 1)
+    scorer = delta_scorer.DeltaScorer(p_info, historian.Historian(), match_date)
+    roster = match_generator.compile_roster(p_info)
+    start_config = match_generator.gen_compiled_sprinkler_match_config(
+        roster, rng)
+    _, _, steps = local_search.optimize(
+        start_config, roster.participants, scorer.score_compact, 500, rng,
+        'anneal', deadline=0)
+    self.assertEqual(1, steps)
+
+  def test_unknown_optimizer(self):
+    with self.assertRaises(ValueError):
+      self._optimize('random', 3)
+
+
+if __name__ == '__main__':
+  unittest.main()
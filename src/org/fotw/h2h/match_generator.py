@@ -1,21 +1,25 @@
 from src.org.fotw.h2h.h2h_pb2 import MatchSet, Match
 
+import collections
+import operator
 import random
 
 
 _MAX_GUEST_COUNT = 2
 _MIN_SINGLES_GROUP_SIZE = 3
 _MAX_SINGLES_GROUP_SIZE = 4
+_LARGE_FAMILY_CHILD_COUNT = 5
 
 
-def gen_match_config(match_date, p_config):
+def gen_match_config(match_date, p_config, rng=random):
   """
   Returns (matches, found_match) for a given participant config.
 
-  match_date is assumed to be a datetime.datetime object
+  match_date is assumed to be a datetime.datetime object. rng is the source of
+  randomness (the random module or a random.Random instance).
   """
   p_names = [p_name for p_name in p_config if p_config[p_name].participating]
-  random.shuffle(p_names)  # Shuffles in-place.
+  rng.shuffle(p_names)  # Shuffles in-place.
 
   match_set = MatchSet(date_yyyymmdd=match_date.strftime('%Y%m%d'))
   i = 0
@@ -41,7 +45,7 @@ def gen_match_config(match_date, p_config):
         possible_coguest_len += 1
       if possible_coguest_len < _MIN_SINGLES_GROUP_SIZE:
         return None, False
-      n_guests = random.randint(_MIN_SINGLES_GROUP_SIZE, min(possible_coguest_len, _MAX_SINGLES_GROUP_SIZE))
+      n_guests = rng.randint(_MIN_SINGLES_GROUP_SIZE, min(possible_coguest_len, _MAX_SINGLES_GROUP_SIZE))
     if is_hosted:
       # p_names[i] is now the first guest participant. Figure out how many
       # co-guests are possible.
@@ -53,7 +57,7 @@ def gen_match_config(match_date, p_config):
           i + possible_coguest_len < len(p_names)
           and not (
               (has_family and p_config[p_names[i+possible_coguest_len]].is_family)
-              or (has_singles and p_config[p_names[i+possible_coguest_len]].child_count >= 5)
+              or (has_singles and p_config[p_names[i+possible_coguest_len]].child_count >= _LARGE_FAMILY_CHILD_COUNT)
               )
           ):
         has_family = (
@@ -61,7 +65,7 @@ def gen_match_config(match_date, p_config):
         has_singles = (
             has_singles or (not p_config[p_names[i+possible_coguest_len]].is_family))
         possible_coguest_len += 1
-      n_guests = random.randint(1, min(possible_coguest_len, _MAX_GUEST_COUNT))
+      n_guests = rng.randint(1, min(possible_coguest_len, _MAX_GUEST_COUNT))
     member_names = p_names[i:i+n_guests] + [first_p_name]
     i += n_guests
 
@@ -72,20 +76,21 @@ def gen_match_config(match_date, p_config):
   return match_set, True
 
 
-def gen_sprinkler_match_config(match_date, p_config):
+def gen_sprinkler_match_config(match_date, p_config, rng=random):
   """
   Returns (matches, found_match) for a given participant config trying to
   match families with families and sprinkle singles in (and also trying
   not to overload families with 3+ additional singles).
 
-  match_date is assumed to be a datetime.datetime object
+  match_date is assumed to be a datetime.datetime object. rng is the source of
+  randomness (the random module or a random.Random instance).
   """
   p_names = [p_name for p_name in p_config if p_config[p_name].participating]
   host_names = [p_name for p_name in p_names if p_config[p_name].can_host]
   sprinkler_names = [p_name for p_name in p_names if not p_config[p_name].can_host]
 
-  random.shuffle(host_names)
-  random.shuffle(sprinkler_names)
+  rng.shuffle(host_names)
+  rng.shuffle(sprinkler_names)
   match_set = MatchSet(date_yyyymmdd=match_date.strftime('%Y%m%d'))
 
   # Get to an even number of host_names for matching below.
@@ -112,7 +117,7 @@ def gen_sprinkler_match_config(match_date, p_config):
     if len(hostless_src) < _MIN_SINGLES_GROUP_SIZE:
       break # Allow overflow rather than drop singles
 
-    n_singles = random.randint(_MIN_SINGLES_GROUP_SIZE, min(len(hostless_src), _MAX_SINGLES_GROUP_SIZE))
+    n_singles = rng.randint(_MIN_SINGLES_GROUP_SIZE, min(len(hostless_src), _MAX_SINGLES_GROUP_SIZE))
     gathering_members = []
     for i in range(n_singles):
       gathering_members.append(hostless_src.pop())
@@ -124,7 +129,7 @@ def gen_sprinkler_match_config(match_date, p_config):
     # we're also popping from the actual source list (m_singles or f_singles)
     # so sprinkler_names should shrink.
     sprinkler_names = other_sprinklers + m_singles + f_singles
-    random.shuffle(sprinkler_names)
+    rng.shuffle(sprinkler_names)
 
   # Match all the families together (since len(host_names) is even).
   for i in range(0, len(host_names), 2):
@@ -140,3 +145,179 @@ def gen_sprinkler_match_config(match_date, p_config):
       i = (i + 1) % len(hosted_matches)
 
   return match_set, True
+
+
+# A participant config split into the buckets gen_compiled_sprinkler_match_config
+# works with. Participants are identified by their index in names (p_config
+# order) and participants[i] is the Participant named names[i]. The *_ids
+# fields are tuples of participating ids.
+CompiledRoster = collections.namedtuple(
+    'CompiledRoster',
+    ['names', 'participants', 'host_ids', 'other_sprinkler_ids',
+     'm_single_ids', 'f_single_ids'])
+
+
+def compile_roster(p_config):
+  """Returns the CompiledRoster of p_config, for gen_compiled_sprinkler_match_config."""
+  names = tuple(p_config)
+  host_ids = []
+  other_sprinkler_ids = []
+  m_single_ids = []
+  f_single_ids = []
+  for i, p_name in enumerate(names):
+    p = p_config[p_name]
+    if not p.participating:
+      continue
+    if p.can_host:
+      host_ids.append(i)
+    elif p.gender_if_single == 'M':
+      m_single_ids.append(i)
+    elif p.gender_if_single == 'F':
+      f_single_ids.append(i)
+    else:
+      other_sprinkler_ids.append(i)
+  return CompiledRoster(
+      names, tuple(p_config[p_name] for p_name in names), tuple(host_ids),
+      tuple(other_sprinkler_ids), tuple(m_single_ids), tuple(f_single_ids))
+
+
+# Compact match configs are what the search generates & scores instead of
+# MatchSet protos: a tuple with a (host_id, member_ids) tuple per match, where
+# ids index CompiledRoster.names, member_ids is a sorted tuple that includes
+# the host and host_id is None for hostless groups.
+
+
+def to_match_set(compact_config, roster, match_date):
+  """Returns the MatchSet for match_date of a compact match config."""
+  names = roster.names
+  match_set = MatchSet(date_yyyymmdd=match_date.strftime('%Y%m%d'))
+  for host_id, member_ids in compact_config:
+    match = match_set.match.add()
+    if host_id is not None:
+      match.host = names[host_id]
+    match.member.extend(sorted(names[i] for i in member_ids))
+  return match_set
+
+
+def get_canonical_form(compact_config):
+  """
+  Returns a hashable form of a compact match config that doesn't depend on
+  match order. (Member ids are already sorted.) Hostless groups get host id
+  -1 rather than None so that hash() of the form is the same in every
+  process.
+  """
+  # Matches are disjoint, so sorting by member ids never compares hosts.
+  return tuple(sorted(
+      [(-1 if host_id is None else host_id, member_ids)
+       for host_id, member_ids in compact_config],
+      key=operator.itemgetter(1)))
+
+
+def gen_compiled_sprinkler_match_config(roster, rng=random):
+  """
+  Returns a compact match config drawn from the same distribution as the
+  valid match sets of gen_sprinkler_match_config, which never fails either.
+
+  roster is the CompiledRoster of the participant config. Rather than
+  re-partitioning & reshuffling the unmatched sprinklers after every hostless
+  group, each single gender's ids are shuffled once and groups are taken off
+  the end, so a match config costs O(participants). (The RNG is consumed
+  differently, so a given seed gives a different match set than
+  gen_sprinkler_match_config.)
+  """
+  host_ids = list(roster.host_ids)
+  sprinkler_buckets = [
+      list(roster.other_sprinkler_ids), list(roster.m_single_ids),
+      list(roster.f_single_ids)]
+  sprinkler_count = sum(len(bucket) for bucket in sprinkler_buckets)
+  rng.shuffle(host_ids)
+  # Each match is [host_id, member_ids] until it's frozen below.
+  matches = []
+
+  # Get to an even number of host_ids for matching below. The extra host
+  # gets a uniformly random sprinkler.
+  if len(host_ids) % 2 == 1:
+    if not sprinkler_count:
+      host_ids.pop()  # That host just won't get to participate :(
+    else:
+      i = rng.randrange(sprinkler_count)
+      for bucket in sprinkler_buckets:
+        if i < len(bucket):
+          break
+        i -= len(bucket)
+      bucket[i], bucket[-1] = bucket[-1], bucket[i]
+      sprinkler_count -= 1
+      host_id = host_ids.pop()
+      matches.append([host_id, [host_id, bucket.pop()]])
+
+  # Make hostless singles groups so that families don't get overwhelmed
+  # with 3+ singles on top of another family being hosted. Popping from a
+  # shuffled bucket takes a uniformly random group of the remaining singles.
+  _, m_singles, f_singles = sprinkler_buckets
+  rng.shuffle(m_singles)
+  rng.shuffle(f_singles)
+  while sprinkler_count > len(host_ids):
+    hostless_src = m_singles if len(m_singles) > len(f_singles) else f_singles
+    if len(hostless_src) < _MIN_SINGLES_GROUP_SIZE:
+      break # Allow overflow rather than drop singles
+
+    n_singles = rng.randint(_MIN_SINGLES_GROUP_SIZE, min(len(hostless_src), _MAX_SINGLES_GROUP_SIZE))
+    matches.append([None, hostless_src[-n_singles:]])
+    del hostless_src[-n_singles:]
+    sprinkler_count -= n_singles
+
+  # Match all the families together (since len(host_ids) is even).
+  for i in range(0, len(host_ids), 2):
+    matches.append([host_ids[i], [host_ids[i], host_ids[i+1]]])
+
+  hosted_matches = [match for match in matches if match[0] is not None]
+  if hosted_matches:
+    sprinkler_ids = [i for bucket in sprinkler_buckets for i in bucket]
+    rng.shuffle(sprinkler_ids)
+    for i, sprinkler_id in enumerate(sprinkler_ids):
+      hosted_matches[i % len(hosted_matches)][1].append(sprinkler_id)
+
+  return tuple(
+      (host_id, tuple(sorted(member_ids))) for host_id, member_ids in matches)
+
+
+def _is_feasible(host, members):
+  """is_feasible_match for the Participants of a match (host may be None)."""
+  if host is not None:
+    if not host.can_host:
+      return False
+    # At most one guest family, with at most _MAX_GUEST_COUNT singles on top
+    # of it.
+    guests = [m for m in members if m is not host]
+    guest_family_count = sum(1 for m in guests if m.is_family)
+    if guest_family_count > 1:
+      return False
+    if guest_family_count and len(guests) - 1 > _MAX_GUEST_COUNT:
+      return False
+    # No large families with singles.
+    has_large_family = any(
+        m.child_count >= _LARGE_FAMILY_CHILD_COUNT for m in members)
+    has_singles = any(not m.is_family for m in members)
+    return not (has_large_family and has_singles)
+
+  # Hostless groups are same-gender singles.
+  if not _MIN_SINGLES_GROUP_SIZE <= len(members) <= _MAX_SINGLES_GROUP_SIZE:
+    return False
+  if any(m.is_family for m in members):
+    return False
+  return len(set(m.gender_if_single for m in members)) == 1
+
+
+def is_feasible_match(match, p_config):
+  """
+  Returns whether a match (a Match or anything with host & member fields)
+  respects the constraints the generators build matches with.
+  """
+  host = p_config[match.host] if match.host else None
+  return _is_feasible(host, [p_config[m] for m in match.member])
+
+
+def is_feasible_compact_match(host_id, member_ids, participants):
+  """is_feasible_match for a compact match (see CompiledRoster.participants)."""
+  host = participants[host_id] if host_id is not None else None
+  return _is_feasible(host, [participants[i] for i in member_ids])
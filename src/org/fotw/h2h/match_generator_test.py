@@ -0,0 +1,123 @@
+import collections
+import datetime
+import math
+import random
+import unittest
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import match_generator
+from src.org.fotw.h2h.h2h_pb2 import Match, MatchSet
+
+
+def _make_p_info(n_hosts, n_other_families, n_m_singles, n_f_singles):
+  p_info = {}
+
+  def add(name, is_family, can_host, gender_if_single):
+    p_info[name] = h2h.Participant(
+        name=name, is_family=is_family, participating=True, can_host=can_host,
+        child_count=0, gender_if_single=gender_if_single)
+  for i in range(n_hosts):
+    add('host%d' % i, True, True, '')
+  for i in range(n_other_families):
+    add('family%d' % i, True, False, '')
+  for i in range(n_m_singles):
+    add('m%d' % i, False, False, 'M')
+  for i in range(n_f_singles):
+    add('f%d' % i, False, False, 'F')
+  p_info['away'] = h2h.Participant(
+      name='away', is_family=True, participating=False, can_host=True,
+      child_count=0, gender_if_single='')
+  return p_info
+
+
+def _canonical(match_set):
+  return tuple(sorted(
+      (match.host, tuple(sorted(match.member))) for match in match_set.match))
+
+
+class TestMatchGenerator(unittest.TestCase):
+
+  def test_compile_roster(self):
+    p_info = _make_p_info(2, 1, 2, 1)
+    roster = match_generator.compile_roster(p_info)
+    self.assertEqual(tuple(p_info), roster.names)
+    self.assertEqual(tuple(p_info.values()), roster.participants)
+
+    def names(ids):
+      return tuple(roster.names[i] for i in ids)
+    self.assertEqual(('host0', 'host1'), names(roster.host_ids))
+    self.assertEqual(('family0',), names(roster.other_sprinkler_ids))
+    self.assertEqual(('m0', 'm1'), names(roster.m_single_ids))
+    self.assertEqual(('f0',), names(roster.f_single_ids))
+
+  def test_to_match_set(self):
+    roster = match_generator.compile_roster(_make_p_info(2, 0, 3, 0))
+    match_set = match_generator.to_match_set(
+        ((0, (1, 0)), (None, (4, 2, 3))), roster,
+        datetime.datetime(2018, 10, 30))
+    self.assertEqual(
+        MatchSet(date_yyyymmdd='20181030', match=[
+            Match(host='host0', member=['host0', 'host1']),
+            Match(member=['m0', 'm1', 'm2'])]),
+        match_set)
+
+  def test_is_feasible_match(self):
+    p_info = _make_p_info(2, 2, 4, 1)
+
+    def is_feasible(host, members):
+      return match_generator.is_feasible_match(
+          Match(host=host, member=members), p_info)
+    self.assertTrue(is_feasible('host0', ['host0', 'host1', 'm0', 'm1']))
+    # At most one guest family.
+    self.assertFalse(is_feasible('host0', ['host0', 'host1', 'family0']))
+    # At most _MAX_GUEST_COUNT singles on top of a guest family.
+    self.assertFalse(
+        is_feasible('host0', ['host0', 'host1', 'm0', 'm1', 'm2']))
+    self.assertTrue(is_feasible('host0', ['host0', 'm0', 'm1', 'm2']))
+    self.assertFalse(is_feasible('family0', ['family0', 'm0']))
+    # Hostless groups are 3 to 4 same-gender singles.
+    self.assertTrue(is_feasible('', ['m0', 'm1', 'm2']))
+    self.assertFalse(is_feasible('', ['m0', 'm1', 'f0']))
+    self.assertFalse(is_feasible('', ['m0', 'm1']))
+
+  def test_compiled_sprinkler_matches_everyone_participating(self):
+    p_info = _make_p_info(7, 2, 9, 4)
+    roster = match_generator.compile_roster(p_info)
+    rng = random.Random(0)
+    for _ in range(100):
+      compact_config = match_generator.gen_compiled_sprinkler_match_config(
+          roster, rng)
+      members = [roster.names[i] for _, ids in compact_config for i in ids]
+      self.assertEqual(
+          sorted(p for p in p_info if p_info[p].participating), sorted(members))
+
+  def _assert_same_distribution(self, p_info, samples=20000):
+    match_date = datetime.datetime(2018, 10, 30)
+    roster = match_generator.compile_roster(p_info)
+    rng = random.Random(1)
+    expected = collections.Counter()
+    actual = collections.Counter()
+    for _ in range(samples):
+      match_set, found_match = match_generator.gen_sprinkler_match_config(
+          match_date, p_info, rng)
+      self.assertTrue(found_match)
+      expected[_canonical(match_set)] += 1
+      actual[_canonical(match_generator.to_match_set(
+          match_generator.gen_compiled_sprinkler_match_config(roster, rng),
+          roster, match_date))] += 1
+
+    self.assertEqual(set(expected), set(actual))
+    for c in expected:
+      # Allow 5 standard deviations of sampling noise per match set.
+      self.assertLessEqual(
+          abs(expected[c] - actual[c]), 5 * math.sqrt(expected[c] + actual[c]))
+
+  def test_compiled_sprinkler_same_distribution_odd_hosts(self):
+    self._assert_same_distribution(_make_p_info(3, 1, 3, 1))
+
+  def test_compiled_sprinkler_same_distribution_hostless_groups(self):
+    self._assert_same_distribution(_make_p_info(2, 0, 4, 3))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,107 @@
+"""Reads & writes ranked lists of alternative match configs.
+
+h2h --top_k writes the K best distinct match configs it found so that
+coordinators can pick an alternative to the winner, then commit it to the
+history with --commit_ranked_path without searching again.
+
+Files ending in .json hold a list of {rank, score, date_yyyymmdd, matches}
+objects. Any other file is a MatchingHistory textproto with one match_set
+per rank, best first, each preceded by a '# rank R, score S' comment.
+"""
+
+import collections
+import json
+import re
+
+from src.org.fotw.h2h.h2h_pb2 import MatchingHistory
+from src.org.fotw.h2h.h2h_pb2 import MatchSet
+
+from com_google_protobuf_python_srcs.python.google.protobuf import text_format
+
+
+# A match config (MatchSet) & its score. Ranks are list positions, from 1.
+RankedMatchConfig = collections.namedtuple(
+    'RankedMatchConfig', ['score', 'match_config'])
+
+_RANK_COMMENT_RE = re.compile(r'^# rank (\d+), score (\S+)$')
+
+
+def _is_json(path):
+  return path.endswith('.json')
+
+
+def match_config_to_json(match_config):
+  """Returns a JSON-serializable dictionary for a MatchSet."""
+  return {
+      'date_yyyymmdd': match_config.date_yyyymmdd,
+      'matches': [
+          {'host': match.host, 'members': list(match.member)}
+          for match in match_config.match],
+  }
+
+
+def match_config_from_json(obj):
+  """Returns the MatchSet of a match_config_to_json dictionary."""
+  match_config = MatchSet()
+  match_config.date_yyyymmdd = obj['date_yyyymmdd']
+  for m in obj['matches']:
+    match = match_config.match.add()
+    match.host = m.get('host', '')
+    match.member.extend(m['members'])
+  return match_config
+
+
+def _to_json_object(rank, ranked_match_config):
+  obj = {'rank': rank, 'score': ranked_match_config.score}
+  obj.update(match_config_to_json(ranked_match_config.match_config))
+  return obj
+
+
+def _from_json_object(obj):
+  return RankedMatchConfig(obj['score'], match_config_from_json(obj))
+
+
+def write_ranked(ranked, path):
+  """Writes a list of RankedMatchConfig, best first, to path."""
+  with open(path, 'w') as out_file:
+    if _is_json(path):
+      json.dump(
+          [_to_json_object(rank, r) for rank, r in enumerate(ranked, 1)],
+          out_file, indent=2)
+      out_file.write('\n')
+      return
+    for rank, r in enumerate(ranked, 1):
+      matching_history = MatchingHistory()
+      matching_history.match_set.add().CopyFrom(r.match_config)
+      out_file.write('# rank %d, score %r\n' % (rank, r.score))
+      out_file.write(text_format.MessageToString(matching_history))
+
+
+def read_ranked(path):
+  """Returns the list of RankedMatchConfig written to path by write_ranked."""
+  with open(path, 'r') as in_file:
+    text = in_file.read()
+  if _is_json(path):
+    return [_from_json_object(obj) for obj in json.loads(text)]
+  scores = []
+  for line in text.splitlines():
+    m = _RANK_COMMENT_RE.match(line)
+    if m:
+      if int(m.group(1)) != len(scores) + 1:
+        raise ValueError('ranks out of order in %s' % path)
+      scores.append(float(m.group(2)))
+  matching_history = MatchingHistory()
+  text_format.Parse(text, matching_history)
+  if len(scores) != len(matching_history.match_set):
+    raise ValueError('expected one rank comment per match_set in %s' % path)
+  return [
+      RankedMatchConfig(score, match_config)
+      for score, match_config in zip(scores, matching_history.match_set)]
+
+
+def get_ranked(path, rank):
+  """Returns the RankedMatchConfig of the given rank (from 1) in path."""
+  ranked = read_ranked(path)
+  if not 1 <= rank <= len(ranked):
+    raise ValueError('%s has no rank %d (it has %d)' % (path, rank, len(ranked)))
+  return ranked[rank - 1]
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from src.org.fotw.h2h import ranked_output
+from src.org.fotw.h2h.h2h_pb2 import MatchSet
+
+
+def _make_match_config(host, guest):
+  match_config = MatchSet(date_yyyymmdd='20181030')
+  match = match_config.match.add()
+  match.host = host
+  match.member.extend(sorted([host, guest]))
+  match = match_config.match.add()
+  match.member.extend(['single0', 'single1'])
+  return match_config
+
+
+class TestRankedOutput(unittest.TestCase):
+
+  def setUp(self):
+    self._dir = tempfile.TemporaryDirectory()
+    self._ranked = [
+        ranked_output.RankedMatchConfig(
+            -1234567.25, _make_match_config('family0', 'family1')),
+        ranked_output.RankedMatchConfig(
+            -2345678.5, _make_match_config('family1', 'family0')),
+    ]
+
+  def tearDown(self):
+    self._dir.cleanup()
+
+  def _round_trip(self, file_name):
+    path = os.path.join(self._dir.name, file_name)
+    ranked_output.write_ranked(self._ranked, path)
+    return path, ranked_output.read_ranked(path)
+
+  def test_json_round_trip(self):
+    _, ranked = self._round_trip('top_k.json')
+    self.assertEqual(self._ranked, ranked)
+
+  def test_textproto_round_trip(self):
+    path, ranked = self._round_trip('top_k.textproto')
+    self.assertEqual(self._ranked, ranked)
+    with open(path) as f:
+      self.assertTrue(f.read().startswith('# rank 1, score -1234567.25\n'))
+
+  def test_get_ranked(self):
+    path, _ = self._round_trip('top_k.textproto')
+    self.assertEqual(self._ranked[1], ranked_output.get_ranked(path, 2))
+    with self.assertRaises(ValueError):
+      ranked_output.get_ranked(path, 3)
+    with self.assertRaises(ValueError):
+      ranked_output.get_ranked(path, 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,72 @@
+"""Cheap per-phase metrics for h2h runs.
+
+Metrics are collected into a plain dictionary so that they can be dumped as
+JSON or merged with the search counters of h2h.get_best_match_config.
+Recording a phase only costs two clock reads, so metrics can stay on in
+production.
+"""
+
+import contextlib
+import cProfile
+import sys
+import time
+
+try:
+  import resource
+except ImportError:  # Not available on Windows.
+  resource = None
+
+
+_PHASE_KEY = 'phase_s'
+
+
+@contextlib.contextmanager
+def timed_phase(metrics, phase):
+  """Adds the wall time spent in the with-block to metrics['phase_s'][phase].
+
+  metrics may be None, in which case nothing is recorded.
+  """
+  if metrics is None:
+    yield
+    return
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    phase_s = metrics.setdefault(_PHASE_KEY, {})
+    phase_s[phase] = phase_s.get(phase, 0.0) + time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def maybe_profile(prof_path):
+  """Runs the with-block under cProfile & writes stats to prof_path if set.
+
+  Only profiles the calling process, not search worker processes.
+  """
+  if prof_path is None:
+    yield
+    return
+  profiler = cProfile.Profile()
+  profiler.enable()
+  try:
+    yield
+  finally:
+    profiler.disable()
+    profiler.dump_stats(prof_path)
+
+
+def _ru_maxrss_bytes(who):
+  max_rss = resource.getrusage(who).ru_maxrss
+  # Linux reports kilobytes, macOS reports bytes.
+  return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def record_peak_memory(metrics):
+  """Records the peak resident set size of this process & its children.
+
+  Children are the search worker processes, once they've exited.
+  """
+  if resource is None:
+    return
+  metrics['peak_rss_bytes'] = _ru_maxrss_bytes(resource.RUSAGE_SELF)
+  metrics['peak_children_rss_bytes'] = _ru_maxrss_bytes(resource.RUSAGE_CHILDREN)
@@ -0,0 +1,51 @@
+import os
+import pstats
+import tempfile
+import unittest
+
+from src.org.fotw.h2h import run_metrics
+
+
+class TestRunMetrics(unittest.TestCase):
+
+  def test_timed_phase_accumulates(self):
+    metrics = {}
+    with run_metrics.timed_phase(metrics, 'load'):
+      pass
+    first_load_s = metrics['phase_s']['load']
+    with run_metrics.timed_phase(metrics, 'load'):
+      pass
+    with run_metrics.timed_phase(metrics, 'search'):
+      pass
+
+    self.assertEqual(['load', 'search'], sorted(metrics['phase_s']))
+    self.assertGreaterEqual(metrics['phase_s']['load'], first_load_s)
+
+  def test_timed_phase_without_metrics(self):
+    with run_metrics.timed_phase(None, 'load'):
+      pass
+
+  def test_timed_phase_records_on_error(self):
+    metrics = {}
+    with self.assertRaises(ValueError):
+      with run_metrics.timed_phase(metrics, 'load'):
+        raise ValueError()
+    self.assertIn('load', metrics['phase_s'])
+
+  def test_maybe_profile(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      prof_path = os.path.join(tmp_dir, 'search.prof')
+      with run_metrics.maybe_profile(prof_path):
+        sorted(range(100))
+      self.assertGreater(pstats.Stats(prof_path).total_calls, 0)
+
+  @unittest.skipIf(run_metrics.resource is None, 'resource not available')
+  def test_record_peak_memory(self):
+    metrics = {}
+    run_metrics.record_peak_memory(metrics)
+    self.assertGreater(metrics['peak_rss_bytes'], 0)
+    self.assertIn('peak_children_rss_bytes', metrics)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,75 @@
+"""A bounded least-recently-used memo of candidate scores.
+
+With small rosters the generators produce the same match configs over and
+over. Keying scores by match_generator.get_canonical_form lets the search
+skip rescoring those duplicates.
+"""
+
+import collections
+import sys
+
+
+# Estimated bytes of an OrderedDict entry on top of its key & value: the hash
+# table slot & the linked list node that keeps the LRU order.
+_ENTRY_OVERHEAD_BYTES = 100
+
+
+def get_entry_bytes(canonical_form, score):
+  """Estimates the bytes held by a memo entry.
+
+  Counts the tuples of the canonical form & the score but not the ints &
+  floats in them, which are small & usually shared with the roster.
+  """
+  size = (_ENTRY_OVERHEAD_BYTES + sys.getsizeof(canonical_form) +
+          sys.getsizeof(score))
+  for match in canonical_form:
+    size += sys.getsizeof(match) + sys.getsizeof(match[1])
+  return size
+
+
+class ScoreMemo():
+  """Maps canonical match config forms to scores.
+
+  Holds at most max_size entries & max_bytes estimated bytes (see
+  get_entry_bytes), evicting the least recently used entries first.
+  """
+
+  def __init__(self, max_size=None, max_bytes=None):
+    self._max_size = max_size
+    self._max_bytes = max_bytes
+    # Canonical form => (score, estimated bytes).
+    self._scores = collections.OrderedDict()
+    self._bytes = 0
+
+  def __len__(self):
+    return len(self._scores)
+
+  def get_bytes(self):
+    """Returns the estimated bytes of the entries (0 without max_bytes)."""
+    return self._bytes
+
+  def get(self, canonical_form):
+    """Returns the memoized score, or None."""
+    entry = self._scores.get(canonical_form)
+    if entry is None:
+      return None
+    self._scores.move_to_end(canonical_form)
+    return entry[0]
+
+  def put(self, canonical_form, score):
+    entry_bytes = 0
+    if self._max_bytes is not None:
+      entry_bytes = get_entry_bytes(canonical_form, score)
+    if ((self._max_size is not None and self._max_size <= 0) or
+        (self._max_bytes is not None and entry_bytes > self._max_bytes)):
+      return
+    old_entry = self._scores.pop(canonical_form, None)
+    if old_entry is not None:
+      self._bytes -= old_entry[1]
+    self._scores[canonical_form] = (score, entry_bytes)
+    self._bytes += entry_bytes
+    while ((self._max_size is not None and
+            len(self._scores) > self._max_size) or
+           (self._max_bytes is not None and self._bytes > self._max_bytes)):
+      _, (_, evicted_bytes) = self._scores.popitem(last=False)
+      self._bytes -= evicted_bytes
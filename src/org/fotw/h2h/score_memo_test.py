@@ -0,0 +1,59 @@
+import unittest
+
+from src.org.fotw.h2h import match_generator
+from src.org.fotw.h2h import score_memo
+
+
+class TestScoreMemo(unittest.TestCase):
+
+  def test_get_put(self):
+    memo = score_memo.ScoreMemo(2)
+    self.assertIsNone(memo.get('a'))
+    memo.put('a', 1.0)
+    self.assertEqual(1.0, memo.get('a'))
+    self.assertEqual(1, len(memo))
+
+  def test_evicts_least_recently_used(self):
+    memo = score_memo.ScoreMemo(2)
+    memo.put('a', 1.0)
+    memo.put('b', 2.0)
+    memo.get('a')
+    memo.put('c', 3.0)
+    self.assertEqual(2, len(memo))
+    self.assertEqual(1.0, memo.get('a'))
+    self.assertIsNone(memo.get('b'))
+    self.assertEqual(3.0, memo.get('c'))
+
+  def test_zero_size(self):
+    memo = score_memo.ScoreMemo(0)
+    memo.put('a', 1.0)
+    self.assertIsNone(memo.get('a'))
+
+  def test_byte_budget(self):
+    forms = [((i, (i, 100 + i)),) for i in range(10)]
+    entry_bytes = score_memo.get_entry_bytes(forms[0], (1.0,))
+    memo = score_memo.ScoreMemo(max_bytes=3 * entry_bytes)
+    for form in forms:
+      memo.put(form, (1.0,))
+      self.assertLessEqual(memo.get_bytes(), 3 * entry_bytes)
+    self.assertEqual(3, len(memo))
+    self.assertEqual((1.0,), memo.get(forms[-1]))
+    self.assertIsNone(memo.get(forms[0]))
+
+    # Entries larger than the whole budget aren't kept.
+    memo = score_memo.ScoreMemo(max_bytes=entry_bytes - 1)
+    memo.put(forms[0], (1.0,))
+    self.assertEqual(0, len(memo))
+    self.assertEqual(0, memo.get_bytes())
+
+  def test_canonical_form_ignores_order(self):
+    self.assertEqual(
+        match_generator.get_canonical_form(((0, (0, 3)), (None, (4, 5, 6)))),
+        match_generator.get_canonical_form(((None, (4, 5, 6)), (0, (0, 3)))))
+    self.assertNotEqual(
+        match_generator.get_canonical_form(((0, (0, 3)), (None, (4, 5, 6)))),
+        match_generator.get_canonical_form(((3, (0, 3)), (None, (4, 5, 6)))))
+
+
+if __name__ == '__main__':
+  unittest.main()
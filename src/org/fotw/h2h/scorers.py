@@ -0,0 +1,201 @@
+"""Registry of scoring functions that candidates can be evaluated with.
+
+Every scorer scores compact match configs (see match_generator) for a fixed
+history & match date; higher is better. Scorers built together by
+make_scorers share one DeltaScorer, so evaluating a candidate with several
+scorers doesn't repeat the per-pair history lookups.
+
+ - default: h2h.get_match_config_score. Load-balanced hosting (days since
+   last hosted & times hosted), then relationship development.
+ - rel_dev: relationship development only.
+ - extra_effort: load-balances the extra effort of hosting, i.e. guests
+   cooked for relative to the host's own household, both long-term (since
+   joining h2h) and short-term (past 2 months). Then relationship
+   development.
+
+Other scorers can be added with register_scorer.
+"""
+
+import collections
+import datetime
+
+from src.org.fotw.h2h import delta_scorer
+
+
+# The best match config found for a scorer, its score & a dictionary from
+# metric name to value explaining the score.
+ScorerResult = collections.namedtuple(
+    'ScorerResult', ['match_config', 'score', 'breakdown'])
+
+
+class DefaultScorer():
+  """Scores like h2h.get_match_config_score."""
+
+  def __init__(self, p_info, host_historian, match_date, shared_delta_scorer):
+    self._delta_scorer = shared_delta_scorer
+
+  def score_compact(self, compact_config):
+    return self._delta_scorer.score_compact(compact_config)
+
+  def get_breakdown(self, compact_config):
+    host_service_score, rel_dev_badness = self._delta_scorer.get_compact_terms(
+        compact_config)
+    return {
+        'score': self.score_compact(compact_config),
+        'host_service_score': host_service_score,
+        'rel_dev_badness': rel_dev_badness,
+    }
+
+
+class RelDevScorer():
+  """Scores relationship development only: fewer repeat meetups is better."""
+
+  def __init__(self, p_info, host_historian, match_date, shared_delta_scorer):
+    self._delta_scorer = shared_delta_scorer
+
+  def score_compact(self, compact_config):
+    _, rel_dev_badness = self._delta_scorer.get_compact_terms(compact_config)
+    return -rel_dev_badness
+
+  def get_breakdown(self, compact_config):
+    _, rel_dev_badness = self._delta_scorer.get_compact_terms(compact_config)
+    return {'score': -rel_dev_badness, 'rel_dev_badness': rel_dev_badness}
+
+
+# Extra effort rates are per this many days (the usual time between h2h
+# dates), and newer participants' rates are computed over at least this long.
+_EFFORT_PERIOD_DAYS = 28
+
+# How far back the short-term extra effort measure looks.
+_SHORT_TERM_DAYS = 61
+
+
+def _get_household_size(p):
+  """Returns how many people a participant's household cooks for.
+
+  Families are assumed to have two adults.
+  """
+  if not p.is_family:
+    return 1
+  return 2 + p.child_count
+
+
+class ExtraEffortScorer():
+  """Load-balances hosting by extra effort, then relationship development.
+
+  A hosting's extra effort is the number of guests cooked for divided by the
+  size of the host's own household. For every participant that can host,
+  both the long-term rate (since first showing up in the history) and the
+  short-term rate (past _SHORT_TERM_DAYS) are computed per
+  _EFFORT_PERIOD_DAYS, and the sum of their squares is the extra effort
+  badness, so that no host carries much more than the others.
+  """
+
+  def __init__(self, p_info, host_historian, match_date, shared_delta_scorer):
+    self._delta_scorer = shared_delta_scorer
+    self._match_date = match_date
+    self._names = [name for name in p_info]
+    self._household_sizes = [_get_household_size(p_info[name]) for name in self._names]
+    name_ids = {name: i for i, name in enumerate(self._names)}
+
+    first_dates = {}
+    long_term_efforts = collections.defaultdict(float)
+    short_term_efforts = collections.defaultdict(float)
+    short_term_start = match_date - datetime.timedelta(days=_SHORT_TERM_DAYS)
+    for event_date in host_historian.get_event_dates():
+      if event_date > match_date:
+        break
+      for host, members in host_historian.get_events(event_date):
+        for m in members:
+          first_dates.setdefault(m, event_date)
+        if not host or host not in name_ids:
+          continue
+        effort = self._get_effort(
+            name_ids[host], [name_ids[m] for m in members if m in name_ids])
+        long_term_efforts[host] += effort
+        if event_date > short_term_start:
+          short_term_efforts[host] += effort
+
+    # self._hosts[i] is (long-term effort, long-term days, short-term effort,
+    # short-term days) for every id i that can host.
+    self._hosts = {}
+    self._badness_baseline = 0
+    for i, name in enumerate(self._names):
+      if not p_info[name].can_host:
+        continue
+      days = (match_date - first_dates.get(name, match_date)).days
+      days = max(days, _EFFORT_PERIOD_DAYS)
+      host = (
+          long_term_efforts[name], days, short_term_efforts[name],
+          min(days, _SHORT_TERM_DAYS))
+      self._hosts[i] = host
+      self._badness_baseline += self._get_host_badness(host, 0)
+
+  def _get_effort(self, host_id, member_ids):
+    guests = sum(self._household_sizes[m] for m in member_ids if m != host_id)
+    return guests / self._household_sizes[host_id]
+
+  def _get_host_badness(self, host, new_effort):
+    long_term_effort, long_term_days, short_term_effort, short_term_days = host
+    long_term_rate = (
+        (long_term_effort + new_effort) * _EFFORT_PERIOD_DAYS / long_term_days)
+    short_term_rate = (
+        (short_term_effort + new_effort) * _EFFORT_PERIOD_DAYS / short_term_days)
+    return long_term_rate ** 2 + short_term_rate ** 2
+
+  def get_extra_effort_badness(self, compact_config):
+    badness = self._badness_baseline
+    for host_id, member_ids in compact_config:
+      if host_id is None or host_id not in self._hosts:
+        continue
+      host = self._hosts[host_id]
+      badness -= self._get_host_badness(host, 0)
+      badness += self._get_host_badness(host, self._get_effort(host_id, member_ids))
+    return badness
+
+  def score_compact(self, compact_config):
+    _, rel_dev_badness = self._delta_scorer.get_compact_terms(compact_config)
+    return (
+        -(1e6 * self.get_extra_effort_badness(compact_config)) -
+        min(rel_dev_badness, 1e6)
+    )
+
+  def get_breakdown(self, compact_config):
+    _, rel_dev_badness = self._delta_scorer.get_compact_terms(compact_config)
+    return {
+        'score': self.score_compact(compact_config),
+        'extra_effort_badness': self.get_extra_effort_badness(compact_config),
+        'rel_dev_badness': rel_dev_badness,
+    }
+
+
+_SCORERS = collections.OrderedDict([
+    ('default', DefaultScorer),
+    ('rel_dev', RelDevScorer),
+    ('extra_effort', ExtraEffortScorer),
+])
+
+
+def register_scorer(name, scorer_class):
+  """Makes scorer_class available as name.
+
+  scorer_class(p_info, host_historian, match_date, shared_delta_scorer) must
+  have score_compact(compact_config) & get_breakdown(compact_config) methods.
+  """
+  _SCORERS[name] = scorer_class
+
+
+def get_scorer_names():
+  return list(_SCORERS)
+
+
+def make_scorers(scorer_names, p_info, host_historian, match_date):
+  """Returns a scorer for each of scorer_names, sharing one DeltaScorer."""
+  for name in scorer_names:
+    if name not in _SCORERS:
+      raise ValueError('unknown scorer: %s' % name)
+  shared_delta_scorer = delta_scorer.DeltaScorer(p_info, host_historian, match_date)
+  return [
+      _SCORERS[name](p_info, host_historian, match_date, shared_delta_scorer)
+      for name in scorer_names
+  ]
@@ -0,0 +1,146 @@
+import copy
+import datetime
+import math
+import random
+import unittest
+
+from src.org.fotw.h2h import delta_scorer
+from src.org.fotw.h2h import fixtures
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import match_generator
+from src.org.fotw.h2h import scorers
+
+
+def _make_historian(p_info, rng):
+  h = historian.Historian()
+  # Leave family6 out of the first dates so it joins later.
+  late_p_info = {name: p for name, p in p_info.items() if name != 'family6'}
+  for month in range(1, 9):
+    event_date = datetime.datetime(2020, month, 1)
+    match_config, _ = match_generator.gen_sprinkler_match_config(
+        event_date, late_p_info if month < 6 else p_info, rng)
+    h2h.push_match_config(h, match_config, event_date)
+  return h
+
+
+def _pushed(h, match_config, match_date):
+  h = copy.deepcopy(h)
+  h2h.push_match_config(h, match_config, match_date)
+  return h
+
+
+def _rel_dev_badness(p_info, h):
+  names = list(p_info)
+  return math.sqrt(sum(
+      h2h.get_rel_dev_score(a, b, h) for i, a in enumerate(names)
+      for b in names[i + 1:]))
+
+
+def _extra_effort_badness(p_info, h, match_date):
+  """Recomputes the extra effort badness from the whole event log."""
+  def household_size(name):
+    p = p_info[name]
+    return 2 + p.child_count if p.is_family else 1
+
+  badness = 0
+  for name, p in p_info.items():
+    if not p.can_host:
+      continue
+    first_date = None
+    long_term_effort = 0
+    short_term_effort = 0
+    for event_date in h.get_event_dates():
+      for host, members in h.get_events(event_date):
+        if name in members and first_date is None:
+          first_date = event_date
+        if host != name:
+          continue
+        effort = sum(
+            household_size(m) for m in members if m != host) / household_size(host)
+        long_term_effort += effort
+        if (match_date - event_date).days < 61:
+          short_term_effort += effort
+    days = max((match_date - (first_date or match_date)).days, 28)
+    badness += (long_term_effort * 28 / days) ** 2
+    badness += (short_term_effort * 28 / min(days, 61)) ** 2
+  return badness
+
+
+class TestScorers(unittest.TestCase):
+
+  def _check_scorers(self, check):
+    rng = random.Random(1)
+    p_info = fixtures.make_p_info(8, 8)
+    h = _make_historian(p_info, rng)
+    match_date = datetime.datetime(2020, 9, 1)
+    roster = match_generator.compile_roster(p_info)
+    scorer_list = scorers.make_scorers(
+        scorers.get_scorer_names(), p_info, h, match_date)
+    for _ in range(30):
+      compact_config = match_generator.gen_compiled_sprinkler_match_config(
+          roster, rng)
+      pushed_h = _pushed(
+          h, match_generator.to_match_set(compact_config, roster, match_date),
+          match_date)
+      check(
+          p_info, pushed_h, match_date, compact_config,
+          dict(zip(scorers.get_scorer_names(), scorer_list)))
+
+  def test_default_scorer(self):
+    def check(p_info, pushed_h, match_date, compact_config, scorer_dict):
+      expected = h2h.get_match_config_score(p_info, pushed_h, match_date)
+      self.assertEqual(expected, scorer_dict['default'].score_compact(compact_config))
+      breakdown = scorer_dict['default'].get_breakdown(compact_config)
+      self.assertEqual(expected, breakdown['score'])
+      self.assertAlmostEqual(
+          _rel_dev_badness(p_info, pushed_h), breakdown['rel_dev_badness'])
+    self._check_scorers(check)
+
+  def test_rel_dev_scorer(self):
+    def check(p_info, pushed_h, match_date, compact_config, scorer_dict):
+      self.assertAlmostEqual(
+          -_rel_dev_badness(p_info, pushed_h),
+          scorer_dict['rel_dev'].score_compact(compact_config))
+    self._check_scorers(check)
+
+  def test_extra_effort_scorer(self):
+    def check(p_info, pushed_h, match_date, compact_config, scorer_dict):
+      breakdown = scorer_dict['extra_effort'].get_breakdown(compact_config)
+      self.assertAlmostEqual(
+          _extra_effort_badness(p_info, pushed_h, match_date),
+          breakdown['extra_effort_badness'])
+      self.assertAlmostEqual(
+          -1e6 * breakdown['extra_effort_badness'] -
+          min(breakdown['rel_dev_badness'], 1e6),
+          breakdown['score'])
+    self._check_scorers(check)
+
+  def test_unknown_scorer(self):
+    with self.assertRaises(ValueError):
+      scorers.make_scorers(
+          ['nope'], fixtures.make_p_info(8, 8), historian.Historian(),
+          datetime.datetime(2020, 9, 1))
+
+  def test_register_scorer(self):
+    class HostCountScorer():
+      def __init__(self, p_info, host_historian, match_date, shared_delta_scorer):
+        self.shared_delta_scorer = shared_delta_scorer
+
+      def score_compact(self, compact_config):
+        return sum(1 for host_id, _ in compact_config if host_id is not None)
+
+      def get_breakdown(self, compact_config):
+        return {'score': self.score_compact(compact_config)}
+
+    scorers.register_scorer('test_host_count', HostCountScorer)
+    self.assertIn('test_host_count', scorers.get_scorer_names())
+    default, host_count = scorers.make_scorers(
+        ['default', 'test_host_count'], fixtures.make_p_info(8, 8), historian.Historian(),
+        datetime.datetime(2020, 9, 1))
+    self.assertIsInstance(host_count.shared_delta_scorer, delta_scorer.DeltaScorer)
+    self.assertEqual(2, host_count.score_compact(((0, (0, 1)), (2, (2, 3)))))
+
+
+if __name__ == '__main__':
+  unittest.main()
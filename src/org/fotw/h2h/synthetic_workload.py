@@ -0,0 +1,63 @@
+"""Generates synthetic participant CSVs & hosting histories for benchmarks."""
+
+import csv
+import datetime
+import io
+
+from src.org.fotw.h2h import h2h
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import match_generator
+
+
+FIRST_DATE = datetime.datetime(2015, 1, 7)
+
+
+def gen_participants_csv(
+    roster_size, rng, family_fraction=0.6, host_fraction=0.8,
+    large_family_fraction=0.1):
+  """Returns the text of a participants CSV as read by h2h.parse_participant_csv.
+
+  family_fraction of the roster are families, host_fraction of the families
+  can host and large_family_fraction of the families have 5+ children. The
+  rest are singles with a random gender.
+  """
+  out = io.StringIO()
+  writer = csv.writer(out, lineterminator='\n')
+  writer.writerow(
+      ['name', 'is_family', 'participating', 'can_host', 'child_count',
+       'gender_if_single'])
+  for i in range(roster_size):
+    if rng.random() < family_fraction:
+      if rng.random() < large_family_fraction:
+        child_count = rng.randint(5, 8)
+      else:
+        child_count = rng.randint(0, 4)
+      can_host = 'Y' if rng.random() < host_fraction else 'N'
+      writer.writerow(['family%d' % i, 'Y', 'Y', can_host, child_count, ''])
+    else:
+      writer.writerow(['single%d' % i, 'N', 'Y', 'N', 0, rng.choice('MF')])
+  return out.getvalue()
+
+
+def gen_p_info(roster_size, rng, **kwargs):
+  """Returns a participant dictionary (see gen_participants_csv for kwargs)."""
+  return h2h.parse_participant_csv(
+      io.StringIO(gen_participants_csv(roster_size, rng, **kwargs)))
+
+
+def gen_historian(p_info, n_dates, rng, first_date=FIRST_DATE, cadence_days=28):
+  """Returns a Historian with n_dates generated match configs, one per cadence."""
+  h = historian.Historian()
+  event_date = first_date
+  for _ in range(n_dates):
+    match_config, found_match = match_generator.gen_sprinkler_match_config(
+        event_date, p_info, rng)
+    if found_match:
+      h2h.push_match_config(h, match_config, event_date)
+    event_date += datetime.timedelta(days=cadence_days)
+  return h
+
+
+def get_next_date(n_dates, first_date=FIRST_DATE, cadence_days=28):
+  """Returns the date after the last one of gen_historian."""
+  return first_date + datetime.timedelta(days=cadence_days * n_dates)
@@ -0,0 +1,30 @@
+import random
+import unittest
+
+from src.org.fotw.h2h import synthetic_workload
+
+
+class TestSyntheticWorkload(unittest.TestCase):
+
+  def test_gen_p_info(self):
+    p_info = synthetic_workload.gen_p_info(50, random.Random(0))
+    self.assertEqual(50, len(p_info))
+    self.assertTrue(any(p.is_family and p.can_host for p in p_info.values()))
+    self.assertTrue(any(not p.is_family for p in p_info.values()))
+
+  def test_gen_historian(self):
+    rng = random.Random(0)
+    p_info = synthetic_workload.gen_p_info(50, rng)
+    h = synthetic_workload.gen_historian(p_info, 5, rng)
+    event_dates = h.get_event_dates()
+    self.assertEqual(5, len(event_dates))
+    self.assertLess(event_dates[-1], synthetic_workload.get_next_date(5))
+
+  def test_deterministic(self):
+    self.assertEqual(
+        synthetic_workload.gen_participants_csv(30, random.Random(1)),
+        synthetic_workload.gen_participants_csv(30, random.Random(1)))
+
+
+if __name__ == '__main__':
+  unittest.main()
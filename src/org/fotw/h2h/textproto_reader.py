@@ -0,0 +1,305 @@
+"""Reads hosting history textprotos straight into a Historian.
+
+historian.from_proto needs the whole MatchingHistory parsed by protobuf's
+generic pure-Python text_format first, so the history is held twice. This
+reader is specialized to the MatchingHistory schema in h2h.proto: it
+tokenizes the textproto a line at a time & feeds each match set's events to
+historian.from_events as soon as it's complete, without building proto
+objects.
+
+It accepts the same inputs as text_format.Parse does for this schema
+(comments, '<>' or '{}' messages, optional ':' before messages, '[...]'
+lists, ',' or ';' after fields, concatenated & escaped strings) and builds
+the same Historian as from_proto. Malformed input raises ValueError.
+"""
+
+import datetime
+import re
+
+from src.org.fotw.h2h import historian
+
+from com_google_protobuf_python_srcs.python.google.protobuf import text_encoding
+
+
+# Skips whitespace, then matches one token. lastindex tells the token's kind.
+_TOKEN_RE = re.compile(r"""\s*(?:
+    (\#.*)|                               # 1: comment
+    ([A-Za-z_][0-9A-Za-z_+-]*)|           # 2: identifier
+    ("(?:[^"\n\\]|\\.)*"|'(?:[^'\n\\]|\\.)*')|  # 3: string
+    ([{}<>\[\]:,;])|                      # 4: punctuation
+    (\S))                                 # 5: anything else is an error
+""", re.VERBOSE)
+
+# A whole line holding a string field without escapes, like the lines
+# text_format.MessageToString writes, e.g. '  member: "Smiths"'.
+_SIMPLE_FIELD_RE = re.compile(r'\s*([A-Za-z_][0-9A-Za-z_+-]*)\s*:\s*"([^"\\\n]*)"\s*$')
+
+# Lines starting like this can't continue the string on the line before
+# them (with another string literal) or hold its separator.
+_FIELD_BOUNDARY_RE = re.compile(r'\s*[A-Za-z_}>]')
+
+_COMMENT = 1
+_IDENTIFIER = 2
+_STRING = 3
+_PUNCTUATION = 4
+
+_CLOSING = {'{': '}', '<': '>'}
+
+_TEXTPROTO_DATE_FORMAT = '%Y%m%d'
+
+
+class _Tokenizer():
+  """The tokens of a textproto, read one line at a time."""
+
+  def __init__(self, lines):
+    self._lines = iter(lines)
+    # One line of lookahead, for try_consume_simple_field.
+    self._next_line = next(self._lines, None)
+    self._tokens = []
+    self._pos = 0
+    self.line_no = 0
+
+  def _read_line(self):
+    line = self._next_line
+    if line is not None:
+      self._next_line = next(self._lines, None)
+      self.line_no += 1
+    return line
+
+  def _tokenize(self, line):
+    self._tokens = []
+    self._pos = 0
+    for m in _TOKEN_RE.finditer(line):
+      kind = m.lastindex
+      if kind == _COMMENT:
+        break
+      if kind not in (_IDENTIFIER, _STRING, _PUNCTUATION):
+        self.error('unexpected %r' % m.group(kind))
+      self._tokens.append((kind, m.group(kind)))
+
+  def peek(self):
+    """Returns the next (kind, text) without consuming it, or None at EOF."""
+    while self._pos == len(self._tokens):
+      line = self._read_line()
+      if line is None:
+        return None
+      self._tokenize(line)
+    return self._tokens[self._pos]
+
+  def try_consume_simple_field(self):
+    """Returns (name, value) if the next tokens are a whole simple field line.
+
+    A fast path for the common case: the line is 'name: "value"' with no
+    escapes, and the next line doesn't continue it. Returns None (without
+    consuming anything) otherwise.
+    """
+    if self._pos != len(self._tokens) or self._next_line is None:
+      return None
+    m = _SIMPLE_FIELD_RE.match(self._next_line)
+    if m is None:
+      return None
+    line = self._read_line()
+    if self._next_line is not None and not _FIELD_BOUNDARY_RE.match(self._next_line):
+      self._tokenize(line)
+      return None
+    return m.groups()
+
+  def next(self):
+    token = self.peek()
+    if token is None:
+      self.error('unexpected end of input')
+    self._pos += 1
+    return token
+
+  def try_consume(self, punctuation):
+    token = self.peek()
+    if token is not None and token[0] == _PUNCTUATION and token[1] == punctuation:
+      self._pos += 1
+      return True
+    return False
+
+  def expect(self, punctuation):
+    if not self.try_consume(punctuation):
+      self.error('expected "%s"' % punctuation)
+
+  def error(self, message):
+    raise ValueError('line %d: %s' % (self.line_no, message))
+
+
+def _unescape(text):
+  # Like text_format: escapes are C-style & strings must be valid UTF-8.
+  try:
+    return text_encoding.CUnescape(text).decode('utf-8')
+  except (UnicodeDecodeError, ValueError) as e:
+    raise ValueError('couldn\'t parse string %r: %s' % (text, e))
+
+
+def _consume_string(tokens):
+  """Consumes a string value, concatenating adjacent string literals."""
+  kind, text = tokens.next()
+  if kind != _STRING:
+    tokens.error('expected a string but found %r' % text)
+  pieces = [text[1:-1]]
+  while True:
+    token = tokens.peek()
+    if token is None or token[0] != _STRING:
+      break
+    tokens.next()
+    pieces.append(token[1][1:-1])
+  value = ''.join(pieces)
+  if '\\' in value:
+    value = _unescape(value)
+  return value
+
+
+def _consume_strings(tokens, values):
+  """Consumes a repeated string field's value(s) after the ':'."""
+  if not tokens.try_consume('['):
+    values.append(_consume_string(tokens))
+    return
+  if tokens.try_consume(']'):
+    return
+  values.append(_consume_string(tokens))
+  while not tokens.try_consume(']'):
+    tokens.expect(',')
+    values.append(_consume_string(tokens))
+
+
+def _consume_messages(tokens, parse_body):
+  """Consumes a repeated message field's value(s) after the field name.
+
+  Returns the list of parse_body(tokens, closing punctuation) results.
+  """
+  tokens.try_consume(':')
+  if not tokens.try_consume('['):
+    return [_consume_message(tokens, parse_body)]
+  messages = []
+  if tokens.try_consume(']'):
+    return messages
+  messages.append(_consume_message(tokens, parse_body))
+  while not tokens.try_consume(']'):
+    tokens.expect(',')
+    messages.append(_consume_message(tokens, parse_body))
+  return messages
+
+
+def _consume_message(tokens, parse_body):
+  kind, text = tokens.next()
+  if kind != _PUNCTUATION or text not in _CLOSING:
+    tokens.error('expected "{" but found %r' % text)
+  return parse_body(tokens, _CLOSING[text])
+
+
+def _consume_field_name(tokens, closing):
+  """Returns the next field's name, or None after consuming `closing`."""
+  kind, text = tokens.next()
+  if kind == _IDENTIFIER:
+    return text
+  if closing is not None and kind == _PUNCTUATION and text == closing:
+    return None
+  tokens.error('expected a field name but found %r' % text)
+
+
+def _consume_separator(tokens):
+  if not tokens.try_consume(','):
+    tokens.try_consume(';')
+
+
+def _set_singular(tokens, message_name, field_name, old_value, new_value):
+  # proto3 strings without presence may only be set again while empty.
+  if old_value:
+    tokens.error('%s should not have multiple "%s" fields' % (
+        message_name, field_name))
+  return new_value
+
+
+def _parse_match(tokens, closing):
+  """Returns the (host, members) of a Match."""
+  host = ''
+  members = []
+  while True:
+    simple_field = tokens.try_consume_simple_field()
+    if simple_field is not None:
+      name, value = simple_field
+      if name == 'member':
+        members.append(value)
+      elif name == 'host':
+        host = _set_singular(tokens, 'Match', name, host, value)
+      else:
+        tokens.error('Match has no field named "%s"' % name)
+      continue
+    name = _consume_field_name(tokens, closing)
+    if name is None:
+      return host, members
+    tokens.expect(':')
+    if name == 'member':
+      _consume_strings(tokens, members)
+    elif name == 'host':
+      host = _set_singular(tokens, 'Match', name, host, _consume_string(tokens))
+    else:
+      tokens.error('Match has no field named "%s"' % name)
+    _consume_separator(tokens)
+
+
+def _parse_match_set(tokens, closing):
+  """Returns the (date_yyyymmdd, [(host, members)]) of a MatchSet."""
+  date_yyyymmdd = ''
+  matches = []
+  while True:
+    simple_field = tokens.try_consume_simple_field()
+    if simple_field is not None:
+      name, value = simple_field
+      if name != 'date_yyyymmdd':
+        tokens.error('MatchSet has no field named "%s"' % name)
+      date_yyyymmdd = _set_singular(tokens, 'MatchSet', name, date_yyyymmdd, value)
+      continue
+    name = _consume_field_name(tokens, closing)
+    if name is None:
+      return date_yyyymmdd, matches
+    if name == 'date_yyyymmdd':
+      tokens.expect(':')
+      date_yyyymmdd = _set_singular(
+          tokens, 'MatchSet', name, date_yyyymmdd, _consume_string(tokens))
+    elif name == 'match':
+      matches.extend(_consume_messages(tokens, _parse_match))
+    else:
+      tokens.error('MatchSet has no field named "%s"' % name)
+    _consume_separator(tokens)
+
+
+def _iter_events(tokens):
+  """Yields the (event_date, host, members) of each match, in order."""
+  # strptime is slow, so each distinct date string is only parsed once.
+  dates = {}
+  while tokens.peek() is not None:
+    name = _consume_field_name(tokens, None)
+    if name != 'match_set':
+      tokens.error('MatchingHistory has no field named "%s"' % name)
+    for date_yyyymmdd, matches in _consume_messages(tokens, _parse_match_set):
+      event_date = dates.get(date_yyyymmdd)
+      if event_date is None:
+        try:
+          event_date = datetime.datetime.strptime(
+              date_yyyymmdd, _TEXTPROTO_DATE_FORMAT)
+        except ValueError:
+          raise Exception('failed to parse match date %s' % date_yyyymmdd)
+        dates[date_yyyymmdd] = event_date
+      for host, members in matches:
+        yield event_date, host, members
+    _consume_separator(tokens)
+
+
+def read_historian(lines):
+  """Returns the Historian of a MatchingHistory textproto.
+
+  lines is an iterable of the textproto's lines, e.g. a file opened for
+  reading, so the textproto never has to be in memory all at once.
+  """
+  return historian.from_events(_iter_events(_Tokenizer(lines)))
+
+
+def load_historian(textproto_path):
+  """Returns the Historian of the MatchingHistory textproto at textproto_path."""
+  # Like text_format, only split lines at '\n' (a '\r' may be in a string).
+  with open(textproto_path, 'rb') as textproto_file:
+    return read_historian(line.decode('utf-8') for line in textproto_file)
@@ -0,0 +1,113 @@
+import io
+import os
+import tempfile
+import unittest
+
+from src.org.fotw.h2h import historian
+from src.org.fotw.h2h import history_writer
+from src.org.fotw.h2h import textproto_reader
+from src.org.fotw.h2h.h2h_pb2 import MatchingHistory
+
+from com_google_protobuf_python_srcs.python.google.protobuf import text_format
+
+
+_DATE = 'date_yyyymmdd: "20180101"'
+
+# Inputs that text_format.Parse accepts for MatchingHistory.
+_VALID_TEXTPROTOS = [
+    '',
+    '# only a comment\n',
+    'match_set {\n  %s\n  match {\n    member: "a"\n    member: "b"\n'
+    '    host: "b"\n  }\n}\n' % _DATE,
+    'match_set{%s match{member:"a" member:"b"}}' % _DATE,
+    'match_set: < %s match: { member: "a" member: "b" } >' % _DATE,
+    'match_set: [{%s}, <date_yyyymmdd: "20180102">]' % _DATE,
+    'match_set [] match_set: []',
+    'match_set { %s match [{}, {member: "a"}] match: [] }' % _DATE,
+    'match_set { %s match { member: ["a", "b"] member: [] member: "c" "d", }; }'
+    % _DATE,
+    'match_set { date_yyyymmdd: \'2018\' "0101"; } ,',
+    'match_set {\n # c\n %s # x\n match { member: "a#b" }\n}' % _DATE,
+    'match_set { %s match { host: "" host: "a" member: "a" member: "b" } }'
+    % _DATE,
+    'match_set { %s match { member: "a"\n"b" member: "c" } }' % _DATE,
+    'match_set { %s match { member: "a\\"b" member: \'c"d\' host: "a\\"b" } }'
+    % _DATE,
+    'match_set { %s match { member: "\\303\\251" member: "\\t\\101\\x41" } }'
+    % _DATE,
+    'match_set { %s match { member: "é" member: "a\rb" } }' % _DATE,
+    'match_set { %s\n match {\n  member: "a"\n  member: "b"\n }\n}\n'
+    'match_set {\n match { member: "a" member: "c" }\n %s\n}\n' % (_DATE, _DATE),
+    'match_set { date_yyyymmdd: "20180108" match { member: "a" } }\n'
+    'match_set { %s match { member: "b" } }' % _DATE,
+]
+
+# Inputs that text_format.Parse rejects.
+_INVALID_TEXTPROTOS = [
+    'match_set { match { host: "a" host: "a" } }',
+    'match_set { date_yyyymmdd: "1" date_yyyymmdd: "2" }',
+    'match_set { %s match { host: ["a"] } }' % _DATE,
+    'match_set { %s match { member "a" } }' % _DATE,
+    'match_set { %s match { member: a } }' % _DATE,
+    'match_set { %s match { member: ["a",] } }' % _DATE,
+    'match_set { %s match { member: "a" ,, } }' % _DATE,
+    'match_set { %s };;' % _DATE,
+    'match_set {,}',
+    'match_set [{%s} {%s}]' % (_DATE, _DATE),
+    'match_set < %s }' % _DATE,
+    'match_set { member: "x" }',
+    'match_set { %s match { member: "a" }' % _DATE,
+    'match_set { %s match { member: "a\\\n b" } }' % _DATE,
+    'match_set { %s match { member: "\\xff" } }' % _DATE,
+    'match_set { %s match { member: "a" } }\x00' % _DATE,
+    '1 { }',
+    'match_set',
+]
+
+
+def _parse_with_text_format(textproto):
+  matching_history = MatchingHistory()
+  text_format.Parse(textproto, matching_history)
+  return historian.from_proto(matching_history)
+
+
+class TestTextprotoReader(unittest.TestCase):
+
+  def test_same_historian_as_text_format(self):
+    for textproto in _VALID_TEXTPROTOS:
+      variants = [textproto]
+      if '#' not in textproto:
+        # Also with every space turned into a line break.
+        variants.append(textproto.replace(' ', '\n'))
+      for variant in variants:
+        with self.subTest(textproto=variant):
+          self.assertEqual(
+              _parse_with_text_format(variant).to_proto(),
+              textproto_reader.read_historian(io.StringIO(variant)).to_proto())
+
+  def test_rejects_what_text_format_rejects(self):
+    for textproto in _INVALID_TEXTPROTOS:
+      with self.subTest(textproto=textproto):
+        with self.assertRaises(text_format.ParseError):
+          _parse_with_text_format(textproto)
+        with self.assertRaises(ValueError):
+          textproto_reader.read_historian(io.StringIO(textproto))
+
+  def test_bad_date(self):
+    with self.assertRaisesRegex(Exception, 'failed to parse match date 2018-01-01'):
+      textproto_reader.read_historian(
+          io.StringIO('match_set { date_yyyymmdd: "2018-01-01" }'))
+
+  def test_load_historian(self):
+    textproto = _VALID_TEXTPROTOS[-2]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      textproto_path = os.path.join(tmp_dir, 'history.textproto')
+      history_writer.write_history(
+          _parse_with_text_format(textproto), textproto_path)
+      self.assertEqual(
+          _parse_with_text_format(textproto).to_proto(),
+          textproto_reader.load_historian(textproto_path).to_proto())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,45 @@
+"""Keeps the K best distinct items of a stream in a bounded heap."""
+
+import heapq
+
+
+class TopK():
+  """The k best distinct items pushed so far.
+
+  Items are ranked by score, then by lower index (i.e. earlier items win
+  ties), and are distinct by key. Pushing costs O(log k).
+  """
+
+  def __init__(self, k):
+    if k < 1:
+      raise ValueError('k must be positive')
+    self._k = k
+    # Min-heap of (score, -index, key, item), so the root is evicted first.
+    self._heap = []
+    self._keys = set()
+
+  def __len__(self):
+    return len(self._heap)
+
+  def would_accept(self, score, index):
+    """Returns whether an item with a new key would make it into the top k."""
+    return len(self._heap) < self._k or (score, -index) > self._heap[0][:2]
+
+  def push(self, score, index, key, item):
+    """Returns whether the item was added (possibly evicting another)."""
+    if key in self._keys or not self.would_accept(score, index):
+      return False
+    entry = (score, -index, key, item)
+    if len(self._heap) < self._k:
+      heapq.heappush(self._heap, entry)
+    else:
+      _, _, evicted_key, _ = heapq.heapreplace(self._heap, entry)
+      self._keys.remove(evicted_key)
+    self._keys.add(key)
+    return True
+
+  def get_ranked(self):
+    """Returns [(score, index, item)], best first."""
+    return [
+        (score, -neg_index, item)
+        for score, neg_index, _, item in sorted(self._heap, reverse=True)]
@@ -0,0 +1,59 @@
+import random
+import unittest
+
+from src.org.fotw.h2h import top_k
+
+
+class TestTopK(unittest.TestCase):
+
+  def test_keeps_best_distinct(self):
+    best_k = top_k.TopK(2)
+    self.assertTrue(best_k.push(1.0, 0, 'a', 'item a'))
+    self.assertTrue(best_k.push(3.0, 1, 'b', 'item b'))
+    self.assertFalse(best_k.push(3.0, 2, 'b', 'item b again'))
+    self.assertTrue(best_k.push(2.0, 3, 'c', 'item c'))
+    self.assertFalse(best_k.push(0.5, 4, 'd', 'item d'))
+    self.assertEqual(2, len(best_k))
+    self.assertEqual(
+        [(3.0, 1, 'item b'), (2.0, 3, 'item c')], best_k.get_ranked())
+
+  def test_earliest_wins_ties(self):
+    best_k = top_k.TopK(1)
+    best_k.push(1.0, 0, 'a', 'item a')
+    self.assertFalse(best_k.push(1.0, 1, 'b', 'item b'))
+    self.assertEqual([(1.0, 0, 'item a')], best_k.get_ranked())
+
+  def test_evicted_key_can_come_back(self):
+    best_k = top_k.TopK(1)
+    best_k.push(1.0, 0, 'a', 'item a')
+    best_k.push(2.0, 1, 'b', 'item b')
+    self.assertTrue(best_k.push(3.0, 2, 'a', 'item a'))
+    self.assertEqual([(3.0, 2, 'item a')], best_k.get_ranked())
+
+  def test_pushed_items_contain_top_k_of_every_prefix(self):
+    rng = random.Random(1)
+    # Items with the same key have the same score, like duplicate samples.
+    key_scores = [rng.randint(0, 20) for _ in range(30)]
+    keys = [rng.randrange(30) for _ in range(300)]
+    best_k = top_k.TopK(5)
+    pushed = [
+        i for i, key in enumerate(keys)
+        if best_k.push(key_scores[key], i, key, key)]
+
+    for prefix in range(1, len(keys) + 1):
+      expected = top_k.TopK(5)
+      from_pushed = top_k.TopK(5)
+      for i in range(prefix):
+        expected.push(key_scores[keys[i]], i, keys[i], keys[i])
+      for i in pushed:
+        if i < prefix:
+          from_pushed.push(key_scores[keys[i]], i, keys[i], keys[i])
+      self.assertEqual(expected.get_ranked(), from_pushed.get_ranked())
+
+  def test_k_must_be_positive(self):
+    with self.assertRaises(ValueError):
+      top_k.TopK(0)
+
+
+if __name__ == '__main__':
+  unittest.main()